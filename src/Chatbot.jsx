@@ -73,23 +73,53 @@ export default function Chatbot() {
     setLoading(true)
     setQuery('')
 
+    // Placeholder bot message that fills in as tokens stream from /chat/stream
+    setMessages((prev) => [...prev, { sender: 'bot', text: '' }])
+    const appendToBot = (text) =>
+      setMessages((prev) => {
+        const next = [...prev]
+        const last = next[next.length - 1]
+        next[next.length - 1] = { ...last, text: last.text + text }
+        return next
+      })
+
     try {
-      const res = await axios.post('http://127.0.0.1:8000/chat', {
-        user_query: query,
-        session_id: sessionId,
+      const res = await fetch('http://127.0.0.1:8000/chat/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ user_query: query, session_id: sessionId }),
       })
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`)
 
-      const botReply = {
-        sender: 'bot',
-        text: res.data.response || '🤖 No response',
+      const reader = res.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      let gotText = false
+      for (;;) {
+        const { value, done } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        // SSE frames are separated by a blank line
+        let sep
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+          const frame = buffer.slice(0, sep)
+          buffer = buffer.slice(sep + 2)
+          const event = frame.match(/^event: (.*)$/m)?.[1]
+          const data = JSON.parse(frame.match(/^data: (.*)$/m)?.[1] || '{}')
+          if (event === 'token') {
+            gotText = true
+            setLoading(false)
+            appendToBot(data.text)
+          } else if (event === 'error') {
+            appendToBot(gotText ? `\n⚠️ ${data.error}` : `⚠️ ${data.error}`)
+            gotText = true
+          }
+        }
       }
-      setMessages((prev) => [...prev, botReply])
+      if (!gotText) appendToBot('🤖 No response')
     } catch (error) {
       console.error('❌ Error contacting server:', error)
-      setMessages((prev) => [
-        ...prev,
-        { sender: 'bot', text: '⚠️ Error contacting server.' },
-      ])
+      appendToBot('⚠️ Error contacting server.')
     } finally {
       setLoading(false)
     }
@@ -117,7 +147,7 @@ export default function Chatbot() {
           </div>
 
           <div className="flex-1 overflow-y-auto space-y-2 pr-2 mb-3 chat-scroll">
-            {messages.map((msg, idx) => (
+            {messages.filter((msg) => msg.text).map((msg, idx) => (
               <div key={idx} className="flex flex-col">
                 <div
                   className={`max-w-[80%] px-4 py-2 rounded-2xl text-sm ${
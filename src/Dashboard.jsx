@@ -1,5 +1,5 @@
 "use client"
-import { useState, useEffect, useMemo } from "react"
+import { useState, useEffect, useMemo, useCallback } from "react"
 import { useNavigate } from "react-router-dom"
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, PieChart, Pie, Cell } from "recharts"
 import Chatbot from "./Chatbot"
@@ -12,6 +12,7 @@ import axios from 'axios' // ADDED: Import axios for data fetching
 const COLORS = ["#3B82F6", "#10B981", "#F59E0B", "#EF4444", "#8B5CF6", "#14B8A6"]
 const STATUS_COLORS = { "Closed": "#EF4444", "Open": "#3B82F6", "In Progress": "#F59E0B", "Resolved": "#10B981" }
 const TRIAGE_LEVELS = { "L1": "L1", "L2": "L2", "L3": "L3", "L4": "L4", "L5": "L5" }
+const PAGE_SIZE = 50
 const TRIAGE_COLORS = { "L5": "#EF4444", "L4": "#FB923C", "L3": "#FCD34D", "L2": "#896129", "L1": "#6FC276" }
 
 /**
@@ -39,10 +40,11 @@ function HelpPopover({ content }) {
 /**
  * Renders a combined info card with ticket count and a pie chart.
  * @param {object} props - The component's properties.
- * @param {number} props.ticketCount - The total number of tickets.
- * @param {Array<object>} props.sourceData - Data for the pie chart.
+ * @param {number} props.ticketCount - The number of tickets matching the current filters and search.
+ * @param {boolean} props.filtered - Whether a filter or search is narrowing `ticketCount`.
+ * @param {Array<object>} props.sourceData - Data for the pie chart, across all tickets.
  */
-function CombinedInfoCard({ ticketCount, sourceData }) {
+function CombinedInfoCard({ ticketCount, filtered, sourceData }) {
   const renderCustomLabel = ({ cx, cy, midAngle, innerRadius, outerRadius, index }) => {
     const radius = innerRadius + (outerRadius - innerRadius) * 0.5
     const x = cx + radius * Math.cos(-midAngle * Math.PI / 180)
@@ -54,6 +56,7 @@ function CombinedInfoCard({ ticketCount, sourceData }) {
     <div className="bg-white shadow-md rounded-2xl p-3 border border-gray-200 h-[320px] flex flex-col transition-all duration-300 ease-in-out hover:scale-[1.01] hover:shadow-xl">
       <h2 className="text-lg font-semibold text-gray-700">Project Overview</h2>
       <div className="text-5xl font-bold text-blue-600 mt-2">{ticketCount}</div>
+      <div className="text-xs text-gray-500">{filtered ? "tickets matching the current filters" : "tickets"}; sources cover all tickets</div>
       <div className="flex flex-1 items-center justify-between mt-4 gap-4">
         <ResponsiveContainer width={140} height={140}>
           <PieChart>
@@ -178,6 +181,31 @@ function TriageBarChartCard({ title, data, dataKeyX, dataKeyY }) {
   )
 }
 
+/**
+ * Renders a bar chart of tickets reported per period.
+ * @param {object} props - The component's properties.
+ * @param {string} props.title - The chart title.
+ * @param {Array<object>} props.data - Trend points from /stats, each with `period` and `count`.
+ */
+function TrendChartCard({ title, data }) {
+  return (
+    <div className="bg-white shadow-md rounded-2xl p-4 border border-gray-200 min-h-[300px] text-black transition-all duration-300 ease-in-out hover:shadow-xl">
+      <h2 className="text-lg font-semibold text-gray-700 mb-2">{title}</h2>
+      <div className="h-64">
+        <ResponsiveContainer width="100%" height="100%">
+          <BarChart data={data} margin={{ top: 20, right: 20, left: 20, bottom: 30 }}>
+            <CartesianGrid strokeDasharray="3 3" />
+            <XAxis dataKey="period" tick={{ fontSize: 12 }} minTickGap={20} />
+            <YAxis allowDecimals={false} tick={{ fontSize: 12 }} />
+            <Tooltip />
+            <Bar dataKey="count" fill="#3B82F6" />
+          </BarChart>
+        </ResponsiveContainer>
+      </div>
+    </div>
+  )
+}
+
 /**
  * Renders a single ticket card for the dashboard.
  * @param {object} props - The component's properties.
@@ -251,10 +279,19 @@ function TicketCard({ ticket, onView }) {
  */
 export default function Dashboard() {
   const [allTickets, setAllTickets] = useState([])
+  // Totals and weekly trend from /stats; independent of how many tickets are loaded
+  const [stats, setStats] = useState(null)
+  // Total number of tickets matching the current filters, as counted by the server.
+  const [totalTickets, setTotalTickets] = useState(0)
+  // Keyset cursor for the next page; null when everything has been loaded.
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   // `response` and its setter `setResponse` are used in the useEffect hook.
   const [response, setResponse] = useState(null)
   // `searchQuery` and `setSearchQuery` are used for the search input.
   const [searchQuery, setSearchQuery] = useState("")
+  // Debounced copy of `searchQuery` so typing does not fire a request per keystroke.
+  const [debouncedSearch, setDebouncedSearch] = useState("")
   // `filterType` and `setFilterType` are used for the filter select.
   const [filterType, setFilterType] = useState("")
   // `filterValue` and `setFilterValue` are used for the filter select.
@@ -274,14 +311,27 @@ export default function Dashboard() {
     }
   }, [response]);
 
-  // UPDATED: Fetch data using axios and the new data structure
+  // Dashboard aggregates, read from the server's summary tables
+  useEffect(() => {
+    const fetchStats = async () => {
+        try {
+            const res = await axios.get("http://localhost:8000/stats", { params: { bucket: "week" } })
+            setStats(res.data)
+        } catch (error) {
+            console.error("Error fetching dashboard stats:", error);
+        }
+    };
+
+    fetchStats();
+  }, []);
+
+  // Fetch the dropdown options once
   useEffect(() => {
-    const fetchTicketData = async () => {
+    const fetchFilterOptions = async () => {
         try {
-            const res = await axios.get("http://localhost:8000/ticket_data")
-            const { details, distinct_categories, distinct_status, distinct_assigned_to, distinct_sources } = res.data;
+            const res = await axios.get("http://localhost:8000/ticket_metadata")
+            const { distinct_categories, distinct_status, distinct_assigned_to, distinct_sources } = res.data;
 
-            setAllTickets(details);
             setFilterOptions(prev => ({
                 ...prev,
                 category: distinct_categories,
@@ -289,63 +339,78 @@ export default function Dashboard() {
                 assigned_to: distinct_assigned_to,
                 source: distinct_sources,
             }));
-            setResponse({ message: "Ticket data loaded successfully!" });
         } catch (error) {
-            console.error("Error fetching ticket data:", error);
-            setResponse({ message: "Failed to load ticket data." });
+            console.error("Error fetching filter options:", error);
         }
     };
 
-    fetchTicketData();
+    fetchFilterOptions();
   }, []);
 
-  // UPDATED: Filter and sort logic to use new data keys
-  const filteredAndSortedTickets = useMemo(() => {
-    let filtered = allTickets.filter(ticket => 
-      String(ticket.ticket_title || '').toLowerCase().includes(searchQuery.toLowerCase()) || 
-      String(ticket.ticket_id || '').toLowerCase().includes(searchQuery.toLowerCase())
-    );
-    if (filterType && filterValue) {
-      // UPDATED: keyMap to use new database column names
-      const keyMap = { triage: "ticket_triage", category: "ticket_category", status: "ticket_status", assigned_to: "ticket_assigned_employee", source: "ticket_source" }
-      // MODIFIED: Added fallback to prevent errors when filtering on undefined fields
-      filtered = filtered.filter(ticket => String(ticket[keyMap[filterType]] || '').toLowerCase() === filterValue.toLowerCase())
-    }
+  useEffect(() => {
+    const timer = setTimeout(() => setDebouncedSearch(searchQuery.trim()), 300)
+    return () => clearTimeout(timer)
+  }, [searchQuery])
+
+  // Filtering, searching and sorting all happen server-side on /tickets
+  const buildTicketParams = useCallback((cursor) => {
+    // Dashboard filter keys -> /tickets query parameters
+    const paramMap = { triage: "triage", category: "category", status: "status", assigned_to: "assignee", source: "source" }
+    const params = { limit: PAGE_SIZE, include_total: !cursor }
+    if (debouncedSearch) params.q = debouncedSearch
+    if (filterType && filterValue) params[paramMap[filterType]] = filterValue
     if (sortColumn) {
-      filtered.sort((a, b) => {
-        // UPDATED: sorting logic to use new data keys
-        const getSortValue = (ticket, column) => {
-          if (column === "assigned_to") return ticket.ticket_assigned_employee;
-          if (column === "ticket_triage") return TRIAGE_LEVELS[ticket.ticket_triage];
-          if (column === "title") return ticket.ticket_title;
-          return ticket[column];
-        };
-        const valA = getSortValue(a, sortColumn)?.toString().toLowerCase() || "";
-        const valB = getSortValue(b, sortColumn)?.toString().toLowerCase() || "";
-        return (valA < valB ? -1 : valA > valB ? 1 : 0) * (sortOrder === "asc" ? 1 : -1)
-      })
+      params.sort = sortColumn
+      params.order = sortOrder
     }
-    return filtered
-  }, [allTickets, searchQuery, filterType, filterValue, sortColumn, sortOrder])
+    if (cursor) params.cursor = cursor
+    return params
+  }, [debouncedSearch, filterType, filterValue, sortColumn, sortOrder])
+
+  useEffect(() => {
+    let cancelled = false
+    const fetchFirstPage = async () => {
+        try {
+            const res = await axios.get("http://localhost:8000/tickets", { params: buildTicketParams(null) })
+            if (cancelled) return
+            setAllTickets(res.data.tickets);
+            setNextCursor(res.data.next_cursor);
+            setTotalTickets(res.data.total ?? res.data.tickets.length);
+            setResponse({ message: "Ticket data loaded successfully!" });
+        } catch (error) {
+            console.error("Error fetching ticket data:", error);
+            setResponse({ message: "Failed to load ticket data." });
+        }
+    };
+
+    fetchFirstPage();
+    return () => { cancelled = true }
+  }, [buildTicketParams]);
 
-  // UPDATED: Aggregate data for the charts based on filtered tickets and new keys
-  const { triageCounts, statusCounts, sourceCounts, categoryCounts } = useMemo(() => {
-    const counts = { triage: {}, status: {}, source: {}, category: {} }
-    filteredAndSortedTickets.forEach(ticket => {
-      counts.triage[ticket.ticket_triage] = (counts.triage[ticket.ticket_triage] || 0) + 1
-      counts.status[ticket.ticket_status] = (counts.status[ticket.ticket_status] || 0) + 1
-      // MODIFIED: Added fallback for missing ticket_source data for aggregation
-      const sourceName = ticket.ticket_source || 'Unknown';
-      counts.source[sourceName] = (counts.source[sourceName] || 0) + 1;
-      counts.category[ticket.ticket_category] = (counts.category[ticket.ticket_category] || 0) + 1
-    })
-    return {
-      triageCounts: Object.entries(counts.triage).map(([name, count]) => ({ triage: name, count })),
-      statusCounts: Object.entries(counts.status).map(([name, count]) => ({ status: name, count })),
-      sourceCounts: Object.entries(counts.source).map(([name, count]) => ({ source: name, count })),
-      categoryCounts: Object.entries(counts.category).map(([name, count]) => ({ category: name, count })),
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return
+    setLoadingMore(true)
+    try {
+      const res = await axios.get("http://localhost:8000/tickets", { params: buildTicketParams(nextCursor) })
+      setAllTickets(prev => [...prev, ...res.data.tickets])
+      setNextCursor(res.data.next_cursor)
+    } catch (error) {
+      console.error("Error fetching more tickets:", error);
+      setResponse({ message: "Failed to load more tickets." });
+    } finally {
+      setLoadingMore(false)
     }
-  }, [filteredAndSortedTickets])
+  }
+
+  // Chart data comes pre-aggregated from /stats, so it covers every ticket, not just the loaded pages,
+  // and ignores the filters and search; the charts say so, while the headline count follows them
+  const { triageCounts, statusCounts, sourceCounts, categoryCounts, weeklyTrend } = useMemo(() => ({
+    triageCounts: [...(stats?.by_triage ?? [])].sort((a, b) => a.triage.localeCompare(b.triage)),
+    statusCounts: stats?.by_status ?? [],
+    sourceCounts: stats?.by_source ?? [],
+    categoryCounts: stats?.by_category ?? [],
+    weeklyTrend: stats?.trend?.points ?? [],
+  }), [stats])
 
   const handleView = (ticketId) => navigate(`/ticket/${ticketId}`)
   
@@ -370,10 +435,14 @@ export default function Dashboard() {
       <div className="max-w-screen-2xl mx-auto px-6 py-4 flex flex-col">
         {/* Dashboard Cards */}
         <div className="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-4 gap-4 mb-8">
-          <CombinedInfoCard ticketCount={filteredAndSortedTickets.length} sourceData={sourceCounts} />
-          <TriageBarChartCard title="Triage Levels" data={triageCounts} dataKeyX="triage" dataKeyY="count" />
-          <StatusBarChartCard title="Ticket Statuses" data={statusCounts} dataKeyX="status" dataKeyY="count" />
-          <PieChartCard title="Category Distribution" data={categoryCounts} dataKey="count" nameKey="category" />
+          <CombinedInfoCard ticketCount={totalTickets} filtered={Boolean(debouncedSearch || (filterType && filterValue))} sourceData={sourceCounts} />
+          <TriageBarChartCard title="Triage Levels (all tickets)" data={triageCounts} dataKeyX="triage" dataKeyY="count" />
+          <StatusBarChartCard title="Ticket Statuses (all tickets)" data={statusCounts} dataKeyX="status" dataKeyY="count" />
+          <PieChartCard title="Category Distribution (all tickets)" data={categoryCounts} dataKey="count" nameKey="category" />
+        </div>
+
+        <div className="mb-8">
+          <TrendChartCard title="Tickets Reported per Week (all tickets)" data={weeklyTrend} />
         </div>
 
         {/* Ticket Details Section */}
@@ -414,14 +483,25 @@ export default function Dashboard() {
             </div>
           </div>
           <div className="grid grid-cols-1 gap-6">
-            {filteredAndSortedTickets.length > 0 ? (
-              filteredAndSortedTickets.map((ticket, index) => (
-                <TicketCard key={index} ticket={ticket} onView={handleView} />
+            {allTickets.length > 0 ? (
+              allTickets.map((ticket) => (
+                <TicketCard key={ticket.ticket_id} ticket={ticket} onView={handleView} />
               ))
             ) : (
               <p className="text-gray-500 col-span-full">No tickets match the current filter.</p>
             )}
           </div>
+          {nextCursor && (
+            <div className="flex justify-center mt-6">
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="px-4 py-2 bg-blue-500 text-white rounded-lg shadow-md hover:bg-blue-600 transition-all duration-200 ease-in-out font-semibold text-sm disabled:opacity-50"
+              >
+                {loadingMore ? "Loading..." : `Load more (${allTickets.length} of ${totalTickets})`}
+              </button>
+            </div>
+          )}
           {response && (
             <div className="mt-4 p-3 bg-green-50 border border-green-200 text-green-700 rounded-md text-sm">
               Status: {response.message}
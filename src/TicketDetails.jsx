@@ -9,25 +9,17 @@ function TicketDetails() {
   const [error, setError] = useState(null)
 
 useEffect(() => {
-  axios.get('http://localhost:8000/ticket_data')
+  axios.get(`http://localhost:8000/tickets/${encodeURIComponent(ticketId.trim())}`)
     .then(res => {
-      console.log("▶️ ticketId from URL:", ticketId)
-      console.log("▶️ All ticket IDs in response:", res.data.details.map(t => t.ticket_id))
-
-      const found = res.data.details.find(
-        t => String(t.ticket_id).trim() === ticketId.trim()
-      )
-      console.log("▶️ Found Ticket:", found)
-
-      if (found) {
-        setTicket(found)
-      } else {
-        setError("Ticket not found.")
-      }
+      setTicket(res.data)
     })
     .catch(err => {
-      console.error("Fetch error:", err)
-      setError("Failed to fetch ticket.")
+      if (err.response?.status === 404) {
+        setError("Ticket not found.")
+      } else {
+        console.error("Fetch error:", err)
+        setError("Failed to fetch ticket.")
+      }
     })
     .finally(() => setLoading(false))
 }, [ticketId])
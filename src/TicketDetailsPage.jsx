@@ -31,7 +31,7 @@ function TicketDetails({ ticket }) {
     useEffect(() => {
         const fetchOptions = async () => {
             try {
-                const res = await axios.get("http://localhost:8000/ticket_data")
+                const res = await axios.get("http://localhost:8000/ticket_metadata")
                 setOptions({
                     triages: res.data.distinct_triages || [],
                     categories: res.data.distinct_categories || [],
@@ -252,15 +252,15 @@ export default function TicketDetailsPage() {
     const [loading, setLoading] = useState(true)
 
     useEffect(() => {
-        axios.get('http://localhost:8000/ticket_data')
+        axios.get(`http://localhost:8000/tickets/${encodeURIComponent(id)}`)
             .then(res => {
-                const details = res.data.details
-                const found = details.find(t => String(t.ticket_id) === id)
-                setTicket(found)
+                setTicket(res.data)
                 setLoading(false)
             })
             .catch(err => {
-                console.error('Failed to fetch ticket details', err)
+                if (err.response?.status !== 404) {
+                    console.error('Failed to fetch ticket details', err)
+                }
                 setLoading(false)
             })
     }, [id])
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+try:
+    from ticketbackend.data_version import DATA_VERSION_PATH, VECTOR_VERSION_PATH, get_version, changes_since
+except ImportError:
+    from data_version import DATA_VERSION_PATH, VECTOR_VERSION_PATH, get_version, changes_since
+load_dotenv()
+
+# === Semantic answer cache config ===
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+# Cosine similarity a new query needs with a cached one to reuse its answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "500"))
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # key -> entry dict, least recently used first
+_by_tickets = {}  # frozenset of ticket IDs -> set of keys
+_next_key = 0
+# Answers go stale when a ticket is edited in MySQL and again when its re-embedded
+# LanceDB row (the text the prompt quotes) lands; entries are up to date with these versions
+WATCHED_VERSIONS = (DATA_VERSION_PATH, VECTOR_VERSION_PATH)
+_versions = {}
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "evictions": 0,
+    "expired": 0,
+    "invalidated": 0,
+    "saved_llm_seconds": 0.0,
+}
+
+
+def _unit(vector):
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+def _ticket_key(ticket_ids):
+    return frozenset(str(t).strip().lower() for t in ticket_ids)
+
+
+def _drop(key):
+    entry = _entries.pop(key)
+    keys = _by_tickets.get(entry["tickets"])
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del _by_tickets[entry["tickets"]]
+
+
+def _drop_tickets(targets):
+    """Drops the entries built from any of these normalised ticket IDs; call under _lock."""
+    stale = [k for tickets, keys in _by_tickets.items() if tickets & targets for k in keys]
+    for key in stale:
+        _drop(key)
+    _stats["invalidated"] += len(stale)
+
+
+def current_versions():
+    """Read before retrieval and handed back to store()."""
+    return {path: get_version(path) for path in WATCHED_VERSIONS}
+
+
+def _check_versions(versions):
+    """Catches up with edits made by other processes: drops the entries quoting tickets
+    changed since the last check, or everything after a full resync. Call under _lock."""
+    for path, version in versions.items():
+        seen = _versions.get(path)
+        if version == seen:
+            continue
+        if seen is not None and _entries:
+            changed = changes_since(path, seen)
+            if changed is None:
+                _stats["invalidated"] += len(_entries)
+                _entries.clear()
+                _by_tickets.clear()
+            elif changed:
+                _drop_tickets(_ticket_key(changed))
+        _versions[path] = version
+
+
+def lookup(query_vector, ticket_ids):
+    """A cached answer for a near-duplicate query that retrieved the same tickets, or None."""
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    tickets = _ticket_key(ticket_ids)
+    query = _unit(query_vector)
+    now = time.monotonic()
+    versions = current_versions()
+    with _lock:
+        _check_versions(versions)
+        best_key, best_score = None, ANSWER_CACHE_THRESHOLD
+        for key in list(_by_tickets.get(tickets, ())):
+            entry = _entries[key]
+            if now - entry["created"] > ANSWER_CACHE_TTL:
+                _drop(key)
+                _stats["expired"] += 1
+                continue
+            score = float(np.dot(query, entry["vector"]))
+            if score >= best_score:
+                best_key, best_score = key, score
+        if best_key is None:
+            _stats["misses"] += 1
+            return None
+        entry = _entries[best_key]
+        _entries.move_to_end(best_key)
+        _stats["hits"] += 1
+        _stats["saved_llm_seconds"] += entry["llm_seconds"]
+        return {"response": entry["response"], "similarity": round(best_score, 4)}
+
+
+def store(query_vector, ticket_ids, response, llm_seconds, versions=None):
+    """Caches an answer; `versions` is current_versions() read before retrieval, and an
+    answer whose tickets changed while it was generated is not kept."""
+    global _next_key
+    if not ANSWER_CACHE_ENABLED:
+        return
+    tickets = _ticket_key(ticket_ids)
+    current = current_versions()
+    for path, version in (versions or {}).items():
+        if version != current[path]:
+            changed = changes_since(path, version)
+            if changed is None or tickets & _ticket_key(changed):
+                return
+    with _lock:
+        _check_versions(current)
+        key = _next_key
+        _next_key += 1
+        _entries[key] = {
+            "vector": _unit(query_vector),
+            "tickets": tickets,
+            "response": response,
+            "llm_seconds": llm_seconds,
+            "created": time.monotonic(),
+        }
+        _by_tickets.setdefault(tickets, set()).add(key)
+        while len(_entries) > ANSWER_CACHE_SIZE:
+            _drop(next(iter(_entries)))
+            _stats["evictions"] += 1
+
+
+def invalidate_tickets(ticket_ids):
+    """Drops every cached answer built from any of these tickets, in this process at once;
+    other processes drop theirs when the version bump naming them reaches them."""
+    targets = _ticket_key(ticket_ids)
+    if not targets:
+        return
+    with _lock:
+        _drop_tickets(targets)
+
+
+def get_answer_cache_stats():
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "saved_llm_calls": _stats["hits"],
+            "saved_llm_seconds": round(_stats["saved_llm_seconds"], 3),
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else None,
+            "entries": len(_entries),
+            "threshold": ANSWER_CACHE_THRESHOLD,
+        }
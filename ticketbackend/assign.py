@@ -1,73 +1,262 @@
+import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
-import mysql.connector
 try:
     from database import get_connection
+    from facet_cache import invalidate_facets
+    from data_version import bump_data_version, get_routing_version, bump_routing_version
+    from observability import span, log_event
+    from ticket_stats import read_stat_rows, apply_stat_delta
 except ImportError:
     from ticketbackend.database import get_connection
+    from ticketbackend.facet_cache import invalidate_facets
+    from ticketbackend.data_version import bump_data_version, get_routing_version, bump_routing_version
+    from ticketbackend.observability import span, log_event
+    from ticketbackend.ticket_stats import read_stat_rows, apply_stat_delta
 load_dotenv()
 
-H = os.getenv("MYSQL_HOST")
-D = os.getenv("MYSQL_DB")
-U = os.getenv("MYSQL_USER")
-P = os.getenv("MYSQL_PASSWORD")
+# === Assignment engine config ===
+ROUTING_TTL = float(os.getenv("ASSIGN_ROUTING_TTL", "300"))
+ASSIGN_CHUNK = int(os.getenv("ASSIGN_CHUNK", "1000"))
+# Tickets in these states count towards an employee's load
+OPEN_STATUSES = ("Open", "In Progress")
 
-def assign_ticket(ticket_id: str, conn):
-    print("ABOUT TO ASSIGN 🥶")
+# The normalised columns from migration 4, so keys match the ticket side without TRIM() per row
+ROUTING_QUERY = """
+    SELECT employee_id, category_norm, triage_norm FROM employee WHERE role = 'P'
+"""
+
+LOAD_QUERY = f"""
+    SELECT a.assigned_id, COUNT(*)
+    FROM assign AS a
+    JOIN main_table AS m ON m.ticket_id = a.ticket_id
+    WHERE m.status IN ({", ".join("'" + s + "'" for s in OPEN_STATUSES)})
+    GROUP BY a.assigned_id
+"""
+
+TICKETS_QUERY = """
+    SELECT p.ticket_id, p.category, p.triage, m.status, a.assigned_id
+    FROM processed AS p
+    JOIN main_table AS m ON m.ticket_id = p.ticket_id
+    JOIN assign AS a ON a.ticket_id = p.ticket_id
+    WHERE p.ticket_id IN ({placeholders})
+"""
+
+_routing = None
+_routing_loaded_at = 0.0
+_routing_version = None
+_routing_lock = threading.Lock()
+
+
+def _routing_key(category, triage):
+    return ((category or "").strip().lower(), (triage or "").strip().lower())
+
+
+def load_routing_table(conn):
+    """(category, triage) -> sorted primary employee IDs eligible for it."""
+    cursor = conn.cursor()
+    cursor.execute(ROUTING_QUERY)
+    routing = {}
+    for employee_id, category, triage in cursor.fetchall():
+        routing.setdefault(_routing_key(category, triage), []).append(employee_id)
+    cursor.close()
+    for employees in routing.values():
+        employees.sort()
+    return routing
+
+
+def get_routing_table(conn):
+    """The cached routing table, reloaded every ASSIGN_ROUTING_TTL seconds or when
+    another process calls reload_routing()."""
+    global _routing, _routing_loaded_at, _routing_version
+    version = get_routing_version()
+    with _routing_lock:
+        if (_routing is None or _routing_version != version
+                or time.monotonic() - _routing_loaded_at >= ROUTING_TTL):
+            _routing = load_routing_table(conn)
+            _routing_loaded_at = time.monotonic()
+            _routing_version = version
+        return _routing
+
+
+def invalidate_routing():
+    """Drops this process's routing table; the next assignment reloads it."""
+    global _routing
+    with _routing_lock:
+        _routing = None
+
+
+def reload_routing():
+    """Call after editing the employee table: every API worker reloads routing on its next assignment."""
+    invalidate_routing()
+    bump_routing_version()
+
+
+def open_ticket_counts(conn):
+    cursor = conn.cursor()
+    cursor.execute(LOAD_QUERY)
+    counts = dict(cursor.fetchall())
+    cursor.close()
+    return counts
+
+
+def _least_loaded(employees, load):
+    # Ties go to the lowest employee ID so repeated runs are deterministic
+    return min(employees, key=lambda e: (load.get(e, 0), e))
+
+
+def plan_assignments(tickets, routing, load, rebalance=False):
+    """Picks an assignee for each (ticket_id, category, triage, status, current) row.
+
+    `load` is updated as tickets are placed, so a batch spreads across employees.
+    Without rebalance, a ticket whose current assignee is still eligible stays put.
+    Returns ({ticket_id: employee_id} for changed tickets, unchanged IDs, unroutable IDs).
+    """
+    changes, unchanged, unroutable = {}, [], []
+    for ticket_id, category, triage, status, current in tickets:
+        employees = routing.get(_routing_key(category, triage))
+        if not employees:
+            unroutable.append(ticket_id)
+            continue
+        is_open = status in OPEN_STATUSES
+        if current in employees and not rebalance:
+            unchanged.append(ticket_id)
+            continue
+        if is_open and current is not None:
+            load[current] = load.get(current, 0) - 1
+        chosen = _least_loaded(employees, load)
+        if is_open:
+            load[chosen] = load.get(chosen, 0) + 1
+        if chosen == current:
+            unchanged.append(ticket_id)
+        else:
+            changes[ticket_id] = chosen
+    return changes, unchanged, unroutable
+
+
+def _update_assignments(cursor, changes):
+    """One UPDATE per ASSIGN_CHUNK tickets; assigned_date is copied from main_table as before."""
+    items = list(changes.items())
+    for i in range(0, len(items), ASSIGN_CHUNK):
+        chunk = items[i:i + ASSIGN_CHUNK]
+        cases = " ".join("WHEN %s THEN %s" for _ in chunk)
+        placeholders = ", ".join(["%s"] * len(chunk))
+        params = [value for pair in chunk for value in pair] + [ticket_id for ticket_id, _ in chunk]
+        cursor.execute(f"""
+            UPDATE assign AS a
+            JOIN main_table AS m ON m.ticket_id = a.ticket_id
+            SET a.assigned_id = CASE a.ticket_id {cases} END,
+                a.assigned_date = m.assigned_date
+            WHERE a.ticket_id IN ({placeholders})
+        """, params)
+
+
+def assign_tickets(ticket_ids, conn, commit=True, rebalance=False):
+    """Assigns or reassigns many tickets in one transaction.
+
+    Each ticket goes to the least-loaded primary employee for its category and
+    triage. With commit=False the caller owns the transaction (and the dashboard
+    counts and cache invalidation that go with it).
+    """
+    ticket_ids = list(dict.fromkeys(ticket_ids))
+    result = {"assigned": {}, "unchanged": [], "unroutable": [], "missing": []}
+    if not ticket_ids:
+        return result
+
+    with span("assign.routing"):
+        routing = get_routing_table(conn)
+    cursor = conn.cursor()
     try:
-        cursor = conn.cursor()
+        tickets = []
+        with span("assign.lock_rows"):
+            for i in range(0, len(ticket_ids), ASSIGN_CHUNK):
+                chunk = ticket_ids[i:i + ASSIGN_CHUNK]
+                # Locks the assign rows so concurrent batches can't interleave on them
+                cursor.execute(TICKETS_QUERY.format(placeholders=", ".join(["%s"] * len(chunk))) + " FOR UPDATE",
+                               chunk)
+                tickets.extend(cursor.fetchall())
+        # assign may hold several rows per ticket; keep the first
+        seen = {}
+        for row in tickets:
+            seen.setdefault(row[0], row)
+        result["missing"] = [t for t in ticket_ids if t not in seen]
+
+        with span("assign.load"):
+            load = open_ticket_counts(conn)
+        changes, result["unchanged"], result["unroutable"] = plan_assignments(
+            seen.values(), routing, load, rebalance=rebalance
+        )
+        if changes:
+            # The rows are already locked above; a caller owning the transaction counts them itself
+            before = read_stat_rows(cursor, changes, lock=False) if commit else None
+            with span("assign.write"):
+                _update_assignments(cursor, changes)
+            if commit:
+                with span("assign.stats"):
+                    apply_stat_delta(cursor, before, read_stat_rows(cursor, changes, lock=False))
+        if commit:
+            with span("assign.commit"):
+                conn.commit()
+            if changes:
+                # The assignee facet list may have gained or lost a name
+                invalidate_facets()
+                bump_data_version(changes)
+        result["assigned"] = changes
+        return result
+    except Exception:
+        if commit:
+            conn.rollback()
+        raise
+    finally:
+        cursor.close()
 
-        # Step 1: Get processed ticket category and priority
-        cursor.execute("""
-            SELECT category, triage FROM processed 
-            WHERE ticket_id = %s LIMIT 1
-        """, (ticket_id,))
-        res = cursor.fetchone()
-        if not res:
-            print(f"[WARN] No processed ticket found with ID {ticket_id}")
-            return False
-
-        raw_category, raw_triage = res
-        category = raw_category.strip()
-        triage = raw_triage.strip()
-
-        print(f"→ category: '{category}' | triage: '{triage}'")
-
-        # Step 2: Query for matching employee
-        cursor.execute("""
-            SELECT employee_id FROM employee 
-            WHERE TRIM(category) = %s AND TRIM(triage) = %s AND role = 'P'
-            LIMIT 1
-        """, (category, triage))
-        aidz = cursor.fetchone()
-
-        if not aidz:
-            print(f"[WARN] No employee found for category='{category}', triage='{triage}'")
-            return False
-
-        employee_id = aidz[0]
-
-        # Step 3: Get assigned_date
-        cursor.execute("""
-            SELECT assigned_date FROM main_table 
-            WHERE ticket_id = %s LIMIT 1
-        """, (ticket_id,))
-        adz = cursor.fetchone()
-        assigned_date = adz[0] if adz else None
-
-        # Step 4: Insert into assign table
-        cursor.execute("""
-            UPDATE assign SET assigned_id = %s, assigned_date = %s WHERE ticket_id = %s
-        """, (employee_id, assigned_date, ticket_id))
-        conn.commit()
-        print(employee_id, assigned_date, ticket_id)
-        # Step 5: Log assignment
-        cursor.execute("SELECT employee_name FROM employee WHERE employee_id = %s", (employee_id,))
-        name = cursor.fetchone()[0]
-
-        print(f"✅ Ticket {ticket_id} assigned to {name} (ID: {employee_id}) on {assigned_date}")
-        return True
 
+def assign_ticket(ticket_id: str, conn):
+    try:
+        result = assign_tickets([ticket_id], conn)
     except Exception as e:
-        print(f"[ERROR] Assignment failed for ticket {ticket_id}: {e}")
+        log_event("assign.failed", logging.ERROR, ticket_id=ticket_id, error=str(e))
+        return False
+    if result["missing"]:
+        log_event("assign.ticket_missing", logging.WARNING, ticket_id=ticket_id)
         return False
+    if result["unroutable"]:
+        log_event("assign.no_employee", logging.WARNING, ticket_id=ticket_id)
+        return False
+    log_event("assign.done", ticket_id=ticket_id, employee_id=result["assigned"].get(ticket_id),
+              changed=ticket_id in result["assigned"])
+    return True
+
+
+def assign_all(rebalance=False):
+    """Routes every ticket in one pass; rebalance=True also moves correctly routed ones."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT ticket_id FROM assign")
+        ticket_ids = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        return assign_tickets(ticket_ids, conn, rebalance=rebalance)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Assign tickets to the least-loaded eligible employee.")
+    parser.add_argument("ticket_ids", nargs="*", help="tickets to assign (default: all)")
+    parser.add_argument("--rebalance", action="store_true", help="also move tickets already routed correctly")
+    parser.add_argument("--reload-routing", action="store_true",
+                        help="after editing employees: make running workers reload routing, then assign")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    if args.reload_routing:
+        reload_routing()
+        print("✅ Routing reload signalled to every worker.")
+    if args.ticket_ids:
+        with get_connection() as conn:
+            result = assign_tickets(args.ticket_ids, conn, rebalance=args.rebalance)
+    else:
+        result = assign_all(rebalance=args.rebalance)
+    print(f"✅ {len(result['assigned'])} reassigned, {len(result['unchanged'])} unchanged, "
+          f"{len(result['unroutable'])} unroutable, {len(result['missing'])} missing "
+          f"in {time.perf_counter() - started:.2f}s")
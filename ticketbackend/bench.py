@@ -0,0 +1,323 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+# Offline benchmark: synthetic data in SQLite, a fake LLM and a hashing embedder stand
+# in for MySQL, Gemini and sentence-transformers, so endpoint latency and ingestion
+# throughput can be compared across commits on any machine.
+#
+#   python -m ticketbackend.bench run --tickets 10000 --output bench-results/
+#   python -m ticketbackend.bench compare old.json new.json
+#
+# Absolute numbers are not production numbers (SQLite is not MySQL); the point is
+# the relative change between two runs on the same host and scale.
+
+DEFAULT_REQUESTS = {
+    "ticket_data": 5,
+    "tickets_page": 200,
+    "tickets_filtered": 200,
+    "stats": 200,
+    "ticket_detail": 200,
+    "ticket_update": 100,
+    "tickets_bulk_update": 20,
+    "chat": 100,
+}
+# /ticket_data returns every ticket; past this it measures JSON encoding, not the backend
+TICKET_DATA_MAX_TICKETS = 20000
+BULK_SIZE = 100
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _summary(latencies, wall, errors):
+    ordered = sorted(latencies)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000, 2)
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": pct(50),
+        "p90_ms": pct(90),
+        "p99_ms": pct(99),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+    }
+
+
+def _git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True)
+        return commit.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+    except Exception:
+        return None
+
+
+def prepare_environment(workdir):
+    # Read at import time by data_version/lancesync, so this must run before they are imported
+    os.environ["DATA_VERSION_PATH"] = os.path.join(workdir, ".data_version")
+    os.environ["LANCE_DB_PATH"] = os.path.join(workdir, "lancedb")
+
+
+def install_stand_ins(db_path, llm, embedder):
+    """Points the pool, the embedding service and the LLM at the local stand-ins."""
+    from ticketbackend import database, embedding
+    from ticketbackend.benchdata import SQLiteConnection
+    database._pool = database.ConnectionPool(connect=lambda: SQLiteConnection(db_path))
+    database._pool_pid = os.getpid()
+    embedding._model = embedder
+
+    from ticketbackend import lang
+    lang.llm = llm
+    return lang
+
+
+def run_ingestion(trace_memory):
+    from ticketbackend.lancesync import sync_tickets
+    results = {}
+    for name, rebuild in (("full", True), ("incremental_noop", False)):
+        if trace_memory:
+            tracemalloc.start()
+        stats = sync_tickets(rebuild=rebuild, workers=0)
+        if trace_memory:
+            stats["python_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+            tracemalloc.stop()
+        results[name] = stats
+        print(f"⏱️ ingestion {name}: {stats}")
+    return results
+
+
+def request_builders(tickets, sessions):
+    ids_in_chat = min(tickets, 9999)
+
+    def ticket(rng):
+        from ticketbackend.benchdata import ticket_id
+        return ticket_id(rng.randint(1, tickets))
+
+    def filtered(rng):
+        from ticketbackend.benchdata import CATEGORIES, STATUSES
+        params = {"category": rng.choice(CATEGORIES), "status": rng.choice(STATUSES),
+                  "sort": "reported_date", "order": "desc", "limit": 50}
+        return ("GET", "/tickets", {"params": params})
+
+    def stats(rng):
+        params = {"bucket": rng.choice(["day", "week", "month"])}
+        if rng.random() < 0.5:
+            params["trend_by"] = rng.choice(["category", "triage", "status", "source", "assignee"])
+        return ("GET", "/stats", {"params": params})
+
+    def update_body(rng):
+        from ticketbackend.benchdata import CATEGORIES, TRIAGES, STATUSES
+        return {"triage": rng.choice(TRIAGES), "status": rng.choice(STATUSES), "category": rng.choice(CATEGORIES)}
+
+    def bulk(rng):
+        updates = [{"ticket_id": ticket(rng), **update_body(rng)} for _ in range(BULK_SIZE)]
+        # Duplicates would make on_error=abort reject the whole batch
+        unique = list({u["ticket_id"]: u for u in updates}.values())
+        return ("PATCH", "/tickets", {"json": {"updates": unique, "on_error": "skip"}})
+
+    def chat(rng):
+        from ticketbackend.benchdata import WORDS, ticket_id
+        if rng.random() < 0.2:
+            query = f"what is the status of {ticket_id(rng.randint(1, ids_in_chat))}"
+        else:
+            query = "how do I fix " + " ".join(rng.choice(WORDS) for _ in range(4))
+        return ("POST", "/chat", {"json": {"session_id": f"bench-{rng.randrange(sessions)}", "user_query": query}})
+
+    return {
+        "ticket_data": lambda rng: ("GET", "/ticket_data", {}),
+        "tickets_page": lambda rng: ("GET", "/tickets", {"params": {"limit": 50}}),
+        "tickets_filtered": filtered,
+        "stats": stats,
+        "ticket_detail": lambda rng: ("GET", f"/tickets/{ticket(rng)}", {}),
+        "ticket_update": lambda rng: ("PUT", f"/tickets/{ticket(rng)}", {"json": update_body(rng)}),
+        "tickets_bulk_update": bulk,
+        "chat": chat,
+    }
+
+
+async def run_endpoint(client, build, requests, concurrency, rng, trace_memory):
+    planned = [build(rng) for _ in range(requests)]
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for item in planned:
+        queue.put_nowait(item)
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            method, url, kwargs = queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    result = _summary(latencies, wall, errors)
+    if trace_memory:
+        result["python_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+        tracemalloc.stop()
+    result["process_peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+async def run_endpoints(app, builders, requests, concurrency, seed, trace_memory):
+    import httpx
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for name, build in builders.items():
+            count = requests.get(name, 0)
+            if not count:
+                continue
+            results[name] = await run_endpoint(client, build, count, concurrency, random.Random(seed), trace_memory)
+            print(f"⏱️ {name}: {results[name]}")
+        caches = (await client.get("/cache_stats")).json()
+        pool = (await client.get("/pool_stats")).json()
+    return results, caches, pool
+
+
+def run(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ticket-bench-")
+    prepare_environment(workdir)
+    from ticketbackend.benchdata import SQLiteConnection, FakeLLM, HashingEmbedder, generate
+
+    db_path = os.path.join(workdir, "tickets.sqlite")
+    started = time.perf_counter()
+    conn = SQLiteConnection(db_path)
+    counts = generate(conn, args.tickets, seed=args.seed, indexes=not args.no_indexes)
+    conn.close()
+    generate_seconds = round(time.perf_counter() - started, 2)
+    print(f"✅ Generated {args.tickets} tickets in {generate_seconds}s under {workdir}")
+
+    llm = FakeLLM(latency=args.llm_latency, tokens=args.llm_tokens)
+    install_stand_ins(db_path, llm, HashingEmbedder(dim=args.dim))
+    ingestion = run_ingestion(args.trace_memory)
+
+    # lang opens LANCE_DB_PATH on first use, which already points at the benchmark table
+    from ticketbackend import main
+
+    requests = dict(DEFAULT_REQUESTS)
+    if args.tickets > TICKET_DATA_MAX_TICKETS:
+        requests["ticket_data"] = 0
+    if args.only:
+        requests = {k: (args.requests or v) for k, v in requests.items() if k in args.only}
+    elif args.requests:
+        requests = {k: args.requests if v else 0 for k, v in requests.items()}
+
+    sessions = max(1, args.tickets * 10 // 1000)
+    endpoints, caches, pool = asyncio.run(run_endpoints(
+        main.app, request_builders(args.tickets, sessions), requests, args.concurrency, args.seed, args.trace_memory
+    ))
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "settings": {
+            "tickets": args.tickets,
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+            "indexes": not args.no_indexes,
+            "embedding_dim": args.dim,
+            "llm_latency": args.llm_latency,
+            "llm_tokens": args.llm_tokens,
+        },
+        "dataset": {"rows": counts, "generate_seconds": generate_seconds},
+        "ingestion": ingestion,
+        "endpoints": endpoints,
+        "llm_calls": llm.calls,
+        "caches": caches,
+        "pool": pool,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+    output = args.output
+    if output.endswith(os.sep) or os.path.isdir(output):
+        os.makedirs(output, exist_ok=True)
+        output = os.path.join(output, f"{report['meta']['commit'] or 'bench'}-{args.tickets}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"✅ Results written to {output}")
+    return report
+
+
+def compare(old_path, new_path):
+    """Prints p50/p99/throughput for each endpoint and ingestion run, old vs new."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    def change(a, b, lower_is_better=True):
+        if not a or b is None:
+            return "n/a"
+        delta = (b - a) / a * 100
+        worse = delta > 0 if lower_is_better else delta < 0
+        return f"{delta:+.1f}%{' ⚠️' if worse and abs(delta) >= 10 else ''}"
+
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    for name in sorted(set(old["endpoints"]) & set(new["endpoints"])):
+        a, b = old["endpoints"][name], new["endpoints"][name]
+        print(f"{name:<22} p50 {a['p50_ms']:>9} -> {b['p50_ms']:>9} ms ({change(a['p50_ms'], b['p50_ms'])})  "
+              f"p99 {a['p99_ms']:>9} -> {b['p99_ms']:>9} ms ({change(a['p99_ms'], b['p99_ms'])})  "
+              f"rps {a['throughput_rps']} -> {b['throughput_rps']} "
+              f"({change(a['throughput_rps'], b['throughput_rps'], lower_is_better=False)})")
+    for name in sorted(set(old["ingestion"]) & set(new["ingestion"])):
+        a, b = old["ingestion"][name], new["ingestion"][name]
+        print(f"ingestion {name:<12} {a['seconds']}s -> {b['seconds']}s ({change(a['seconds'], b['seconds'])})  "
+              f"rows/s {a['rows_per_sec']} -> {b['rows_per_sec']}  "
+              f"peak RSS {a['peak_rss_mb']} -> {b['peak_rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of the ticket backend.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    r = sub.add_parser("run", help="generate data, ingest, and load-test the endpoints")
+    r.add_argument("--tickets", type=int, default=10000, help="synthetic tickets (1k-1M)")
+    r.add_argument("--seed", type=int, default=0)
+    r.add_argument("--concurrency", type=int, default=8)
+    r.add_argument("--requests", type=int, default=None, help="requests per endpoint (overrides defaults)")
+    r.add_argument("--only", nargs="+", choices=sorted(DEFAULT_REQUESTS), help="benchmark just these endpoints")
+    r.add_argument("--dim", type=int, default=384, help="hashing embedder dimension")
+    r.add_argument("--llm-latency", type=float, default=0.05, help="fake LLM seconds per call")
+    r.add_argument("--llm-tokens", type=int, default=40)
+    r.add_argument("--no-indexes", action="store_true", help="benchmark the schema before migrations")
+    r.add_argument("--trace-memory", action="store_true", help="tracemalloc peak per phase (slower)")
+    r.add_argument("--workdir", default=None, help="where the SQLite/LanceDB files go (default: a temp dir)")
+    r.add_argument("--output", default="bench-results" + os.sep)
+    c = sub.add_parser("compare", help="compare two result files")
+    c.add_argument("old")
+    c.add_argument("new")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args.old, args.new)
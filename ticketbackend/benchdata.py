@@ -0,0 +1,298 @@
+import asyncio
+import hashlib
+import random
+import re
+import sqlite3
+import time
+import zlib
+from datetime import datetime, timedelta
+import numpy as np
+
+# Local stand-ins for the benchmark (bench.py): a SQLite database that speaks the
+# slice of MySQL the backend uses, a fake LLM and a deterministic hashing embedder.
+# None of this is imported by the app itself.
+
+CATEGORIES = ["Network", "Database", "Hardware", "Software", "Access", "Email", "Security", "Printer"]
+TRIAGES = [f"L{i}" for i in range(1, 6)]
+STATUSES = ["Open", "In Progress", "Resolved", "Closed"]
+SOURCES = ["Email", "Portal", "Phone", "Chat", None]
+WORDS = (
+    "vpn login password reset outlook printer jammed server timeout database replica lag disk full "
+    "certificate expired laptop battery wifi dropping access denied license renewal backup failed "
+    "slow query firewall rule email bounce calendar sync sso token mfa prompt driver update crash "
+    "blue screen keyboard monitor flicker share drive permission ticket escalated patch reboot"
+).split()
+PRIMARY_PER_ROUTE = 3
+
+SCHEMA = [
+    """CREATE TABLE main_table (ticket_id TEXT PRIMARY KEY, title TEXT, description TEXT, status TEXT,
+                                reported_date TEXT, assigned_date TEXT, source TEXT)""",
+    "CREATE TABLE processed (ticket_id TEXT, summary TEXT, triage TEXT, category TEXT, solution TEXT)",
+    "CREATE TABLE assign (ticket_id TEXT, assigned_id TEXT, assigned_date TEXT)",
+    """CREATE TABLE employee (employee_id TEXT, employee_name TEXT, category TEXT, triage TEXT, role TEXT,
+                              category_norm TEXT GENERATED ALWAYS AS (LOWER(TRIM(category))) STORED,
+                              triage_norm TEXT GENERATED ALWAYS AS (LOWER(TRIM(triage))) STORED)""",
+    "CREATE TABLE reasons (ticket_id TEXT, triage_reason TEXT, category_reason TEXT)",
+    """CREATE TABLE chat_history (session_id TEXT, message_index INTEGER, sender TEXT, content TEXT,
+                                  timestamp TEXT)""",
+    """CREATE TABLE chat_summaries (session_id TEXT PRIMARY KEY, summary TEXT NOT NULL, folded INTEGER NOT NULL,
+                                    updated_at TEXT NOT NULL)""",
+    """CREATE TABLE ticket_stat_totals (dimension TEXT, value TEXT, tickets INTEGER NOT NULL DEFAULT 0,
+                                        PRIMARY KEY (dimension, value))""",
+    """CREATE TABLE ticket_stat_daily (dimension TEXT, day TEXT, value TEXT, tickets INTEGER NOT NULL DEFAULT 0,
+                                       PRIMARY KEY (dimension, day, value))""",
+]
+
+# Mirrors what migrations.py creates on MySQL
+INDEXES = [
+    "CREATE INDEX idx_processed_ticket_id ON processed (ticket_id)",
+    "CREATE INDEX idx_assign_ticket_employee ON assign (ticket_id, assigned_id)",
+    "CREATE INDEX idx_assign_employee ON assign (assigned_id)",
+    "CREATE INDEX idx_reasons_ticket_id ON reasons (ticket_id)",
+    "CREATE INDEX idx_employee_id ON employee (employee_id)",
+    "CREATE INDEX idx_employee_routing ON employee (category_norm, triage_norm, role)",
+    "CREATE INDEX idx_main_reported_ticket ON main_table (reported_date, ticket_id)",
+    "CREATE INDEX idx_main_status ON main_table (status)",
+    "CREATE INDEX idx_main_source ON main_table (source)",
+    "CREATE INDEX idx_processed_category ON processed (category)",
+    "CREATE INDEX idx_processed_triage ON processed (triage)",
+    "CREATE UNIQUE INDEX idx_chat_session_message ON chat_history (session_id, message_index)",
+]
+
+
+def ticket_id(i):
+    # lang.TICKET_ID_PATTERN matches four digits, so the first 10k IDs can be named in chat
+    return f"DEF-{i:04d}"
+
+
+def _sentence(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def employee_rows():
+    rows = []
+    n = 0
+    for category in CATEGORIES:
+        for triage in TRIAGES:
+            for role in ["P"] * PRIMARY_PER_ROUTE + ["S"]:
+                n += 1
+                # Stray whitespace as in the real table, so the routing normalisation is exercised
+                rows.append((f"EMP-{n:04d}", f"Employee {n}", f" {category} ", triage, role))
+    return rows
+
+
+def generate(conn, tickets, seed=0, chunk=5000, sessions_per_1k=10, messages_per_session=10, indexes=True):
+    """Fills an empty database with `tickets` synthetic tickets; returns row counts per table."""
+    from ticketbackend.ticket_stats import record_new_tickets
+    rng = random.Random(seed)
+    cur = conn.cursor()
+    for ddl in SCHEMA:
+        cur.execute(ddl)
+    employees = employee_rows()
+    cur.executemany("INSERT INTO employee VALUES (%s, %s, %s, %s, %s)", employees)
+    routes = {}
+    for employee_id, _, category, triage, role in employees:
+        if role == "P":
+            routes.setdefault((category.strip(), triage), []).append(employee_id)
+
+    start = datetime(2024, 1, 1)
+    for offset in range(0, tickets, chunk):
+        main, processed, assign, reasons = [], [], [], []
+        for i in range(offset + 1, min(tickets, offset + chunk) + 1):
+            tid = ticket_id(i)
+            category, triage = rng.choice(CATEGORIES), rng.choice(TRIAGES)
+            reported = start + timedelta(minutes=rng.randrange(0, 60 * 24 * 540))
+            assigned = (reported + timedelta(hours=rng.randrange(1, 48))).strftime("%Y-%m-%d %H:%M:%S")
+            main.append((tid, _sentence(rng, 6), _sentence(rng, 40), rng.choice(STATUSES),
+                         reported.strftime("%Y-%m-%d %H:%M:%S"), assigned, rng.choice(SOURCES)))
+            processed.append((tid, _sentence(rng, 20), triage, category, _sentence(rng, 25)))
+            assign.append((tid, rng.choice(routes[(category, triage)]), assigned))
+            reasons.append((tid, _sentence(rng, 10), _sentence(rng, 10)))
+        cur.executemany("INSERT INTO main_table VALUES (%s, %s, %s, %s, %s, %s, %s)", main)
+        cur.executemany("INSERT INTO processed VALUES (%s, %s, %s, %s, %s)", processed)
+        cur.executemany("INSERT INTO assign VALUES (%s, %s, %s)", assign)
+        cur.executemany("INSERT INTO reasons VALUES (%s, %s, %s)", reasons)
+        # Counted as ingestion would, in the transaction that inserted them
+        record_new_tickets(cur, [row[0] for row in main])
+        conn.commit()
+
+    sessions = max(1, tickets * sessions_per_1k // 1000)
+    for s in range(sessions):
+        history = []
+        for m in range(messages_per_session):
+            sender = "user" if m % 2 == 0 else "bot"
+            history.append((f"bench-{s}", m, sender, _sentence(rng, 12), "2024-06-01 12:00:00"))
+        cur.executemany("INSERT INTO chat_history VALUES (%s, %s, %s, %s, %s)", history)
+    conn.commit()
+
+    if indexes:
+        for ddl in INDEXES:
+            cur.execute(ddl)
+        conn.commit()
+    cur.close()
+    return {
+        "main_table": tickets, "processed": tickets, "assign": tickets, "reasons": tickets,
+        "employee": len(employees), "chat_history": sessions * messages_per_session,
+    }
+
+
+# === SQLite stand-in for mysql.connector ===
+_ASSIGN_UPDATE = re.compile(
+    r"UPDATE assign AS a\s+JOIN main_table AS m ON m\.ticket_id = a\.ticket_id\s+"
+    r"SET a\.assigned_id = CASE a\.ticket_id (?P<cases>.*?) END,\s+"
+    r"a\.assigned_date = m\.assigned_date\s+WHERE a\.ticket_id IN",
+    re.S,
+)
+
+_LOCKING_READ = re.compile(r"\bFOR UPDATE\b")
+# MySQL 8.0.19+ upserts can name the inserted row "new"; SQLite calls it "excluded"
+_ROW_ALIAS_UPSERT = re.compile(r"\)\s+AS new\s+ON DUPLICATE KEY UPDATE\b")
+_UPSERT = re.compile(r"\bON DUPLICATE KEY UPDATE\b")
+
+
+def translate(sql):
+    """Rewrites the MySQL constructs the backend uses into SQLite; None means skip the statement."""
+    stripped = sql.strip()
+    if stripped.upper().startswith("SET SESSION"):
+        return None
+    sql = _ASSIGN_UPDATE.sub(
+        lambda m: (
+            f"UPDATE assign SET assigned_id = CASE ticket_id {m.group('cases').replace('a.', '')} END, "
+            "assigned_date = (SELECT m.assigned_date FROM main_table AS m WHERE m.ticket_id = assign.ticket_id) "
+            "WHERE ticket_id IN"
+        ),
+        sql,
+    )
+    if _ROW_ALIAS_UPSERT.search(sql):
+        sql = re.sub(r"\bnew\.", "excluded.", _ROW_ALIAS_UPSERT.sub(") ON CONFLICT DO UPDATE SET", sql))
+    sql = _UPSERT.sub("ON CONFLICT DO UPDATE SET", sql)
+    sql = _LOCKING_READ.sub("", sql)
+    sql = re.sub(r"\bNOW\(\)", "CURRENT_TIMESTAMP", sql)
+    return sql.replace("%s", "?")
+
+
+class SQLiteCursor:
+    def __init__(self, raw, dictionary=False):
+        self._raw = raw
+        self._cur = raw.cursor()
+        if dictionary:
+            self._cur.row_factory = lambda c, row: {d[0]: v for d, v in zip(c.description, row)}
+
+    def execute(self, sql, params=()):
+        if _LOCKING_READ.search(sql) and not self._raw.in_transaction:
+            # SQLite has no row locks; taking the write lock up front keeps read-then-write
+            # transactions (assignment, dashboard counts) from interleaving, as FOR UPDATE does
+            self._cur.execute("BEGIN IMMEDIATE")
+        sql = translate(sql)
+        if sql is not None:
+            self._cur.execute(sql, tuple(params or ()))
+
+    def executemany(self, sql, rows):
+        sql = translate(sql)
+        if sql is not None:
+            self._cur.executemany(sql, [tuple(r) for r in rows])
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def fetchmany(self, size):
+        return self._cur.fetchmany(size)
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    def close(self):
+        self._cur.close()
+
+
+class SQLiteConnection:
+    """Just enough of a mysql.connector connection for ConnectionPool and the query modules."""
+
+    def __init__(self, path):
+        self._raw = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._raw.execute("PRAGMA journal_mode=WAL")
+        self._raw.execute("PRAGMA synchronous=NORMAL")
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self._raw, dictionary=dictionary)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def ping(self, reconnect=False, **kwargs):
+        self._raw.execute("SELECT 1")
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self._raw.close()
+
+
+# === Fake LLM ===
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeLLM:
+    """Stands in for ChatGoogleGenerativeAI: fixed latency, deterministic answers."""
+
+    def __init__(self, latency=0.05, tokens=40, token_delay=0.0):
+        self.latency = latency
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.calls = 0
+
+    def _answer(self, prompt):
+        rng = random.Random(hashlib.sha1(str(prompt).encode()).hexdigest())
+        return " ".join(rng.choice(WORDS) for _ in range(self.tokens))
+
+    def invoke(self, prompt):
+        self.calls += 1
+        time.sleep(self.latency)
+        return FakeMessage(self._answer(prompt))
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return FakeMessage(self._answer(prompt))
+
+    async def astream(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        for word in self._answer(prompt).split():
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield FakeMessage(word + " ")
+
+
+# === Deterministic embedder ===
+class HashingEmbedder:
+    """Signed feature hashing of word tokens; same encode() shape as SentenceTransformer."""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def _vector(self, text):
+        v = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            h = zlib.crc32(token.encode())
+            v[h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def encode(self, texts, batch_size=None, show_progress_bar=False, **kwargs):
+        if isinstance(texts, str):
+            return self._vector(texts)
+        return np.stack([self._vector(t) for t in texts]) if texts else np.zeros((0, self.dim), np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
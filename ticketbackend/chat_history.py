@@ -0,0 +1,460 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from mysql.connector import errorcode, errors
+from dotenv import load_dotenv
+try:
+    from ticketbackend.database import get_connection
+    from ticketbackend.observability import log_event, increment
+except ImportError:
+    from database import get_connection
+    from observability import log_event, increment
+load_dotenv()
+
+# === Chat history writer config ===
+# 1 = /chat only enqueues messages and a background thread writes them in batches
+WRITE_BEHIND = os.getenv("CHAT_HISTORY_WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_BATCH = int(os.getenv("CHAT_HISTORY_BATCH", "100"))
+WRITE_BEHIND_INTERVAL = float(os.getenv("CHAT_HISTORY_FLUSH_INTERVAL", "0.5"))
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("CHAT_HISTORY_QUEUE_SIZE", "10000"))
+MAX_RETRIES = 3
+
+# === Session window cache config ===
+# Messages kept verbatim per session; older ones are folded into a rolling summary
+WINDOW_MESSAGES = int(os.getenv("CHAT_WINDOW_MESSAGES", "6"))
+SESSION_CACHE_SIZE = int(os.getenv("CHAT_SESSION_CACHE_SIZE", "1000"))
+# Sessions idle this long are dropped from the cache and re-read on their next message
+SESSION_IDLE_TTL = float(os.getenv("CHAT_SESSION_IDLE_TTL", "600"))
+# Checks a cached session's message count against MySQL on every read, so turns another
+# worker stored are picked up at once; 0 skips that lookup when only one worker runs
+SESSION_REVALIDATE = os.getenv("CHAT_SESSION_REVALIDATE", "1") == "1"
+# Messages rolled out of the window per summary update; 0 turns summarization off
+SUMMARY_EVERY = int(os.getenv("CHAT_SUMMARY_EVERY", "6"))
+SUMMARY_MAX_CHARS = int(os.getenv("CHAT_SUMMARY_MAX_CHARS", "1200"))
+
+RETRYABLE_ERRORS = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
+# Locks the session's rows so concurrent writers for one session queue up instead
+# of both reading the same MAX and inserting duplicate indexes
+NEXT_INDEX_QUERY = """
+    SELECT COALESCE(MAX(message_index), -1)
+    FROM chat_history
+    WHERE session_id = %s
+    FOR UPDATE
+"""
+
+INSERT_QUERY = """
+    INSERT INTO chat_history (session_id, message_index, sender, content, timestamp)
+    VALUES (%s, %s, %s, %s, NOW())
+"""
+
+RECENT_QUERY = """
+    SELECT message_index, sender, content
+    FROM chat_history
+    WHERE session_id = %s AND message_index >= %s
+    ORDER BY message_index DESC
+    LIMIT %s
+"""
+
+MESSAGE_COUNT_QUERY = """
+    SELECT COALESCE(MAX(message_index), -1) + 1
+    FROM chat_history
+    WHERE session_id = %s
+"""
+
+# The rolling summary is stored so a cold session, or one served by another worker,
+# starts from it instead of summarizing again; `folded` counts the leading messages it covers
+CHAT_SUMMARIES_TABLE = """
+    CREATE TABLE IF NOT EXISTS chat_summaries (
+        session_id VARCHAR(255) PRIMARY KEY,
+        summary TEXT NOT NULL,
+        folded INT NOT NULL,
+        updated_at DATETIME NOT NULL
+    )
+"""
+
+SUMMARY_QUERY = """
+    SELECT summary, folded FROM chat_summaries WHERE session_id = %s
+"""
+
+# The values are passed twice so this runs on any MySQL: VALUES() in the update clause is
+# deprecated since 8.0.20 and the AS new row alias needs 8.0.19
+SAVE_SUMMARY_QUERY = """
+    INSERT INTO chat_summaries (session_id, summary, folded, updated_at)
+    VALUES (%s, %s, %s, NOW())
+    ON DUPLICATE KEY UPDATE summary = %s, folded = %s, updated_at = NOW()
+"""
+
+_STOP = object()
+_queue = queue.Queue(maxsize=WRITE_BEHIND_QUEUE_SIZE)
+_writer = None
+_writer_lock = threading.Lock()
+# session_id -> [(sender, content)] accepted but not yet in MySQL, so reads see them
+_pending = {}
+_pending_lock = threading.Lock()
+_sessions = OrderedDict()  # session_id -> window entry, least recently used first
+_sessions_lock = threading.Lock()
+_summarizer = None
+# chat_summaries comes from migration 7; without it sessions just start with no stored summary
+_summaries_missing = False
+_summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-summary")
+_session_stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "summaries": 0, "summary_failures": 0}
+_stats = {
+    "messages_written": 0,
+    "transactions": 0,
+    "retries": 0,
+    "failed_messages": 0,
+    "failed_batches": 0,
+    "sync_fallbacks": 0,
+    "flush_timeouts": 0,
+}
+
+
+def write_messages(batch):
+    """Writes [(session_id, sender, content)] in one transaction; order within a session is kept.
+
+    Message indexes are allocated under a row lock, and deadlocks or lock wait
+    timeouts are retried a few times before giving up.
+    """
+    if not batch:
+        return
+    by_session = {}
+    for session_id, sender, content in batch:
+        by_session.setdefault(session_id, []).append((sender, content))
+
+    for attempt in range(MAX_RETRIES + 1):
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            rows = []
+            # A fixed lock order keeps two multi-session batches from deadlocking each other
+            for session_id in sorted(by_session):
+                cursor.execute(NEXT_INDEX_QUERY, (session_id,))
+                next_index = cursor.fetchone()[0] + 1
+                for offset, (sender, content) in enumerate(by_session[session_id]):
+                    rows.append((session_id, next_index + offset, sender, content))
+            # executemany folds an INSERT into one multi-row statement
+            cursor.executemany(INSERT_QUERY, rows)
+            conn.commit()
+            with _writer_lock:
+                _stats["messages_written"] += len(rows)
+                _stats["transactions"] += 1
+            return
+        except errors.DatabaseError as e:
+            conn.rollback()
+            if e.errno not in RETRYABLE_ERRORS or attempt == MAX_RETRIES:
+                raise
+            with _writer_lock:
+                _stats["retries"] += 1
+            time.sleep(0.05 * (attempt + 1))
+        finally:
+            cursor.close()
+            conn.close()
+
+
+def record_exchange(session_id, user_message, bot_message):
+    """Stores one user question and the bot's answer as a consecutive pair."""
+    record_messages(session_id, [("user", user_message), ("bot", bot_message)])
+
+
+def record_messages(session_id, messages):
+    batch = [(session_id, sender, content) for sender, content in messages]
+    if not WRITE_BEHIND:
+        write_messages(batch)
+        _remember_messages(session_id, messages)
+        return
+    _remember_messages(session_id, messages)
+    _ensure_writer()
+    with _pending_lock:
+        _pending.setdefault(session_id, []).extend(messages)
+    try:
+        _queue.put_nowait(batch)
+    except queue.Full:
+        # Backpressure: write inline rather than grow without bound
+        with _writer_lock:
+            _stats["sync_fallbacks"] += 1
+        try:
+            write_messages(batch)
+        finally:
+            _settle(batch)
+
+
+def log_chat_message(session_id, sender, content):
+    record_messages(session_id, [(sender, content)])
+
+
+def _pending_count(session_id):
+    with _pending_lock:
+        return len(_pending.get(session_id, ()))
+
+
+def _stored_count(session_id):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(MESSAGE_COUNT_QUERY, (session_id,))
+        count = cursor.fetchone()[0]
+        cursor.close()
+    return count
+
+
+def _summaries_table_missing(e):
+    """True (and remembered) when `e` says chat_summaries does not exist yet."""
+    global _summaries_missing
+    if getattr(e, "errno", None) != errorcode.ER_NO_SUCH_TABLE:
+        return False
+    if not _summaries_missing:
+        _summaries_missing = True
+        log_event("chat_history.summaries_table_missing", logging.WARNING,
+                  hint="run 'python -m ticketbackend.migrations migrate' and restart to keep summaries")
+    return True
+
+
+def _load_session(session_id):
+    """A fresh window entry and the messages to push into it: the stored summary, then
+    what it does not cover yet, capped at one summary batch beyond the window."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        summary, folded = "", 0
+        if not _summaries_missing:
+            try:
+                cursor.execute(SUMMARY_QUERY, (session_id,))
+                row = cursor.fetchone()
+                if row:
+                    summary, folded = row[0] or "", row[1]
+            except errors.DatabaseError as e:
+                if not _summaries_table_missing(e):
+                    raise
+        cursor.execute(RECENT_QUERY, (session_id, folded, WINDOW_MESSAGES + SUMMARY_EVERY))
+        rows = cursor.fetchall()
+        cursor.close()
+    rows.reverse()
+    stored = rows[-1][0] + 1 if rows else folded
+    if rows:
+        # Anything older than the cap is left out of the summary, as after a failed summary
+        folded = rows[0][0]
+    with _pending_lock:
+        pending = list(_pending.get(session_id, ()))
+    entry = {"recent": deque(), "overflow": [], "summary": summary, "folded": folded,
+             "count": stored + len(pending), "summarizing": False, "touched": time.monotonic()}
+    return entry, [(sender, content) for _, sender, content in rows] + pending
+
+
+def _save_summary(session_id, summary, folded):
+    if _summaries_missing:
+        return
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(SAVE_SUMMARY_QUERY, (session_id, summary, folded, summary, folded))
+            conn.commit()
+        except errors.DatabaseError as e:
+            if not _summaries_table_missing(e):
+                raise
+        finally:
+            cursor.close()
+
+
+def _push(session_id, entry, messages):
+    """Appends to the window; messages pushed out wait in `overflow` for the summarizer."""
+    entry["recent"].extend(messages)
+    while len(entry["recent"]) > WINDOW_MESSAGES:
+        entry["overflow"].append(entry["recent"].popleft())
+    if not (SUMMARY_EVERY and _summarizer):
+        entry["folded"] += len(entry["overflow"])
+        entry["overflow"].clear()
+    elif len(entry["overflow"]) >= SUMMARY_EVERY and not entry["summarizing"]:
+        entry["summarizing"] = True
+        _summary_executor.submit(_summarize, session_id, entry)
+
+
+def _session_window(session_id):
+    now = time.monotonic()
+    with _sessions_lock:
+        entry = _sessions.get(session_id)
+        if entry is not None and now - entry["touched"] <= SESSION_IDLE_TTL:
+            _sessions.move_to_end(session_id)
+            entry["touched"] = now
+            count = entry["count"]
+        else:
+            entry = None
+
+    if entry is not None:
+        # A count that differs from ours means another worker stored turns for this session
+        if not SESSION_REVALIDATE or _stored_count(session_id) == count - _pending_count(session_id):
+            with _sessions_lock:
+                _session_stats["hits"] += 1
+            return entry
+        with _sessions_lock:
+            _session_stats["stale"] += 1
+    with _sessions_lock:
+        _session_stats["misses"] += 1
+
+    entry, messages = _load_session(session_id)
+    with _sessions_lock:
+        _push(session_id, entry, messages)
+        _sessions[session_id] = entry
+        _sessions.move_to_end(session_id)
+        while len(_sessions) > SESSION_CACHE_SIZE:
+            _sessions.popitem(last=False)
+            _session_stats["evictions"] += 1
+    return entry
+
+
+def _remember_messages(session_id, messages):
+    # Only sessions already cached are updated; others load everything on their next read
+    with _sessions_lock:
+        entry = _sessions.get(session_id)
+        if entry is not None:
+            entry["count"] += len(messages)
+            _push(session_id, entry, messages)
+
+
+def _summarize(session_id, entry):
+    with _sessions_lock:
+        batch = list(entry["overflow"])
+        summary = entry["summary"]
+    try:
+        summary = (_summarizer(summary, batch) or summary)[:SUMMARY_MAX_CHARS]
+        with _sessions_lock:
+            _session_stats["summaries"] += 1
+    except Exception as e:
+        with _sessions_lock:
+            _session_stats["summary_failures"] += 1
+        log_event("chat_history.summary_failed", logging.WARNING, session_id=session_id,
+                  messages=len(batch), error=str(e))
+    with _sessions_lock:
+        entry["summary"] = summary
+        # Dropped on failure too, so a broken summarizer can't make overflow grow forever
+        del entry["overflow"][:len(batch)]
+        entry["folded"] += len(batch)
+        folded = entry["folded"]
+    try:
+        _save_summary(session_id, summary, folded)
+    except Exception as e:
+        log_event("chat_history.summary_save_failed", logging.WARNING, session_id=session_id, error=str(e))
+    with _sessions_lock:
+        entry["summarizing"] = False
+        if len(entry["overflow"]) >= SUMMARY_EVERY:
+            entry["summarizing"] = True
+            _summary_executor.submit(_summarize, session_id, entry)
+
+
+def set_summarizer(fn):
+    """Registers fn(summary, [(sender, content)]) -> new summary, used to fold old turns."""
+    global _summarizer
+    _summarizer = fn
+
+
+def get_recent_chat_history(session_id, limit=None):
+    """Prompt context for a session: the rolling summary, then the last `limit` messages.
+
+    Served from the in-memory session window; MySQL is read in full only on a miss.
+    """
+    entry = _session_window(session_id)
+    with _sessions_lock:
+        rows = list(entry["recent"])[-(limit or WINDOW_MESSAGES):]
+        summary = entry["summary"]
+    history = ""
+    if summary:
+        history += f"Summary of earlier conversation: {summary}\n"
+    for sender, content in rows:
+        who = "User" if sender == "user" else "Assistant"
+        history += f"{who}: {content}\n"
+    return history
+
+
+def _settle(batch):
+    with _pending_lock:
+        for session_id, sender, content in batch:
+            queued = _pending.get(session_id)
+            if queued and (sender, content) in queued:
+                queued.remove((sender, content))
+                if not queued:
+                    del _pending[session_id]
+
+
+def _writer_loop():
+    stopping = False
+    while not stopping:
+        item = _queue.get()
+        if item is _STOP:
+            break
+        batch = list(item)
+        deadline = time.monotonic() + WRITE_BEHIND_INTERVAL
+        while len(batch) < WRITE_BEHIND_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = _queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stopping = True
+                break
+            batch.extend(item)
+        try:
+            write_messages(batch)
+        except Exception as e:
+            with _writer_lock:
+                _stats["failed_messages"] += len(batch)
+                _stats["failed_batches"] += 1
+            increment("chat_history_dropped_messages_total", len(batch),
+                      "Chat messages the write-behind writer could not store")
+            log_event("chat_history.write_failed", logging.ERROR, messages=len(batch),
+                      sessions=len({session_id for session_id, _, _ in batch}), error=str(e))
+        finally:
+            _settle(batch)
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_writer_loop, name="chat-history-writer", daemon=True)
+            _writer.start()
+
+
+def flush_chat_history(timeout=10):
+    """Drains the write-behind queue and stops the writer; call on shutdown."""
+    global _writer
+    writer = _writer
+    if writer is None or not writer.is_alive():
+        return
+    _queue.put(_STOP)
+    writer.join(timeout)
+    if writer.is_alive():
+        with _writer_lock:
+            _stats["flush_timeouts"] += 1
+        log_event("chat_history.flush_timeout", logging.WARNING, timeout_seconds=timeout,
+                  unwritten_batches=_queue.qsize())
+    else:
+        _writer = None
+
+
+def get_chat_history_stats():
+    with _writer_lock:
+        stats = dict(_stats)
+    stats["write_behind"] = WRITE_BEHIND
+    stats["queued_batches"] = _queue.qsize()
+    with _pending_lock:
+        stats["pending_messages"] = sum(len(m) for m in _pending.values())
+    return stats
+
+
+def get_session_cache_stats():
+    with _sessions_lock:
+        lookups = _session_stats["hits"] + _session_stats["misses"]
+        return {
+            **_session_stats,
+            "hit_rate": round(_session_stats["hits"] / lookups, 4) if lookups else None,
+            "sessions": len(_sessions),
+            "max_sessions": SESSION_CACHE_SIZE,
+            "window_messages": WINDOW_MESSAGES,
+        }
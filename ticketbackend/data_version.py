@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+from dotenv import load_dotenv
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+load_dotenv()
+
+# The version lives in a file so every API worker and the ingestion scripts
+# (separate processes) agree on it; reading it is a stat() unless it changed.
+DATA_VERSION_PATH = os.getenv("DATA_VERSION_PATH", "ticketbackend/.data_version")
+# Employee routing changes far less often than tickets, so assignment watches its own counter
+ROUTING_VERSION_PATH = os.getenv("ROUTING_VERSION_PATH", f"{DATA_VERSION_PATH}.routing")
+# Re-embeds rewrite LanceDB rows without touching MySQL; only the answer cache cares
+VECTOR_VERSION_PATH = os.getenv("VECTOR_VERSION_PATH", f"{DATA_VERSION_PATH}.vectors")
+# Each bump also appends the ticket IDs it changed to <path>.changes, so caches in other
+# processes can drop just those tickets; past this size the oldest half is discarded
+CHANGE_LOG_MAX_BYTES = int(os.getenv("DATA_VERSION_CHANGE_LOG_BYTES", "1000000"))
+
+_lock = threading.Lock()
+_cached = {}  # path -> (file stamp, version)
+
+
+def _read_file(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def get_version(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return 0
+    # bump_version() replaces the file, so the inode changes even when mtime is coarse
+    stamp = (st.st_ino, st.st_mtime_ns)
+    with _lock:
+        cached = _cached.get(path)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, _read_file(path))
+            _cached[path] = cached
+        return cached[1]
+
+
+def _log_change(path, version, ticket_ids):
+    """Appends one change; call with the version file locked, before the version moves."""
+    log_path = path + ".changes"
+    line = json.dumps({"version": version, "tickets": None if ticket_ids is None else sorted(ticket_ids)})
+    try:
+        size = os.path.getsize(log_path)
+    except FileNotFoundError:
+        size = 0
+    if size + len(line) > CHANGE_LOG_MAX_BYTES:
+        with open(log_path) as f:
+            lines = f.readlines()
+        with open(log_path, "w") as f:
+            f.writelines(lines[len(lines) // 2:])
+    with open(log_path, "a") as f:
+        f.write(line + "\n")
+
+
+def changes_since(path, version):
+    """Ticket IDs changed after `version` up to the current one, or None when that is unknown:
+    a bump that changed everything, or a change old enough to have left the log."""
+    current = get_version(path)
+    if version == current:
+        return set()
+    changed = set()
+    seen = set()
+    try:
+        with open(path + ".changes") as f:
+            for line in f:
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    continue
+                if version < change["version"] <= current:
+                    if change["tickets"] is None:
+                        return None
+                    seen.add(change["version"])
+                    changed.update(change["tickets"])
+    except FileNotFoundError:
+        return None
+    return changed if len(seen) == current - version else None
+
+
+def bump_version(path, ticket_ids=None):
+    """Increments the version stored at `path`; returns the new version.
+
+    `ticket_ids` names the tickets the change touched; None means it may have touched any.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with _lock:
+        with open(path + ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                version = _read_file(path) + 1
+                _log_change(path, version, None if ticket_ids is None else {str(t) for t in ticket_ids})
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    f.write(str(version))
+                os.replace(tmp_path, path)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return version
+
+
+def get_data_version():
+    return get_version(DATA_VERSION_PATH)
+
+
+def bump_data_version(ticket_ids=None):
+    """Marks the ticket data as changed; returns the new version.
+
+    Pass the tickets an edit touched, or an empty list when only derived data such as
+    the dashboard counts changed, so caches keep everything else; None means anything may have.
+    """
+    return bump_version(DATA_VERSION_PATH, ticket_ids)
+
+
+def data_changes_since(version):
+    return changes_since(DATA_VERSION_PATH, version)
+
+
+def bump_vector_version(ticket_ids=None):
+    """Marks these tickets' LanceDB rows as rewritten; returns the new version."""
+    return bump_version(VECTOR_VERSION_PATH, ticket_ids)
+
+
+def get_routing_version():
+    return get_version(ROUTING_VERSION_PATH)
+
+
+def bump_routing_version():
+    """Marks the employee routing as changed; returns the new version."""
+    return bump_version(ROUTING_VERSION_PATH)
@@ -1,15 +1,205 @@
 import mysql.connector
+from mysql.connector import errors
 import os
+import threading
+import time
 from dotenv import load_dotenv
 load_dotenv()
 h = os.getenv("MYSQL_HOST")
 u = os.getenv("MYSQL_USER")
 p = os.getenv("MYSQL_PASSWORD")
 d = os.getenv("MYSQL_DATABASE")
-def get_connection():
+
+# === Pool config ===
+POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "10"))
+POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", "10"))
+# Connections idle for less than this are handed out without a ping
+POOL_PING_AFTER = float(os.getenv("MYSQL_POOL_PING_AFTER", "5"))
+
+
+def _connect():
     return mysql.connector.connect(
         host=h,
         user=u,
         password=p,
         database=d if d else "ticket2"
     )
+
+
+class PooledConnection:
+    """Wraps a pooled mysql connection; close() and `with` return it to the pool."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        if self.__dict__.get("_raw") is None:
+            raise errors.InterfaceError("Connection already returned to the pool")
+        return getattr(self._raw, name)
+
+    def close(self):
+        if self.__dict__.get("_raw") is not None:
+            raw, self._raw = self._raw, None
+            self._pool.release(raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __del__(self):
+        # Callers that forget close() (the old lang.py helpers did) still give the slot back
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT, ping_after=POOL_PING_AFTER, connect=_connect):
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._connect = connect
+        # Idle (raw, returned_at) pairs, newest last; release() and _drop_slot() notify _available
+        self._idle = []
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._created = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._health_check_failures = 0
+        self._timeouts = 0
+
+    def _drop_slot(self):
+        with self._available:
+            self._created -= 1
+            self._available.notify()
+
+    def _take(self, deadline):
+        """An idle (raw, returned_at) pair, or None once a slot is reserved for a new connection.
+
+        Waits until a connection is released or a discarded one frees its slot.
+        """
+        with self._available:
+            started = None
+            try:
+                while True:
+                    if self._idle:
+                        return self._idle.pop()
+                    if self._created < self.size:
+                        self._created += 1
+                        return None
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise errors.PoolError(
+                            f"No MySQL connection available within {self.timeout}s (pool size {self.size})"
+                        )
+                    if started is None:
+                        started = time.perf_counter()
+                    self._available.wait(remaining)
+            finally:
+                if started is not None:
+                    waited = time.perf_counter() - started
+                    self._waits += 1
+                    self._wait_time += waited
+                    self._max_wait_time = max(self._max_wait_time, waited)
+
+    def _healthy(self, raw, returned_at):
+        if time.monotonic() - returned_at < self.ping_after:
+            return True
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._lock:
+                self._health_check_failures += 1
+            try:
+                raw.close()
+            except Exception:
+                pass
+            return False
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            idle = self._take(deadline)
+            if idle is None:
+                try:
+                    raw = self._connect()
+                except Exception:
+                    self._drop_slot()
+                    raise
+                break
+            raw, returned_at = idle
+            if self._healthy(raw, returned_at):
+                break
+            # Broken connection: free its slot and try again
+            self._drop_slot()
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+        return PooledConnection(self, raw)
+
+    def release(self, raw):
+        with self._lock:
+            self._in_use -= 1
+        try:
+            # End any open transaction so the next borrower does not read a stale snapshot
+            raw.rollback()
+        except Exception:
+            try:
+                raw.close()
+            except Exception:
+                pass
+            self._drop_slot()
+            return
+        with self._available:
+            self._idle.append((raw, time.monotonic()))
+            self._available.notify()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_seconds": round(self._wait_time, 6),
+                "max_wait_time_seconds": round(self._max_wait_time, 6),
+                "timeouts": self._timeouts,
+                "health_check_failures": self._health_check_failures,
+            }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool, _pool_pid
+    # Sockets must not be shared across fork(), so each worker process gets its own pool
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ConnectionPool()
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def get_connection():
+    return get_pool().acquire()
+
+
+def get_pool_stats():
+    return get_pool().stats()
@@ -1,54 +1,137 @@
-from sentence_transformers import SentenceTransformer
-import lancedb
 import os
-from ticketbackend.database import get_connection
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+try:
+    from ticketbackend.data_version import bump_data_version
+except ImportError:
+    from data_version import bump_data_version
+load_dotenv()
 
-embedding_model = SentenceTransformer("sentence-transformers/all-mpnet-base-v2")
+# === Shared embedding service ===
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2")
+# torch: full-precision PyTorch; onnx: ONNX Runtime; onnx-int8: ONNX Runtime on a
+# dynamically int8-quantized export. The ONNX ones need optimum[onnxruntime].
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+# Quantization preset for onnx-int8: arm64, avx2, avx512 or avx512_vnni (what the CPU supports)
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "avx2")
+# Quantized exports are written here once per host and reused on later starts
+EMBEDDING_EXPORT_DIR = os.getenv("EMBEDDING_EXPORT_DIR", "ticketbackend/models")
+SUPPORTED_BACKENDS = ("torch", "onnx", "onnx-int8")
+QUERY_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+ENCODE_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
 
-LANCE_DB_PATH = os.getenv("LANCE_DB_PATH", "ticketbackend/lancedb_data")
-TABLE_NAME = "tickets"
+_model = None
+_model_lock = threading.Lock()
 
-def get_lance_table():
-    db = lancedb.connect(LANCE_DB_PATH)
-    # DROP existing table if it exists
-    if TABLE_NAME in db.table_names():
-        db.drop_table(TABLE_NAME)
-        print("🧹 Dropped existing LanceDB table.")
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_hits = 0
+_cache_misses = 0
 
-    # Create a fresh table with no data
+
+def export_quantized_model(model_name=None, quantization=None):
+    """Exports the model to ONNX with int8 dynamic quantization, once; returns (directory, file name)."""
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+    model_name = model_name or EMBEDDING_MODEL_NAME
+    quantization = quantization or EMBEDDING_QUANTIZATION
+    directory = os.path.join(EMBEDDING_EXPORT_DIR, model_name.replace("/", "__"))
+    file_name = f"onnx/model_qint8_{quantization}.onnx"
+    if not os.path.exists(os.path.join(directory, file_name)):
+        print(f"ℹ️ Exporting {model_name} to int8 ONNX ({quantization}) under {directory}")
+        model = SentenceTransformer(model_name, backend="onnx")
+        model.save_pretrained(directory)
+        export_dynamic_quantized_onnx_model(model, quantization, directory)
+    return directory, file_name
+
+
+def load_embedding_model(model_name=None, backend=None):
+    model_name = model_name or EMBEDDING_MODEL_NAME
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend not in SUPPORTED_BACKENDS:
+        raise ValueError(f"Unsupported EMBEDDING_BACKEND {backend}; use one of {SUPPORTED_BACKENDS}")
+    from sentence_transformers import SentenceTransformer
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx")
+    directory, file_name = export_quantized_model(model_name)
+    return SentenceTransformer(directory, backend="onnx", model_kwargs={"file_name": file_name})
+
+
+def get_embedding_model():
+    """The process-wide embedding model for EMBEDDING_MODEL/EMBEDDING_BACKEND, loaded on first use."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = load_embedding_model()
+    return _model
+
+
+def embedding_metadata():
+    """What the vectors in the tickets table were made with; stored in its schema metadata."""
+    return {
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "embedding_backend": EMBEDDING_BACKEND,
+        "embedding_dim": str(get_embedding_model().get_sentence_embedding_dimension()),
+    }
+
+
+def normalize_query(text):
+    return " ".join(text.lower().split())
+
+
+def encode_query(text):
+    """Embeds one query, answering repeats from an LRU cache keyed by normalized text."""
+    global _cache_hits, _cache_misses
+    key = normalize_query(text)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            _cache_hits += 1
+            return list(cached)
+        _cache_misses += 1
+
+    vector = tuple(get_embedding_model().encode(key).tolist())
+    with _cache_lock:
+        _cache[key] = vector
+        _cache.move_to_end(key)
+        while len(_cache) > QUERY_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return list(vector)
+
+
+def encode_many(texts, batch_size=None):
+    """Batch-encodes documents; returns a numpy array with one row per text."""
+    return get_embedding_model().encode(
+        list(texts), batch_size=batch_size or ENCODE_BATCH_SIZE, show_progress_bar=False
+    )
+
+
+def get_embedding_cache_stats():
+    with _cache_lock:
+        lookups = _cache_hits + _cache_misses
+        return {
+            "model": EMBEDDING_MODEL_NAME,
+            "backend": EMBEDDING_BACKEND,
+            "model_loaded": _model is not None,
+            "size": len(_cache),
+            "max_size": QUERY_CACHE_SIZE,
+            "hits": _cache_hits,
+            "misses": _cache_misses,
+            "hit_rate": round(_cache_hits / lookups, 4) if lookups else None,
+        }
+
+
+def build_embeddings_and_store(rebuild=False):
     try:
-        print(f"opening table {TABLE_NAME}")
-        return db.open_table(TABLE_NAME)
-    except:
-        print("NEW TABLE CREATION!?!")
-        return db.create_table(TABLE_NAME, schema={
-            "ticket_id": "string",
-            "content": "string",
-            "embedding": "vector<float>",
-        })
-
-def build_embeddings_and_store():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT m.ticket_id, m.title, m.description, p.summary, p.solution, p.category
-        FROM main_table m
-        JOIN processed p ON m.ticket_id = p.ticket_id
-    """)
-    tickets = cursor.fetchall()
-
-    docs = []
-    for t in tickets:
-        content = f"Title: {t[1]}\nDescription: {t[2]}\nSummary: {t[3]}\nSolution: {t[4]}\nCategory: {t[5]}"
-        embedding = embedding_model.encode(content).tolist()
-        docs.append({
-            "ticket_id": t[0],
-            "content": content,
-            "embedding": embedding
-        })
-
-    table = get_lance_table()
-    table.add(docs)
-
-    cursor.close()
-    conn.close()
+        from ticketbackend.lancesync import sync_tickets
+    except ImportError:
+        from lancesync import sync_tickets
+    stats = sync_tickets(rebuild=rebuild)
+    print(f"✅ LanceDB sync: {stats}")
+    if stats["inserted"] or stats["updated"] or stats["deleted"]:
+        bump_data_version()
+    return stats
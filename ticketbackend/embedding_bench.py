@@ -0,0 +1,133 @@
+import argparse
+import gc
+import json
+import random
+import time
+import numpy as np
+from dotenv import load_dotenv
+try:
+    from ticketbackend.embedding import load_embedding_model, EMBEDDING_MODEL_NAME, ENCODE_BATCH_SIZE
+    from ticketbackend.lancesync import LANCE_DB_PATH, TABLE_NAME, build_embed_text
+    from ticketbackend.lanceindex import _percentile
+except ImportError:
+    from embedding import load_embedding_model, EMBEDDING_MODEL_NAME, ENCODE_BATCH_SIZE
+    from lancesync import LANCE_DB_PATH, TABLE_NAME, build_embed_text
+    from lanceindex import _percentile
+load_dotenv()
+
+# Compares embedding models/backends on the ticket corpus in LanceDB. The first
+# candidate is the reference: recall@k is how many of its top-k neighbours each
+# other candidate also returns, so it measures drift from today's retrieval.
+DEFAULT_CANDIDATES = [
+    f"{EMBEDDING_MODEL_NAME}@torch",
+    f"{EMBEDDING_MODEL_NAME}@onnx",
+    f"{EMBEDDING_MODEL_NAME}@onnx-int8",
+    "sentence-transformers/all-MiniLM-L6-v2@torch",
+]
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def load_corpus(docs, queries, seed=0):
+    """(document texts, query texts): tickets as sync embeds them, and titles as stand-in questions."""
+    import lancedb
+    table = lancedb.connect(LANCE_DB_PATH).open_table(TABLE_NAME)
+    columns = ["ticket_id", "title", "status", "reported_date", "summary",
+               "description", "triage", "category", "solution"]
+    rows = table.search().select(columns).limit(docs).to_list()
+    texts = [build_embed_text(row) for row in rows]
+    titles = [row["title"] for row in rows if row["title"]]
+    random.Random(seed).shuffle(titles)
+    return texts, titles[:queries]
+
+
+def _top_k(doc_vectors, query_vectors, k):
+    docs = doc_vectors / np.linalg.norm(doc_vectors, axis=1, keepdims=True).clip(1e-12)
+    queries = query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True).clip(1e-12)
+    scores = queries @ docs.T
+    return [set(row) for row in np.argsort(-scores, axis=1)[:, :k]]
+
+
+def measure(spec, texts, queries, batch_size):
+    model_name, _, backend = spec.partition("@")
+    gc.collect()
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    model = load_embedding_model(model_name, backend or "torch")
+    load_seconds = time.perf_counter() - started
+    rss_loaded = _rss_mb()
+
+    model.encode(texts[:batch_size], batch_size=batch_size, show_progress_bar=False)  # warm kernels
+    started = time.perf_counter()
+    doc_vectors = np.asarray(model.encode(texts, batch_size=batch_size, show_progress_bar=False))
+    encode_seconds = time.perf_counter() - started
+
+    latencies = []
+    query_vectors = []
+    for query in queries:
+        started = time.perf_counter()
+        query_vectors.append(model.encode(query))
+        latencies.append(time.perf_counter() - started)
+    rss_peak = _rss_mb()
+    del model
+    return {
+        "candidate": spec,
+        "dim": int(doc_vectors.shape[1]),
+        "load_seconds": round(load_seconds, 2),
+        "docs_per_sec": round(len(texts) / encode_seconds, 1),
+        "query_p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "query_p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+        "model_rss_mb": round(rss_loaded - rss_before, 1) if rss_before is not None else None,
+        "encode_rss_mb": round(rss_peak - rss_before, 1) if rss_before is not None else None,
+    }, doc_vectors, np.asarray(query_vectors)
+
+
+def compare(candidates, docs=2000, queries=100, k=3, batch_size=None, seed=0):
+    texts, query_texts = load_corpus(docs, queries, seed)
+    batch_size = batch_size or ENCODE_BATCH_SIZE
+    print(f"ℹ️ {len(texts)} tickets, {len(query_texts)} queries, recall@{k} against {candidates[0]}")
+    report = []
+    reference = None
+    for spec in candidates:
+        try:
+            row, doc_vectors, query_vectors = measure(spec, texts, query_texts, batch_size)
+        except Exception as e:
+            print(f"❌ {spec}: {e}")
+            report.append({"candidate": spec, "error": str(e)})
+            continue
+        neighbours = _top_k(doc_vectors, query_vectors, k)
+        if reference is None:
+            reference = neighbours
+        row[f"recall_at_{k}"] = round(
+            sum(len(a & b) for a, b in zip(reference, neighbours)) / max(1, k * len(neighbours)), 4
+        )
+        report.append(row)
+        print(f"⏱️ {row}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark embedding models/backends on the ticket corpus.")
+    parser.add_argument("candidates", nargs="*", default=DEFAULT_CANDIDATES,
+                        help="model@backend, backend one of torch, onnx, onnx-int8; the first is the reference")
+    parser.add_argument("--docs", type=int, default=2000, help="tickets to encode")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--output", default=None, help="also write the report as JSON")
+    args = parser.parse_args()
+
+    results = compare(args.candidates, docs=args.docs, queries=args.queries, k=args.k, batch_size=args.batch_size)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Report written to {args.output}")
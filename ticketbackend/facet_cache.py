@@ -0,0 +1,63 @@
+import os
+import threading
+import time
+try:
+    from ticketbackend.database import get_connection
+    from ticketbackend.ticket_queries import fetch_facets
+    from ticketbackend.data_version import get_data_version
+except ImportError:
+    from database import get_connection
+    from ticket_queries import fetch_facets
+    from data_version import get_data_version
+
+# === Facet cache config ===
+FACET_CACHE_TTL = float(os.getenv("FACET_CACHE_TTL", "300"))
+
+_lock = threading.Lock()
+_facets = None
+_loaded_at = 0.0
+_loaded_version = None
+_hits = 0
+_misses = 0
+_invalidations = 0
+
+
+def get_cached_facets():
+    """Distinct category/status/assignee/source lists, reloaded at most once per TTL
+    or when another process bumps the data version."""
+    global _facets, _loaded_at, _loaded_version, _hits, _misses
+    version = get_data_version()
+    with _lock:
+        if (_facets is not None and _loaded_version == version
+                and time.monotonic() - _loaded_at < FACET_CACHE_TTL):
+            _hits += 1
+            return _facets
+        _misses += 1
+        # Loading under the lock means concurrent misses share one set of DISTINCT scans
+        conn = get_connection()
+        try:
+            _facets = fetch_facets(conn)
+        finally:
+            conn.close()
+        _loaded_at = time.monotonic()
+        _loaded_version = version
+        return _facets
+
+
+def invalidate_facets():
+    global _facets, _invalidations
+    with _lock:
+        _facets = None
+        _invalidations += 1
+
+
+def get_facet_cache_stats():
+    with _lock:
+        return {
+            "ttl_seconds": FACET_CACHE_TTL,
+            "cached": _facets is not None,
+            "age_seconds": round(time.monotonic() - _loaded_at, 3) if _facets is not None else None,
+            "hits": _hits,
+            "misses": _misses,
+            "invalidations": _invalidations,
+        }
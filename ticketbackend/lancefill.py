@@ -1,109 +1,53 @@
-import os
-import lancedb
-import mysql.connector
-from sentence_transformers import SentenceTransformer
+import argparse
 from dotenv import load_dotenv
-import numpy as np
+from lancesync import sync_tickets, FETCH_SIZE, ENCODE_BATCH_SIZE, WRITE_BATCH_SIZE, ENCODE_WORKERS
+from data_version import bump_data_version
 from database import get_connection
+from ticket_stats import reconcile_stats
+from lanceindex import build_vector_index
 load_dotenv()
 
-# === LanceDB config ===
-LANCE_DB_PATH = "ticketbackend/lancedb_data"
-TABLE_NAME = "tickets"
 
-# === Embedding model ===
-embedding_model = SentenceTransformer("sentence-transformers/all-mpnet-base-v2")
-
-# === Connect to MySQL ===
-conn = get_connection()
-cursor = conn.cursor()
-cursor.execute("""
-    SELECT p.ticket_id, m.title, p.summary, p.solution, p.category
-    FROM processed AS p
-    JOIN main_table AS m ON p.ticket_id = m.ticket_id
-""")
-rows = cursor.fetchall()
-
-# === Connect to LanceDB ===
-db = lancedb.connect(LANCE_DB_PATH)
-
-# === Drop table if it exists (to prevent duplicates) ===
-if TABLE_NAME in db.table_names():
-    db.drop_table(TABLE_NAME)
-    print("🧹 Dropped existing LanceDB table.")
-
-# === Create new empty table ===
-dummy_row = [{
-    "ticket_id": "No ID",
-    "title": "No title",
-    "status": "No status",
-    "reported_date": str("No date"),
-    "summary": "No summary",
-    "description": "No description",
-    "triage": "No triage",
-    "category": "No category",
-    "solution": "No solution",
-    "vector": embedding_model.encode("No summary").tolist(),
-}]
-table = db.create_table(TABLE_NAME, data=dummy_row)
-# Remove dummy row immediately
-table.delete("ticket_id = 'dummy'")
-print("✅ Created fresh LanceDB table.")
-
-# === Deduplicate and insert ===
-seen_ids = set()
-unique_data = []
-
-cursor.execute("""
-    SELECT m.ticket_id, m.title, m.status, m.reported_date, p.summary,
-           m.description, p.triage, p.category, p.solution
-    FROM main_table AS m
-    JOIN processed AS p ON m.ticket_id = p.ticket_id
-    JOIN assign AS a ON m.ticket_id = a.ticket_id
-""")
-rows = cursor.fetchall()
-
-seen_ids = set()
-unique_data = []
-
-for row in rows:
-    (ticket_id, title, status, reported_date, summary, 
-     description, triage, category, solution) = row
-
-    if ticket_id in seen_ids:
-        continue
-    seen_ids.add(ticket_id)
-
-    # Embed relevant context
-    embed_text = (
-        f"Ticket ID: {ticket_id}\n"
-        f"Title: {title}\n"
-        f"Status: {status}\n"
-        f"Reported Date: {reported_date}\n"
-        f"Summary: {summary}\n"
-        f"Description: {description}\n"
-        f"Triage: {triage}\n"
-        f"Category: {category}\n"
-        f"Solution: {solution}"
-    )   
-    vector = embedding_model.encode(embed_text).tolist()
-
-    unique_data.append({
-        "ticket_id": ticket_id,
-        "title": title,
-        "status": status,
-        "reported_date": str(reported_date),
-        "summary": summary,
-        "description": description,
-        "triage": triage,
-        "category": category,
-        "solution": solution,
-        "vector": vector
-    })
-
-if unique_data:
-    table.add(unique_data)
-    print(f"✅ Added {len(unique_data)} enriched tickets to LanceDB.")
-
-cursor.close()
-conn.close()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync MySQL tickets into the LanceDB tickets table.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="re-embed every ticket instead of only new or changed ones")
+    parser.add_argument("--fetch-size", type=int, default=FETCH_SIZE,
+                        help="rows read from MySQL per fetchmany()")
+    parser.add_argument("--batch-size", type=int, default=ENCODE_BATCH_SIZE,
+                        help="tickets encoded per model batch")
+    parser.add_argument("--write-batch", type=int, default=WRITE_BATCH_SIZE,
+                        help="rows written to LanceDB per upsert")
+    parser.add_argument("--workers", type=int, default=ENCODE_WORKERS,
+                        help="encoder processes (0 or 1 encodes in this process)")
+    parser.add_argument("--index", action="store_true",
+                        help="(re)build the ANN vector index after syncing")
+    args = parser.parse_args()
+
+    stats = sync_tickets(rebuild=args.rebuild, fetch_size=args.fetch_size, batch_size=args.batch_size,
+                         write_batch=args.write_batch, workers=args.workers)
+    print(
+        f"✅ LanceDB sync done: {stats['inserted']} inserted, {stats['updated']} updated, "
+        f"{stats['deleted']} deleted, {stats['skipped']} unchanged."
+    )
+    print(
+        f"⏱️ {stats['rows']} rows in {stats['seconds']}s "
+        f"({stats['rows_per_sec']} rows/s, {stats['embedded_per_sec']} embedded/s, "
+        f"peak RSS {stats['peak_rss_mb']} MB)"
+    )
+
+    if args.index:
+        import lancedb
+        from lancesync import LANCE_DB_PATH, TABLE_NAME
+        build_vector_index(lancedb.connect(LANCE_DB_PATH).open_table(TABLE_NAME))
+
+    if stats["inserted"] or stats["deleted"]:
+        # Ingestion writes tickets straight to MySQL; bring the dashboard counts up to date with them
+        with get_connection() as conn:
+            counted = reconcile_stats(conn)
+        if counted is not None:
+            print(f"✅ Recounted {counted} tickets into the dashboard summary tables")
+
+    if stats["inserted"] or stats["updated"] or stats["deleted"]:
+        # Let the API drop cached snapshots and ETags built from the old data
+        bump_data_version()
@@ -0,0 +1,156 @@
+import argparse
+import math
+import os
+import random
+import time
+from dotenv import load_dotenv
+try:
+    from ticketbackend.lancesync import LANCE_DB_PATH, TABLE_NAME
+except ImportError:
+    from lancesync import LANCE_DB_PATH, TABLE_NAME
+load_dotenv()
+
+# === ANN index config ===
+INDEX_TYPE = os.getenv("LANCE_INDEX_TYPE", "IVF_PQ")  # or IVF_HNSW_SQ
+NUM_PARTITIONS = int(os.getenv("LANCE_NUM_PARTITIONS", "0"))  # 0 = ~sqrt(rows)
+NUM_SUB_VECTORS = int(os.getenv("LANCE_NUM_SUB_VECTORS", "0"))  # 0 = dim / 16
+# Below this many rows a brute-force scan is fast and PQ training has too little data
+MIN_ROWS_FOR_INDEX = int(os.getenv("LANCE_MIN_ROWS_FOR_INDEX", "5000"))
+
+# === Query-time tuning (only used once the table has a vector index) ===
+NPROBES = int(os.getenv("LANCE_NPROBES", "20"))
+REFINE_FACTOR = int(os.getenv("LANCE_REFINE_FACTOR", "0"))  # 0 = no re-ranking
+
+SUPPORTED_INDEX_TYPES = ("IVF_PQ", "IVF_HNSW_SQ")
+
+
+def has_vector_index(table):
+    return any(idx.columns == ["vector"] for idx in table.list_indices())
+
+
+def _vector_dim(table):
+    return table.schema.field("vector").type.list_size
+
+
+def build_vector_index(table, index_type=None, num_partitions=None, num_sub_vectors=None, force=False):
+    """(Re)builds the ANN index on the vector column; returns False if the table is too small."""
+    index_type = (index_type or INDEX_TYPE).upper()
+    if index_type not in SUPPORTED_INDEX_TYPES:
+        raise ValueError(f"Unsupported index type {index_type}; use one of {SUPPORTED_INDEX_TYPES}")
+    rows = table.count_rows()
+    if rows < MIN_ROWS_FOR_INDEX and not force:
+        print(f"ℹ️ {rows} rows is below LANCE_MIN_ROWS_FOR_INDEX={MIN_ROWS_FOR_INDEX}; keeping brute-force search.")
+        return False
+
+    num_partitions = num_partitions or NUM_PARTITIONS or max(1, int(math.sqrt(rows)))
+    kwargs = {
+        "metric": "cosine",
+        "vector_column_name": "vector",
+        "index_type": index_type,
+        "num_partitions": num_partitions,
+        "replace": True,
+    }
+    if index_type == "IVF_PQ":
+        dim = _vector_dim(table)
+        sub_vectors = num_sub_vectors or NUM_SUB_VECTORS or max(1, dim // 16)
+        if dim % sub_vectors:
+            raise ValueError(f"num_sub_vectors={sub_vectors} must divide the vector dimension {dim}")
+        kwargs["num_sub_vectors"] = sub_vectors
+
+    started = time.perf_counter()
+    table.create_index(**kwargs)
+    print(f"✅ Built {index_type} index over {rows} rows "
+          f"({num_partitions} partitions) in {time.perf_counter() - started:.1f}s.")
+    return True
+
+
+def vector_search(table, query_vector, k, nprobes=None, refine_factor=None, bypass_index=False):
+    query = table.search(query_vector).distance_type("cosine").limit(k)
+    if bypass_index:
+        return query.bypass_vector_index()
+    nprobes = NPROBES if nprobes is None else nprobes
+    refine_factor = REFINE_FACTOR if refine_factor is None else refine_factor
+    if nprobes:
+        query = query.nprobes(nprobes)
+    if refine_factor:
+        query = query.refine_factor(refine_factor)
+    return query
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def recall_report(table, k=3, samples=100, nprobes_grid=(5, 10, 20, 50), refine_grid=(0, 5, 10), seed=0):
+    """Recall@k and latency of each nprobes/refine setting against brute force.
+
+    Query vectors are sampled from the table itself, so the report runs on the
+    real corpus without needing labelled queries.
+    """
+    total = table.count_rows()
+    if total == 0:
+        return []
+    vectors = table.search().select(["vector"]).limit(total).to_arrow()["vector"].to_pylist()
+    random.Random(seed).shuffle(vectors)
+    queries = vectors[:samples]
+
+    truth = []
+    brute_times = []
+    for q in queries:
+        started = time.perf_counter()
+        rows = vector_search(table, q, k, bypass_index=True).select(["ticket_id"]).to_list()
+        brute_times.append(time.perf_counter() - started)
+        truth.append({r["ticket_id"] for r in rows})
+
+    report = [{
+        "setting": "brute_force",
+        "recall_at_k": 1.0,
+        "p50_ms": round(_percentile(brute_times, 50) * 1000, 2),
+        "p95_ms": round(_percentile(brute_times, 95) * 1000, 2),
+    }]
+    if not has_vector_index(table):
+        return report
+
+    for nprobes in nprobes_grid:
+        for refine in refine_grid:
+            hits = 0
+            times = []
+            for q, expected in zip(queries, truth):
+                started = time.perf_counter()
+                rows = vector_search(table, q, k, nprobes=nprobes, refine_factor=refine).select(["ticket_id"]).to_list()
+                times.append(time.perf_counter() - started)
+                hits += len(expected & {r["ticket_id"] for r in rows})
+            report.append({
+                "setting": f"nprobes={nprobes} refine={refine}",
+                "recall_at_k": round(hits / max(1, sum(len(t) for t in truth)), 4),
+                "p50_ms": round(_percentile(times, 50) * 1000, 2),
+                "p95_ms": round(_percentile(times, 95) * 1000, 2),
+            })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the ANN index on the LanceDB tickets table.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="build or rebuild the vector index")
+    build.add_argument("--type", default=INDEX_TYPE, choices=SUPPORTED_INDEX_TYPES)
+    build.add_argument("--partitions", type=int, default=None)
+    build.add_argument("--sub-vectors", type=int, default=None)
+    build.add_argument("--force", action="store_true", help="index even below LANCE_MIN_ROWS_FOR_INDEX")
+    report = sub.add_parser("report", help="recall vs latency against brute force")
+    report.add_argument("-k", type=int, default=3)
+    report.add_argument("--samples", type=int, default=100)
+    report.add_argument("--nprobes", type=int, nargs="+", default=[5, 10, 20, 50])
+    report.add_argument("--refine", type=int, nargs="+", default=[0, 5, 10])
+    args = parser.parse_args()
+
+    import lancedb
+    table = lancedb.connect(LANCE_DB_PATH).open_table(TABLE_NAME)
+    if args.command == "build":
+        build_vector_index(table, args.type, args.partitions, args.sub_vectors, force=args.force)
+    else:
+        for row in recall_report(table, k=args.k, samples=args.samples,
+                                 nprobes_grid=args.nprobes, refine_grid=args.refine):
+            print(f"{row['setting']:<24} recall@{args.k}={row['recall_at_k']:<7} "
+                  f"p50={row['p50_ms']}ms p95={row['p95_ms']}ms")
@@ -0,0 +1,378 @@
+import hashlib
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from dotenv import load_dotenv
+try:
+    from ticketbackend.database import get_connection
+    from ticketbackend.embedding import encode_many, get_embedding_model, embedding_metadata
+    from ticketbackend.answer_cache import invalidate_tickets
+except ImportError:
+    from database import get_connection
+    from embedding import encode_many, get_embedding_model, embedding_metadata
+    from answer_cache import invalidate_tickets
+load_dotenv()
+
+# === LanceDB config ===
+LANCE_DB_PATH = os.getenv("LANCE_DB_PATH", "ticketbackend/lancedb_data")
+TABLE_NAME = "tickets"
+# Full rebuilds are written here and swapped in once complete, so the API never reads a partial table
+STAGING_TABLE_NAME = f"{TABLE_NAME}_staging"
+DELETE_CHUNK = 500
+
+# === Ingestion pipeline config ===
+FETCH_SIZE = int(os.getenv("LANCE_SYNC_FETCH_SIZE", "1000"))
+ENCODE_BATCH_SIZE = int(os.getenv("LANCE_SYNC_ENCODE_BATCH", "64"))
+WRITE_BATCH_SIZE = int(os.getenv("LANCE_SYNC_WRITE_BATCH", "1000"))
+# > 1 spreads encoding across that many processes; worth it on many-core CPU hosts
+ENCODE_WORKERS = int(os.getenv("LANCE_SYNC_WORKERS", "0"))
+TICKET_COLUMNS = [
+    "ticket_id", "title", "status", "reported_date", "summary",
+    "description", "triage", "category", "solution", "vector",
+]
+
+# Full-text (BM25) indexed, one index per column
+TEXT_COLUMNS = ["title", "summary", "description", "solution"]
+# Low-cardinality columns chat queries prefilter on; bitmap indexed
+FILTER_COLUMNS = ["category", "status", "triage"]
+
+SYNC_QUERY = """
+    SELECT m.ticket_id, m.title, m.status, m.reported_date, p.summary,
+           m.description, p.triage, p.category, p.solution
+    FROM main_table AS m
+    JOIN processed AS p ON m.ticket_id = p.ticket_id
+    JOIN assign AS a ON m.ticket_id = a.ticket_id
+"""
+
+_MISSING = object()
+
+
+def build_embed_text(ticket):
+    return (
+        f"Ticket ID: {ticket['ticket_id']}\n"
+        f"Title: {ticket['title']}\n"
+        f"Status: {ticket['status']}\n"
+        f"Reported Date: {ticket['reported_date']}\n"
+        f"Summary: {ticket['summary']}\n"
+        f"Description: {ticket['description']}\n"
+        f"Triage: {ticket['triage']}\n"
+        f"Category: {ticket['category']}\n"
+        f"Solution: {ticket['solution']}"
+    )
+
+
+def row_to_ticket(row):
+    (ticket_id, title, status, reported_date, summary,
+     description, triage, category, solution) = row
+    ticket = {
+        "ticket_id": ticket_id,
+        "title": title,
+        "status": status,
+        "reported_date": str(reported_date),
+        "summary": summary,
+        "description": description,
+        "triage": triage,
+        "category": category,
+        "solution": solution,
+    }
+    # The hash covers exactly what gets embedded, so unchanged text is never re-encoded
+    ticket["content_hash"] = hashlib.sha256(build_embed_text(ticket).encode()).hexdigest()
+    return ticket
+
+
+def sql_in_list(values):
+    return ", ".join("'" + str(v).replace("'", "''") + "'" for v in values)
+
+
+def open_tickets_table(db):
+    if TABLE_NAME not in db.table_names():
+        return None
+    table = db.open_table(TABLE_NAME)
+    if any(col not in table.schema.names for col in TICKET_COLUMNS):
+        # Placeholder or legacy layout that merge_insert cannot update in place
+        return None
+    if "content_hash" not in table.schema.names:
+        # Tables written before incremental sync: every row counts as changed once
+        table.add_columns({"content_hash": "CAST(NULL AS STRING)"})
+    return table
+
+
+def table_embedding(table):
+    """The embedding metadata stamped on the table; older tables only know their vector width."""
+    stored = {k.decode(): v.decode() for k, v in (table.schema.metadata or {}).items()}
+    stored.setdefault("embedding_dim", str(table.schema.field("vector").type.list_size))
+    return stored
+
+
+def embedding_mismatch(table):
+    """Why the table's vectors can't be compared with the current model's, or None.
+
+    Backends of the same model (torch, onnx, onnx-int8) share a vector space,
+    so only the model name and dimension have to agree.
+    """
+    stored = table_embedding(table)
+    current = embedding_metadata()
+    if stored["embedding_dim"] != current["embedding_dim"]:
+        return f"table vectors have {stored['embedding_dim']} dimensions, the model makes {current['embedding_dim']}"
+    if stored.get("embedding_model", current["embedding_model"]) != current["embedding_model"]:
+        return f"table was embedded with {stored['embedding_model']}, not {current['embedding_model']}"
+    return None
+
+
+def record_embedding(table):
+    current = embedding_metadata()
+    if {k: table_embedding(table).get(k) for k in current} != current:
+        table.to_lance().update_schema_metadata(current)
+
+
+def existing_hashes(table):
+    """ticket_id -> content_hash for the rows already in LanceDB (no vectors read)."""
+    total = table.count_rows()
+    if total == 0:
+        return {}
+    data = (
+        table.search()
+        .select(["ticket_id", "content_hash"])
+        .limit(total)
+        .to_arrow()
+    )
+    return dict(zip(data["ticket_id"].to_pylist(), data["content_hash"].to_pylist()))
+
+
+def iter_ticket_chunks(cursor, fetch_size):
+    """Streams the sync query in fetchmany() chunks instead of one fetchall()."""
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        yield [row_to_ticket(row) for row in rows]
+
+
+def iter_tickets_to_embed(chunks, current, stats, rebuild, batch_size):
+    """Yields batches of new or changed tickets.
+
+    Seen IDs are popped from `current`, so whatever is left in it afterwards
+    is in LanceDB but no longer in MySQL.
+    """
+    seen = set()
+    pending = []
+    for chunk in chunks:
+        for ticket in chunk:
+            ticket_id = ticket["ticket_id"]
+            # assign may hold several rows per ticket; keep the first
+            if ticket_id in seen:
+                continue
+            seen.add(ticket_id)
+            stats["rows"] += 1
+            old_hash = current.pop(ticket_id, _MISSING)
+            if old_hash is _MISSING:
+                stats["inserted"] += 1
+            elif rebuild or old_hash != ticket["content_hash"]:
+                stats["updated"] += 1
+            else:
+                stats["skipped"] += 1
+                continue
+            pending.append(ticket)
+            if len(pending) >= batch_size:
+                yield pending
+                pending = []
+    if pending:
+        yield pending
+
+
+def _init_encode_worker(workers):
+    # Split the cores between worker processes instead of letting each one grab all of them
+    try:
+        import torch
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+    except ImportError:
+        pass
+    get_embedding_model()
+
+
+def _attach_vectors(tickets, vectors):
+    for ticket, vector in zip(tickets, vectors):
+        ticket["vector"] = vector.tolist()
+    return tickets
+
+
+def iter_embedded(batches, batch_size, workers=0):
+    """Encodes each batch in-process, or across `workers` processes when workers > 1."""
+    if workers <= 1:
+        for tickets in batches:
+            yield _attach_vectors(tickets, encode_many([build_embed_text(t) for t in tickets], batch_size))
+        return
+
+    # spawn, not fork: neither torch nor lancedb's runtime is safe to fork mid-flight
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_encode_worker, initargs=(workers,),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        # Bound the batches in flight so memory does not grow with the corpus
+        inflight = deque()
+        for tickets in batches:
+            texts = [build_embed_text(t) for t in tickets]
+            inflight.append((tickets, pool.submit(encode_many, texts, batch_size)))
+            if len(inflight) >= workers * 2:
+                done, future = inflight.popleft()
+                yield _attach_vectors(done, future.result())
+        while inflight:
+            done, future = inflight.popleft()
+            yield _attach_vectors(done, future.result())
+
+
+def embed_tickets(tickets, batch_size=None):
+    if not tickets:
+        return tickets
+    texts = [build_embed_text(t) for t in tickets]
+    return _attach_vectors(tickets, encode_many(texts, batch_size or ENCODE_BATCH_SIZE))
+
+
+def upsert_tickets(table, tickets):
+    (
+        table.merge_insert("ticket_id")
+        .when_matched_update_all()
+        .when_not_matched_insert_all()
+        .execute(tickets)
+    )
+
+
+def delete_tickets(table, ticket_ids):
+    ticket_ids = list(ticket_ids)
+    for i in range(0, len(ticket_ids), DELETE_CHUNK):
+        table.delete(f"ticket_id IN ({sql_in_list(ticket_ids[i:i + DELETE_CHUNK])})")
+
+
+def ensure_search_indexes(table, data_changed=True):
+    """Keeps the scalar and full-text indexes retrieval relies on.
+
+    BTREE on ticket_id for ID point lookups, BITMAP on the filter columns and an
+    FTS index per text column. Rows written since the last build are still
+    searched (unindexed), and optimize() folds them in.
+    """
+    from lancedb.index import FTS
+    existing = {(idx.index_type, tuple(idx.columns)) for idx in table.list_indices()}
+    if not any(columns == ("ticket_id",) for _, columns in existing):
+        table.create_scalar_index("ticket_id")
+    for column in FILTER_COLUMNS:
+        if not any(columns == (column,) for _, columns in existing):
+            table.create_scalar_index(column, index_type="BITMAP")
+    for column in TEXT_COLUMNS:
+        if ("FTS", (column,)) not in existing:
+            table.create_index(column, config=FTS(with_position=False))
+    if data_changed and existing:
+        # Folds newly written rows into the indexes that predate this sync
+        table.optimize()
+
+
+def publish_staging(db, staging):
+    """Replaces the live table with the staging one in a single overwrite commit.
+
+    LanceDB OSS cannot rename tables; until this commit lands, readers keep
+    seeing the old table in full.
+    """
+    table = db.create_table(TABLE_NAME, data=staging.to_lance().to_batches(), schema=staging.schema,
+                            mode="overwrite")
+    db.drop_table(STAGING_TABLE_NAME)
+    return table
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def sync_tickets(rebuild=False, fetch_size=None, batch_size=None, write_batch=None, workers=None):
+    """Brings the LanceDB tickets table in line with MySQL.
+
+    Rows are streamed from MySQL, only new or changed tickets are embedded, and
+    they are upserted in bounded batches; tickets gone from MySQL are deleted.
+    The live table is never dropped. rebuild=True re-embeds every ticket, and is
+    required after switching to a model whose vectors differ; that one, like a first
+    sync, builds a staging table and swaps it in only once every ticket is written.
+    """
+    fetch_size = fetch_size or FETCH_SIZE
+    batch_size = batch_size or ENCODE_BATCH_SIZE
+    write_batch = write_batch or WRITE_BATCH_SIZE
+    workers = ENCODE_WORKERS if workers is None else workers
+
+    import lancedb
+    started = time.perf_counter()
+    db = lancedb.connect(LANCE_DB_PATH)
+    table = open_tickets_table(db)
+    if table is not None:
+        problem = embedding_mismatch(table)
+        if problem and not rebuild:
+            raise RuntimeError(f"{problem}; run lancefill.py --rebuild to re-embed with the new model")
+        if problem:
+            # Upserts can't change the vector width: build a replacement table instead
+            print(f"⚠️ {problem}; rebuilding into {STAGING_TABLE_NAME}")
+            table = None
+    current = existing_hashes(table) if table is not None else {}
+    stats = {"rows": 0, "inserted": 0, "updated": 0, "deleted": 0, "skipped": 0}
+
+    buffer = []
+    staging = None
+
+    def flush():
+        nonlocal staging
+        if not buffer:
+            return
+        if table is not None:
+            upsert_tickets(table, buffer)
+        elif staging is None:
+            # Overwrites what a failed earlier rebuild left behind
+            staging = db.create_table(STAGING_TABLE_NAME, data=buffer, mode="overwrite")
+        else:
+            staging.add(buffer)
+        # Cached chatbot answers quoting these tickets are now stale
+        invalidate_tickets(t["ticket_id"] for t in buffer)
+        buffer.clear()
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        # Embedding can stall the read side for a while; don't let the server drop the stream
+        cursor.execute("SET SESSION net_write_timeout = 3600")
+        cursor.execute(SYNC_QUERY)
+        chunks = iter_ticket_chunks(cursor, fetch_size)
+        batches = iter_tickets_to_embed(chunks, current, stats, rebuild, batch_size)
+        for tickets in iter_embedded(batches, batch_size, workers):
+            buffer.extend(tickets)
+            if len(buffer) >= write_batch:
+                flush()
+        flush()
+    finally:
+        cursor.close()
+        try:
+            reset = conn.cursor()
+            reset.execute("SET SESSION net_write_timeout = DEFAULT")
+            reset.close()
+        except Exception:
+            pass
+        conn.close()
+
+    if staging is not None:
+        table = publish_staging(db, staging)
+        print(f"✅ Swapped {stats['rows']} tickets into {TABLE_NAME}")
+
+    if current and table is not None:
+        delete_tickets(table, current.keys())
+        invalidate_tickets(current.keys())
+        stats["deleted"] = len(current)
+
+    if table is not None:
+        record_embedding(table)
+        ensure_search_indexes(table, data_changed=bool(stats["inserted"] or stats["updated"] or stats["deleted"]))
+
+    elapsed = time.perf_counter() - started
+    embedded = stats["inserted"] + stats["updated"]
+    stats["seconds"] = round(elapsed, 2)
+    stats["rows_per_sec"] = round(stats["rows"] / elapsed, 1) if elapsed else None
+    stats["embedded_per_sec"] = round(embedded / elapsed, 1) if elapsed else None
+    stats["peak_rss_mb"] = _peak_rss_mb()
+    return stats
@@ -1,164 +1,300 @@
+import asyncio
+import contextvars
+import functools
+import gc
+import logging
 import os
 import re
-import lancedb
-import numpy as np
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 
 try:
-    from database import get_connection
+    from database import POOL_SIZE
+    from chat_history import get_recent_chat_history, record_exchange, set_summarizer, WRITE_BEHIND
+    from lancesync import sql_in_list, embedding_mismatch, LANCE_DB_PATH, TABLE_NAME
+    from reembed import set_table_getter
+    from retrieval import search_tickets
+    from embedding import encode_query, get_embedding_model, get_embedding_cache_stats
+    import answer_cache
+    from observability import span, record_stage, log_event, record_llm_usage, increment
 except ImportError:
-    from ticketbackend.database import get_connection
+    from ticketbackend.database import POOL_SIZE
+    from ticketbackend.chat_history import get_recent_chat_history, record_exchange, set_summarizer, WRITE_BEHIND
+    from ticketbackend.lancesync import sql_in_list, embedding_mismatch, LANCE_DB_PATH, TABLE_NAME
+    from ticketbackend.reembed import set_table_getter
+    from ticketbackend.retrieval import search_tickets
+    from ticketbackend.embedding import encode_query, get_embedding_model, get_embedding_cache_stats
+    from ticketbackend import answer_cache
+    from ticketbackend.observability import span, record_stage, log_event, record_llm_usage, increment
 
 
 load_dotenv()
 
 
-LANCE_DB_PATH = "ticketbackend/lancedb_data"
-TABLE_NAME = "tickets"
 TOP_K = 3
 
+# === Startup config ===
+# background: warm up after the server starts accepting requests (/ready says when done)
+# blocking: finish warming up before the first request is served; off: load on first use
+WARMUP = os.getenv("WARMUP", "background").lower()
+# Seconds between checks for writes made by other processes (lancefill.py); without
+# one, an open table handle never sees them
+LANCE_READ_CONSISTENCY = float(os.getenv("LANCE_READ_CONSISTENCY", "5"))
+# Load the embedding model at import so a pre-forking server (gunicorn --preload)
+# shares the weights copy-on-write across workers instead of loading them per worker
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "false").lower() in ("1", "true", "yes")
 
-embedding_model = SentenceTransformer("sentence-transformers/all-mpnet-base-v2")
-llm = ChatGoogleGenerativeAI(
-    model="models/gemini-2.0-flash",
-    temperature=0.3,
-    google_api_key=os.getenv("KEY")
-)
 
+# The LLM client and the LanceDB table are built on first use; importing this
+# module stays cheap so workers start serving MySQL-backed endpoints at once.
+llm = None
+table = None
+_llm_lock = threading.Lock()
+_table_lock = threading.Lock()
 
-db = lancedb.connect(LANCE_DB_PATH)
-try:
-    table = db.open_table(TABLE_NAME)
-except:
-    print("⚠️ Table not found — creating new 'tickets' table.")
-    table = db.create_table(
-        TABLE_NAME,
-        data=[{
-            "ticket_id": "dummy",
-            "title": "dummy title",
-            "summary": "dummy summary",
-            "solution": "dummy solution",
-            "category": "dummy category",
-            "vector": embedding_model.encode("This is a summary.").tolist(),
-        }]
-    )
 
+def get_llm():
+    global llm
+    if llm is None:
+        with _llm_lock:
+            if llm is None:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                llm = ChatGoogleGenerativeAI(
+                    model="models/gemini-2.0-flash",
+                    temperature=0.3,
+                    google_api_key=os.getenv("KEY")
+                )
+    return llm
+
+
+def _open_table():
+    import lancedb
+    from datetime import timedelta
+    db = lancedb.connect(LANCE_DB_PATH, read_consistency_interval=timedelta(seconds=LANCE_READ_CONSISTENCY))
+    try:
+        return db.open_table(TABLE_NAME)
+    except Exception:
+        log_event("lancedb.table_missing", logging.WARNING, table=TABLE_NAME)
+        return db.create_table(
+            TABLE_NAME,
+            data=[{
+                "ticket_id": "dummy",
+                "title": "dummy title",
+                "summary": "dummy summary",
+                "solution": "dummy solution",
+                "category": "dummy category",
+                "vector": encode_query("This is a summary."),
+            }]
+        )
+
+
+def get_table():
+    global table
+    if table is None:
+        with _table_lock:
+            if table is None:
+                table = _open_table()
+    return table
+
+
+set_table_getter(get_table)
+
+
+# === Warmup and readiness ===
+_warmup = {"state": "pending", "seconds": None, "error": None}
+
+
+def warm_up():
+    """Loads the embedding model, opens the table and runs one search so no user request pays for it."""
+    started = time.perf_counter()
+    _warmup["state"] = "running"
+    try:
+        with span("warmup.embedding"):
+            # A real encode also initialises the torch kernels, not just the weights
+            vector = get_embedding_model().encode("warmup").tolist()
+        with span("warmup.vector_table"):
+            problem = embedding_mismatch(get_table())
+            if problem:
+                raise RuntimeError(f"{problem}; re-run lancefill.py --rebuild")
+            # Also loads the filter vocabulary and touches the full-text indexes
+            search_tickets(get_table(), "warmup", vector, 1)
+        with span("warmup.llm_client"):
+            get_llm()
+    except Exception as e:
+        _warmup.update(state="failed", error=str(e))
+        log_event("warmup.failed", logging.ERROR, error=str(e))
+        return False
+    _warmup.update(state="done", seconds=round(time.perf_counter() - started, 2), error=None)
+    log_event("warmup.done", seconds=_warmup["seconds"])
+    return True
+
+
+def readiness():
+    """What is loaded so far; "ready" once the model and the vector table can serve a chat."""
+    checks = {
+        "embedding_model": get_embedding_cache_stats()["model_loaded"],
+        "vector_table": table is not None,
+        "llm_client": llm is not None,
+    }
+    return {"ready": all(checks.values()), "checks": checks, "warmup": dict(_warmup)}
+
+
+def preload():
+    """Loads model weights in the parent process ahead of forking workers.
+
+    No inference runs and neither LanceDB nor the Gemini client is created here:
+    their threads and sockets would not survive the fork, so each worker opens
+    its own on warmup. gc.freeze() keeps the collector from touching (and so
+    copying) the shared pages.
+    """
+    with span("preload.embedding"):
+        get_embedding_model()
+    gc.freeze()
+    log_event("preload.done", frozen_objects=gc.get_freeze_count())
 
 
-def get_recent_chat_history(session_id, limit=5):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT sender, content, timestamp
-        FROM chat_history
-        WHERE session_id = %s
-        ORDER BY message_index DESC
-        LIMIT %s
-    """, (session_id, limit))
-    rows = cursor.fetchall()
-    rows.reverse()
-    history = ""
-    for sender, content, _ in rows:
-        who = "User" if sender == "user" else "Assistant"
-        history += f"{who}: {content}\n"
-    return history
-
-
-
-def log_chat_message(session_id, sender, content):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT COALESCE(MAX(message_index), -1) FROM chat_history WHERE session_id = %s
-    """, (session_id,))
-    max_index = cursor.fetchone()[0] or -1
-    cursor.execute("""
-        INSERT INTO chat_history (session_id, message_index, sender, content, timestamp)
-        VALUES (%s, %s, %s, %s, NOW())
-    """, (session_id, max_index + 1, sender, content))
-    conn.commit()
+
+def summarize_chat(summary, messages):
+    """Folds turns that left the session window into the running summary."""
+    lines = "\n".join(f"{'User' if sender == 'user' else 'Assistant'}: {content}" for sender, content in messages)
+    prompt = f"""
+Update the running summary of a support conversation with the new messages below.
+Keep ticket IDs, reported problems and suggested fixes; drop greetings and repetition.
+Answer with the summary only, in at most 120 words.
+
+Current summary:
+{summary or "(none)"}
+
+New messages:
+{lines}
+"""
+    with span("chat.summarize"):
+        response = get_llm().invoke(prompt)
+    increment("llm_calls_total", 1, "LLM calls by chat mode", mode="summary")
+    record_llm_usage(response)
+    return response.content.strip()
+
+
+set_summarizer(summarize_chat)
+
+
+TICKET_ID_PATTERN = re.compile(r"\b(?:ticket[\s#:]*)?(def-\d{4})\b")
+MAX_TICKET_IDS = 5
+
+
+def extract_ticket_ids(text):
+    """All distinct def-NNNN IDs mentioned in the text, in order of appearance."""
+    ids = []
+    for match in TICKET_ID_PATTERN.finditer(text.lower()):
+        ticket_id = match.group(1).strip()
+        if ticket_id not in ids:
+            ids.append(ticket_id)
+    return ids[:MAX_TICKET_IDS]
+
 
 def extract_ticket_id(text):
-    match = re.search(r"\b(?:ticket[\s#:]*)?(def-\d{4})\b", text.lower())
-    return match.group(1).strip() if match else None
+    ids = extract_ticket_ids(text)
+    return ids[0] if ids else None
 
-def get_ticket_qa_chain(user_query, session_id, table_ref=table):
-    chat_context = get_recent_chat_history(session_id=session_id, limit=5)
 
+def lookup_tickets_by_id(table_ref, ticket_ids):
+    """Point lookup through the ticket_id scalar index instead of a full table scan."""
+    # Stored IDs are not normalized, so match both spellings the data actually uses
+    candidates = set()
+    for ticket_id in ticket_ids:
+        candidates.update({ticket_id, ticket_id.upper(), ticket_id.lower()})
+    rows = (
+        table_ref.search()
+        .where(f"ticket_id IN ({sql_in_list(sorted(candidates))})")
+        .limit(len(candidates))
+        .to_list()
+    )
+    by_id = {}
+    for row in rows:
+        by_id.setdefault(str(row["ticket_id"]).strip().lower(), row)
+    return [by_id[t] for t in ticket_ids if t in by_id]
+
+
+def format_ticket_context(doc):
+    return (
+        f"- Ticket ID: {doc['ticket_id']}\n"
+        f"Title: {doc['title']}\n"
+        f"Status: {doc.get('status')}\n"
+        f"Reported Date: {doc.get('reported_date')}\n"
+        f"Summary: {doc['summary']}\n"
+        f"Description: {doc.get('description')}\n"
+        f"Triage: {doc.get('triage')}\n"
+        f"Category: {doc['category']}\n"
+        f"Solution: {doc['solution']}\n"
+    )
+
+
+def public_ticket(doc):
+    # Vectors are large and useless to the client
+    return {k: v for k, v in doc.items() if k != "vector"}
+
+
+def plan_answer(user_query, chat_context, table_ref):
+    """Retrieval and prompt building for one chat turn (everything before the LLM call).
+
+    Returns {"prompt", "source_tickets", "mode", "query_vector", "ticket_ids", "cache_versions"},
+    or None when nothing relevant was found.
+    """
+    if table_ref is None:
+        table_ref = get_table()
+    # Read before retrieval, so an edit landing mid-answer keeps that answer out of the cache
+    cache_versions = answer_cache.current_versions()
     # === Step 1: Try ticket ID matching ===
-    ticket_id_requested = extract_ticket_id(user_query)
-    if ticket_id_requested:
+    ticket_ids_requested = extract_ticket_ids(user_query)
+    if ticket_ids_requested:
         try:
-            df = table_ref.to_arrow().to_pandas()
-            df["ticket_id_normalized"] = df["ticket_id"].astype(str).str.lower().str.strip()
-            print("📋 All normalized ticket IDs:", df["ticket_id_normalized"].tolist())
-
-            ticket_id_requested = ticket_id_requested.lower()
-
-            match_row = df[df["ticket_id_normalized"] == ticket_id_requested]
-            if not match_row.empty:
-                row = match_row.iloc[0]
-                ticket_context = (
-                    f"- Ticket ID: {row['ticket_id']}\n"
-                    f"Title: {row['title']}\n"
-                    f"Status: {row.get('status')}\n"
-                    f"Reported Date: {row.get('reported_date')}\n"
-                    f"Summary: {row['summary']}\n"
-                    f"Description: {row.get('description')}\n"
-                    f"Triage: {row.get('triage')}\n"
-                    f"Category: {row['category']}\n"
-                    f"Solution: {row['solution']}\n"
-                )
+            with span("chat.ticket_lookup"):
+                matches = lookup_tickets_by_id(table_ref, ticket_ids_requested)
+            if matches:
+                ticket_context = "\n".join(format_ticket_context(row) for row in matches)
+                missing = [t for t in ticket_ids_requested
+                           if t not in {str(r["ticket_id"]).strip().lower() for r in matches}]
+                if missing:
+                    ticket_context += f"\n(No records found for: {', '.join(missing)})\n"
 
                 prompt = (
                     f"You are an expert IT support assistant.\n\n"
                     f"--- Recent Chat ---\n{chat_context or '[No prior chat]'}\n\n"
-                    f"--- Requested Ticket ---\n{ticket_context}\n\n"
+                    f"--- Requested Ticket{'s' if len(matches) > 1 else ''} ---\n{ticket_context}\n\n"
                     f"Now answer this user query:\n\"{user_query}\"\n\n"
                     f"Use only plain English. No markdown or hallucinations."
                 )
-
-                response = llm.invoke(prompt)
+                with span("chat.embed"):
+                    query_vector = encode_query(user_query)
                 return {
-                    "response": response.content.strip(),
-                    "source_tickets": [row.to_dict()],
-                    "chat_used": chat_context,
-                    "mode": "ticket_id_match"
+                    "prompt": prompt,
+                    "source_tickets": [public_ticket(row) for row in matches],
+                    "mode": "ticket_id_match",
+                    "query_vector": query_vector,
+                    "ticket_ids": [row["ticket_id"] for row in matches],
+                    "cache_versions": cache_versions,
                 }
 
         except Exception as e:
-            print("⚠️ Ticket ID match failed, falling back to RAG:", e)
+            log_event("chat.ticket_lookup_failed", logging.WARNING, error=str(e))
 
     # === Step 2: RAG fallback ===
-    try:
-        query_vector = embedding_model.encode(user_query).tolist()
-        results = (
-            table_ref.search(query_vector)
-            .distance_type("cosine")
-            .limit(TOP_K)
-            .to_list()
-        )
-
-        if not results:
-            return {"response": "No relevant tickets found."}
+    with span("chat.embed"):
+        query_vector = encode_query(user_query)
+    with span("chat.search"):
+        results, filters = search_tickets(table_ref, user_query, query_vector, TOP_K)
+    if filters:
+        log_event("chat.query_filters", logging.DEBUG, filters=filters)
 
-        ticket_context = ""
-        for doc in results:
-            ticket_context += (
-                f"- Ticket ID: {doc['ticket_id']}\n"
-                f"Title: {doc['title']}\n"
-                f"Status: {doc.get('status')}\n"
-                f"Reported Date: {doc.get('reported_date')}\n"
-                f"Summary: {doc['summary']}\n"
-                f"Description: {doc.get('description')}\n"
-                f"Triage: {doc.get('triage')}\n"
-                f"Category: {doc['category']}\n"
-                f"Solution: {doc['solution']}\n\n"
-            )
+    if not results:
+        return None
 
+    with span("chat.prompt_build"):
+        ticket_context = "".join(format_ticket_context(doc) + "\n" for doc in results)
         prompt = (
             f"You are an expert IT support assistant.\n\n"
             f"--- Recent Chat ---\n{chat_context or '[No prior chat]'}\n\n"
@@ -166,20 +302,199 @@ def get_ticket_qa_chain(user_query, session_id, table_ref=table):
             f"Now answer this user query:\n\"{user_query}\"\n\n"
             f"Use only plain English. Be concise, no markdown, no guessing."
         )
+    return {
+        "prompt": prompt,
+        "source_tickets": [public_ticket(doc) for doc in results],
+        "mode": "rag_fallback",
+        "query_vector": query_vector,
+        "ticket_ids": [doc["ticket_id"] for doc in results],
+        "cache_versions": cache_versions,
+    }
+
+
+def _answer(plan, response, chat_context):
+    return {
+        "response": response.content.strip(),
+        "source_tickets": plan["source_tickets"],
+        "chat_used": chat_context,
+        "mode": plan["mode"]
+    }
+
+
+def _cached_answer(plan, chat_context):
+    """Reuses the answer of a near-identical question over the same tickets, skipping the LLM."""
+    with span("chat.answer_cache"):
+        hit = answer_cache.lookup(plan["query_vector"], plan["ticket_ids"])
+    if hit is None:
+        return None
+    return {
+        "response": hit["response"],
+        "source_tickets": plan["source_tickets"],
+        "chat_used": chat_context,
+        "mode": plan["mode"],
+        "cached": True
+    }
+
+
+def _remember(plan, answer, started):
+    answer_cache.store(plan["query_vector"], plan["ticket_ids"], answer, time.perf_counter() - started,
+                       versions=plan["cache_versions"])
+
 
-        response = llm.invoke(prompt)
-        return {
-            "response": response.content.strip(),
-            "source_tickets": results,
-            "chat_used": chat_context,
-            "mode": "rag_fallback"
-        }
+def _llm_call(plan, response, started):
+    record_stage("chat.llm", time.perf_counter() - started)
+    increment("llm_calls_total", 1, "LLM calls by chat mode", mode=plan["mode"])
+    record_llm_usage(response)
 
+
+def _error_answer(e, chat_context):
+    log_event("chat.failed", logging.ERROR, error=str(e))
+    return {
+        "response": f"❌ Unexpected error: {str(e)}",
+        "source_tickets": [],
+        "chat_used": chat_context,
+        "mode": "error"
+    }
+
+
+def get_ticket_qa_chain(user_query, session_id, table_ref=None):
+    with span("chat.history"):
+        chat_context = get_recent_chat_history(session_id=session_id)
+    try:
+        plan = plan_answer(user_query, chat_context, table_ref)
+        if plan is None:
+            return {"response": "No relevant tickets found."}
+        cached = _cached_answer(plan, chat_context)
+        if cached:
+            return cached
+        started = time.perf_counter()
+        response = get_llm().invoke(plan["prompt"])
+        _llm_call(plan, response, started)
+        answer = _answer(plan, response, chat_context)
+        _remember(plan, answer["response"], started)
+        return answer
     except Exception as e:
-        print("❌ RAG fallback failed:", e)
-        return {
-            "response": f"❌ Unexpected error: {str(e)}",
-            "source_tickets": [],
-            "chat_used": chat_context,
-            "mode": "error"
-        }
+        return _error_answer(e, chat_context)
+
+
+# === Async chat path ===
+# MySQL and the embedding model/LanceDB search are blocking, so they run on bounded
+# executors; the LLM call is awaited natively. A worker thread is never parked on a chat.
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "200"))
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "5"))
+CHAT_TIMEOUT = float(os.getenv("CHAT_TIMEOUT", "60"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "45"))
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+
+db_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="chat-db")
+retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="chat-retrieval")
+_chat_slots = asyncio.Semaphore(CHAT_MAX_CONCURRENCY)
+
+
+class ChatBusyError(Exception):
+    pass
+
+
+async def run_blocking(executor, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Carry the request ID and span list into the worker thread
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+@asynccontextmanager
+async def chat_slot():
+    """Caps in-flight chats; waits up to CHAT_QUEUE_TIMEOUT for a slot, then gives up."""
+    try:
+        await asyncio.wait_for(_chat_slots.acquire(), CHAT_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise ChatBusyError(f"More than {CHAT_MAX_CONCURRENCY} chats in flight")
+    try:
+        yield
+    finally:
+        _chat_slots.release()
+
+
+async def aget_ticket_qa_chain(user_query, session_id, table_ref=None):
+    with span("chat.history"):
+        chat_context = await run_blocking(db_executor, get_recent_chat_history, session_id=session_id)
+    try:
+        plan = await run_blocking(retrieval_executor, plan_answer, user_query, chat_context, table_ref)
+        if plan is None:
+            return {"response": "No relevant tickets found."}
+        cached = _cached_answer(plan, chat_context)
+        if cached:
+            return cached
+        started = time.perf_counter()
+        response = await asyncio.wait_for(get_llm().ainvoke(plan["prompt"]), LLM_TIMEOUT)
+        _llm_call(plan, response, started)
+        answer = _answer(plan, response, chat_context)
+        _remember(plan, answer["response"], started)
+        return answer
+    except asyncio.TimeoutError:
+        raise
+    except Exception as e:
+        return _error_answer(e, chat_context)
+
+
+async def astream_ticket_qa_chain(user_query, session_id, table_ref=None):
+    """Async generator of ("token", text) events followed by one ("done", info) event.
+
+    info carries source_tickets, chat_used and mode; an ("error", message) event
+    replaces the remaining tokens if generation fails part-way.
+    """
+    with span("chat.history"):
+        chat_context = await run_blocking(db_executor, get_recent_chat_history, session_id=session_id)
+    try:
+        plan = await run_blocking(retrieval_executor, plan_answer, user_query, chat_context, table_ref)
+    except Exception as e:
+        answer = _error_answer(e, chat_context)
+        yield ("token", answer["response"])
+        yield ("done", {"source_tickets": [], "chat_used": chat_context, "mode": "error"})
+        return
+    if plan is None:
+        yield ("token", "No relevant tickets found.")
+        yield ("done", {"source_tickets": [], "chat_used": chat_context, "mode": None})
+        return
+
+    cached = _cached_answer(plan, chat_context)
+    if cached:
+        yield ("token", cached["response"])
+        yield ("done", {"source_tickets": plan["source_tickets"], "chat_used": chat_context,
+                        "mode": plan["mode"], "cached": True})
+        return
+
+    started = time.perf_counter()
+    parts = []
+    first_chunk = True
+    stream = get_llm().astream(plan["prompt"]).__aiter__()
+    while True:
+        try:
+            # LLM_TIMEOUT bounds the wait for each chunk, not the whole answer
+            chunk = await asyncio.wait_for(stream.__anext__(), LLM_TIMEOUT)
+        except StopAsyncIteration:
+            break
+        except Exception as e:
+            log_event("chat.llm_stream_failed", logging.ERROR, error=str(e) or "timeout")
+            yield ("error", str(e) or "LLM timed out")
+            return
+        if first_chunk:
+            first_chunk = False
+            record_stage("chat.llm_first_token", time.perf_counter() - started)
+        # LangChain chunks carry usage deltas, so summing them gives the call's totals
+        record_llm_usage(chunk)
+        if isinstance(chunk.content, str) and chunk.content:
+            parts.append(chunk.content)
+            yield ("token", chunk.content)
+    record_stage("chat.llm", time.perf_counter() - started)
+    increment("llm_calls_total", 1, "LLM calls by chat mode", mode=plan["mode"])
+    _remember(plan, "".join(parts).strip(), started)
+    yield ("done", {"source_tickets": plan["source_tickets"], "chat_used": chat_context, "mode": plan["mode"]})
+
+
+async def arecord_exchange(session_id, user_message, bot_message):
+    if WRITE_BEHIND:
+        # Only enqueues; the writer thread does the MySQL work
+        record_exchange(session_id, user_message, bot_message)
+    else:
+        await run_blocking(db_executor, record_exchange, session_id, user_message, bot_message)
@@ -1,27 +1,144 @@
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Query, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
 try:
-    from ticketbackend.database import get_connection
+    from ticketbackend.database import get_connection, get_pool_stats
 except ImportError:
-    from database import get_connection
-from fastapi import FastAPI, Request
-from pydantic import BaseModel
+    from database import get_connection, get_pool_stats
 try:
-    from models import ChatQuery
+    from models import ChatQuery, TicketUpdate, TicketChange, BulkTicketUpdate
 except ImportError:
-    from ticketbackend.models import ChatQuery
-from ticketbackend.lang import get_ticket_qa_chain, log_chat_message
+    from ticketbackend.models import ChatQuery, TicketUpdate, TicketChange, BulkTicketUpdate
+from ticketbackend.lang import (
+    aget_ticket_qa_chain, astream_ticket_qa_chain, arecord_exchange, chat_slot, ChatBusyError, CHAT_TIMEOUT,
+    warm_up, readiness, preload, run_blocking, retrieval_executor, WARMUP, PRELOAD_MODELS
+)
+from ticketbackend.ticket_queries import (
+    list_tickets, fetch_ticket_detail, detail_row_to_dict, SORT_COLUMNS
+)
+from ticketbackend.ticket_stats import fetch_stats, DIMENSIONS, TREND_BUCKETS
+from ticketbackend.ticket_updates import apply_ticket_updates
+from ticketbackend.facet_cache import get_cached_facets, get_facet_cache_stats
+from ticketbackend.data_version import get_data_version
+from ticketbackend.embedding import get_embedding_cache_stats
+from ticketbackend.answer_cache import get_answer_cache_stats
+from ticketbackend.chat_history import flush_chat_history, get_session_cache_stats, get_chat_history_stats
+from ticketbackend.reembed import flush_reembed, get_reembed_stats
+from ticketbackend.observability import (
+    new_request_id, observe, span, log_event, request_spans, render_metrics
+)
 
 
 app = FastAPI()
 
+if PRELOAD_MODELS:
+    preload()
+
+
+@app.on_event("startup")
+async def start_warmup():
+    if WARMUP == "blocking":
+        await run_blocking(retrieval_executor, warm_up)
+    elif WARMUP == "background":
+        # Not awaited: MySQL-backed endpoints serve while the model loads; /ready reports progress
+        asyncio.get_running_loop().run_in_executor(retrieval_executor, warm_up)
+
+
+@app.on_event("shutdown")
+def drain_chat_history():
+    # Write-behind chat messages still queued would otherwise die with the process
+    flush_chat_history()
+    flush_reembed()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],  # React dev server
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Request-ID"],
 )
 
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Tags each request with an ID (honouring X-Request-ID), times it and logs one line per request."""
+    request_id = new_request_id(request.headers.get("x-request-id"))
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        # The route template keeps /tickets/{ticket_id} one series instead of one per ticket
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        observe("http_request_duration_seconds", elapsed, "HTTP request latency",
+                method=request.method, route=path, status=status)
+        log_event("request", method=request.method, route=path, status=status,
+                  duration_ms=round(elapsed * 1000, 2), spans=request_spans())
+
+# === Versioned read responses ===
+# Serialized bodies of read endpoints, keyed by URL and valid for one data version
+SNAPSHOT_CACHE_SIZE = int(os.getenv("SNAPSHOT_CACHE_SIZE", "256"))
+_snapshots = OrderedDict()
+_snapshots_lock = threading.Lock()
+_snapshot_stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+
+def _versioned_json(request: Request, build):
+    """Serves build() as JSON with an ETag tied to the data version.
+
+    A matching If-None-Match is answered with 304 and a repeat request for the
+    same URL at the same version reuses the serialized body; neither touches MySQL.
+    """
+    version = get_data_version()
+    key = f"{request.url.path}?{request.url.query}"
+    etag = f'W/"{version}-{hashlib.sha1(key.encode()).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            with _snapshots_lock:
+                _snapshot_stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+
+    with _snapshots_lock:
+        cached = _snapshots.get(key)
+        if cached and cached[0] == version:
+            _snapshots.move_to_end(key)
+            _snapshot_stats["hits"] += 1
+            body = cached[1]
+        else:
+            _snapshot_stats["misses"] += 1
+            body = None
+
+    if body is None:
+        data = build()
+        with span("response.serialize"):
+            body = json.dumps(jsonable_encoder(data)).encode()
+        with _snapshots_lock:
+            _snapshots[key] = (version, body)
+            _snapshots.move_to_end(key)
+            while len(_snapshots) > SNAPSHOT_CACHE_SIZE:
+                _snapshots.popitem(last=False)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 def get_ticket_count():
     conn = None
     cursor = None
@@ -32,7 +149,7 @@ def get_ticket_count():
         ticketcount = cursor.fetchone()[0]
         return ticketcount
     except Exception as e:
-        print(f"Error getting ticket count: {e}")
+        log_event("ticket_count.failed", logging.ERROR, error=str(e))
         raise HTTPException(status_code=500, detail=f"Error getting ticket count: {e}")
     finally:
         if cursor:
@@ -41,30 +158,36 @@ def get_ticket_count():
             conn.close()
 
 @app.get("/ticket_data")
-def get_ticket_data():
+def get_ticket_data(request: Request):
+    return _versioned_json(request, _build_ticket_data)
+
+
+def _build_ticket_data():
     conn = None
     try:
         conn = get_connection()
 
 
-        cursor_ids = conn.cursor()
-        cursor_ids.execute("SELECT ticket_id FROM processed;")
-        ticket_ids = [row[0] for row in cursor_ids.fetchall()]
-        cursor_ids.close()
+        with span("ticket_data.ids"):
+            cursor_ids = conn.cursor()
+            cursor_ids.execute("SELECT ticket_id FROM processed;")
+            ticket_ids = [row[0] for row in cursor_ids.fetchall()]
+            cursor_ids.close()
 
 
-        cursor_final_table = conn.cursor()
-        ticket_details_query = """
-            SELECT M.ticket_id, M.title, M.status, M.source, P.summary, P.triage,
-                   P.category, P.solution, E.employee_name
-            FROM main_table AS M
-            JOIN processed AS P ON M.ticket_id = P.ticket_id
-            JOIN assign AS A ON M.ticket_id = A.ticket_id
-            JOIN employee AS E ON A.assigned_id = E.employee_ID;
-        """
-        cursor_final_table.execute(ticket_details_query)
-        rows_final_table = cursor_final_table.fetchall()
-        cursor_final_table.close()
+        with span("ticket_data.table"):
+            cursor_final_table = conn.cursor()
+            ticket_details_query = """
+                SELECT M.ticket_id, M.title, M.status, M.source, P.summary, P.triage,
+                       P.category, P.solution, E.employee_name
+                FROM main_table AS M
+                JOIN processed AS P ON M.ticket_id = P.ticket_id
+                JOIN assign AS A ON M.ticket_id = A.ticket_id
+                JOIN employee AS E ON A.assigned_id = E.employee_ID;
+            """
+            cursor_final_table.execute(ticket_details_query)
+            rows_final_table = cursor_final_table.fetchall()
+            cursor_final_table.close()
 
         final_table = []
         for row in rows_final_table:
@@ -79,143 +202,305 @@ def get_ticket_data():
             })
 
 
-        cursor_details = conn.cursor()
-        details_query = """
-            SELECT m.ticket_id, m.title, m.status, m.reported_date, p.summary,
-                   m.description, p.triage, p.category, e.employee_name, p.solution,
-                   r.triage_reason, r.category_reason, m.source
-            FROM main_table AS m
-            JOIN processed AS p ON m.ticket_id = p.ticket_id
-            JOIN assign AS a ON m.ticket_id = a.ticket_id
-            JOIN employee AS e ON a.assigned_id = e.employee_id
-            LEFT JOIN reasons AS r ON m.ticket_id = r.ticket_id;
-        """
-        cursor_details.execute(details_query)
-        datas_details = cursor_details.fetchall()
-        cursor_details.close()
-
-        details = []
-        for r in datas_details:
-            details.append({
-                "ticket_id": r[0],
-                "ticket_title": r[1],
-                "ticket_status": r[2],
-                "ticket_reported_date": r[3],
-                "ticket_summary": r[4],
-                "ticket_description": r[5],
-                "ticket_triage": r[6],
-                "ticket_triage_reason": r[10],
-                "ticket_category": r[7],
-                "ticket_category_reason": r[11],
-                "ticket_assigned_employee": r[8],
-                "ticket_solution": r[9],
-                "ticket_source": r[12] or "Other"
-            })
-
-
-        cursor_categories = conn.cursor()
-        cursor_categories.execute("select distinct category from processed;")
-        clist = [row[0] for row in cursor_categories.fetchall()]
-        cursor_categories.close()
-
-
-        cursor_status = conn.cursor()
-        cursor_status.execute("select distinct status from main_table;")
-        slist = [row[0] for row in cursor_status.fetchall()]
-        cursor_status.close()
+        with span("ticket_data.details"):
+            cursor_details = conn.cursor()
+            details_query = """
+                SELECT m.ticket_id, m.title, m.status, m.reported_date, p.summary,
+                       m.description, p.triage, p.category, e.employee_name, p.solution,
+                       r.triage_reason, r.category_reason, m.source
+                FROM main_table AS m
+                JOIN processed AS p ON m.ticket_id = p.ticket_id
+                JOIN assign AS a ON m.ticket_id = a.ticket_id
+                JOIN employee AS e ON a.assigned_id = e.employee_id
+                LEFT JOIN reasons AS r ON m.ticket_id = r.ticket_id;
+            """
+            cursor_details.execute(details_query)
+            datas_details = cursor_details.fetchall()
+            cursor_details.close()
 
+        details = [detail_row_to_dict(r) for r in datas_details]
 
-        cursor_employees = conn.cursor()
-        cursor_employees.execute("""
-            select distinct e.employee_name 
-            from assign a JOIN employee e ON a.assigned_id = e.employee_id;
-        """)
-        elist = [row[0] for row in cursor_employees.fetchall()]
-        cursor_employees.close()
 
-
-        cursor_sources = conn.cursor()
-        cursor_sources.execute("select distinct source from main_table order by source;")
-        sourcelist = [row[0] or "Other" for row in cursor_sources.fetchall()]  # Fix: Replace None
-        cursor_sources.close()
+        with span("ticket_data.facets"):
+            facets = get_cached_facets()
 
         return {
             "ticket_ids": ticket_ids,
             "ticket_count": len(ticket_ids),
             "table_contents": final_table,
             "details": details,
-            "distinct_triages": [f"L{i}" for i in range(1, 6)],
-            "distinct_categories": clist,
-            "distinct_status": slist,
-            "distinct_assigned_to": elist,
-            "distinct_sources": sourcelist
+            **facets
         }
 
     except Exception as e:
-        print(f"❌ Error fetching ticket data: {e}")
+        log_event("ticket_data.failed", logging.ERROR, error=str(e))
         raise HTTPException(status_code=500, detail=f"Error fetching data: {e}")
     finally:
         if conn:
             conn.close()
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from ticketbackend.database import get_connection
-from ticketbackend.assign import assign_ticket
-router = APIRouter()
-from ticketbackend.models import TicketUpdate
+@app.get("/tickets")
+def get_tickets(
+    request: Request,
+    category: str = None,
+    triage: str = None,
+    status: str = None,
+    assignee: str = None,
+    source: str = None,
+    q: str = None,
+    sort: str = Query("ticket_id", enum=list(SORT_COLUMNS)),
+    order: str = Query("asc", enum=["asc", "desc"]),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str = None,
+    include_total: bool = True,
+):
+    filters = {
+        "category": category,
+        "triage": triage,
+        "status": status,
+        "assignee": assignee,
+        "source": source,
+    }
+
+    def build():
+        conn = None
+        try:
+            conn = get_connection()
+            return list_tickets(conn, filters, q=q, sort=sort, order=order, limit=limit,
+                                cursor=cursor, include_total=include_total)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            log_event("tickets.list_failed", logging.ERROR, error=str(e))
+            raise HTTPException(status_code=500, detail=f"Error listing tickets: {e}")
+        finally:
+            if conn:
+                conn.close()
+
+    return _versioned_json(request, build)
+
+@app.get("/tickets/{ticket_id}")
+def get_ticket(ticket_id: str, request: Request):
+
+    def build():
+        conn = None
+        try:
+            conn = get_connection()
+            ticket = fetch_ticket_detail(conn, ticket_id)
+        except Exception as e:
+            log_event("tickets.detail_failed", logging.ERROR, ticket_id=ticket_id, error=str(e))
+            raise HTTPException(status_code=500, detail=f"Error fetching ticket: {e}")
+        finally:
+            if conn:
+                conn.close()
+        if ticket is None:
+            raise HTTPException(status_code=404, detail=f"Ticket {ticket_id} not found")
+        return ticket
+
+    return _versioned_json(request, build)
+
+
+@app.get("/ticket_metadata")
+def get_ticket_metadata(request: Request):
+    return _versioned_json(request, _build_ticket_metadata)
+
+
+def _build_ticket_metadata():
+    try:
+        return get_cached_facets()
+    except Exception as e:
+        log_event("ticket_metadata.failed", logging.ERROR, error=str(e))
+        raise HTTPException(status_code=500, detail=f"Error fetching metadata: {e}")
+
+
+@app.get("/stats")
+def get_stats(
+    request: Request,
+    bucket: str = Query("week", enum=list(TREND_BUCKETS)),
+    trend_by: str = Query(None, enum=DIMENSIONS),
+    since: str = None,
+    until: str = None,
+):
+    """Dashboard counts per category/triage/status/source/assignee and tickets reported per bucket.
+
+    Read from the summary tables, so the cost does not grow with the number of tickets.
+    """
+
+    def build():
+        conn = None
+        try:
+            conn = get_connection()
+            with span("stats.read"):
+                return fetch_stats(conn, bucket=bucket, trend_by=trend_by, since=since, until=until)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            log_event("stats.failed", logging.ERROR, error=str(e))
+            raise HTTPException(status_code=500, detail=f"Error fetching stats: {e}")
+        finally:
+            if conn:
+                conn.close()
+
+    return _versioned_json(request, build)
 
 
 @app.put("/tickets/{ticket_id}")
 def update_ticket(ticket_id: str, update: TicketUpdate):
-    print("=== Update Request ===")
-    print("Ticket ID:", ticket_id)
-    print("Payload:", update)
-    conn = None
-    cursor = None
+    change = TicketChange(ticket_id=ticket_id, **update.model_dump())
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        print("ABOUT TO DO SQL CHANGE 🤢")
-        cursor.execute("""
-            UPDATE processed
-            SET triage = %s,
-                category = %s
-            WHERE ticket_id = %s
-        """, (update.triage, update.category, ticket_id))
-        conn.commit()
-
-        assign_ticket(ticket_id,conn) 
-        
-
-        cursor.execute("""UPDATE main_table
-        SET status = %s
-        WHERE ticket_id = %s
-        """, (update.status, ticket_id))
-        conn.commit() 
-
-        print(f"Updated ticket {ticket_id} with triage={update.triage}, status={update.status}, category={update.category}")
-
-        return {"message": "Ticket updated successfully"}
+        with get_connection() as conn:
+            outcome = apply_ticket_updates(conn, [change])
     except Exception as e:
-        print(f"Error updating ticket: {e}")
+        log_event("ticket.update_failed", logging.ERROR, ticket_id=ticket_id, error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+    if not outcome["applied"]:
+        error = outcome["results"][0]["error"]
+        raise HTTPException(status_code=404 if error == "ticket not found" else 400, detail=error)
+
+    log_event("ticket.updated", ticket_id=ticket_id, triage=update.triage, status=update.status,
+              category=update.category, assigned_to=outcome["results"][0].get("assigned_to"))
+    return {"message": "Ticket updated successfully"}
+
+
+@app.patch("/tickets")
+def bulk_update_tickets(bulk: BulkTicketUpdate):
+    """Applies many ticket changes in one transaction with one batched reassignment.
+
+    Returns a result per change. With on_error=abort an invalid change fails the
+    whole request with 409 and nothing is written.
+    """
+    try:
+        with get_connection() as conn:
+            outcome = apply_ticket_updates(conn, bulk.updates, on_error=bulk.on_error)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log_event("tickets.bulk_update_failed", logging.ERROR, count=len(bulk.updates), error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+    updated = sum(1 for r in outcome["results"] if r["status"] == "updated")
+    log_event("tickets.bulk_updated", applied=outcome["applied"], requested=len(bulk.updates),
+              updated=updated, on_error=bulk.on_error)
+    return JSONResponse(jsonable_encoder(outcome), status_code=200 if outcome["applied"] else 409)
+
+
+@app.get("/health")
+def health():
+    # Liveness only: the process is up and the event loop answers
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready():
+    """503 until the embedding model and vector table are loaded, so a balancer holds chat traffic back."""
+    state = readiness()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+
+@app.get("/pool_stats")
+def pool_stats():
+    return get_pool_stats()
+
+
+@app.get("/cache_stats")
+def cache_stats():
+    with _snapshots_lock:
+        snapshots = {**_snapshot_stats, "entries": len(_snapshots), "data_version": get_data_version()}
+    return {
+        "facets": get_facet_cache_stats(),
+        "snapshots": snapshots,
+        "embeddings": get_embedding_cache_stats(),
+        "answers": get_answer_cache_stats(),
+        "chat_sessions": get_session_cache_stats(),
+        "reembed": get_reembed_stats(),
+    }
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape target: request and stage latency histograms, LLM counters and cache gauges."""
+    with _snapshots_lock:
+        snapshots = {**_snapshot_stats, "entries": len(_snapshots)}
+    body = render_metrics({
+        "pool": get_pool_stats(),
+        "facets": get_facet_cache_stats(),
+        "snapshots": snapshots,
+        "embeddings": get_embedding_cache_stats(),
+        "answers": get_answer_cache_stats(),
+        "chat_sessions": get_session_cache_stats(),
+        "chat_history": get_chat_history_stats(),
+        "reembed": get_reembed_stats(),
+    })
+    return Response(content=body, media_type="text/plain; version=0.0.4")
 
 
 @app.post("/chat")
-def chat_query(data: ChatQuery):
-    print(f"Received query: {data.user_query} (session: {data.session_id})")
+async def chat_query(data: ChatQuery):
+    log_event("chat.received", session_id=data.session_id, query_chars=len(data.user_query))
     try:
-        log_chat_message(data.session_id, "user", data.user_query)
-        response = get_ticket_qa_chain(data.user_query, session_id=data.session_id)
-        answer = response["response"]
-        log_chat_message(data.session_id, "bot", answer)
-        return response
+        async with chat_slot():
+            return await asyncio.wait_for(_answer_chat(data), CHAT_TIMEOUT)
+    except ChatBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Chat timed out after {CHAT_TIMEOUT}s")
     except Exception as e:
-        print("❌ Internal error:", e)
-        return {"error": str(e)}
\ No newline at end of file
+        log_event("chat.failed", logging.ERROR, error=str(e))
+        return {"error": str(e)}
+
+
+async def _answer_chat(data: ChatQuery):
+    response = await aget_ticket_qa_chain(data.user_query, session_id=data.session_id)
+    with span("chat.record"):
+        await arecord_exchange(data.session_id, data.user_query, response["response"])
+    return response
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(data: ChatQuery):
+    """Server-Sent Events version of /chat: token events, then a final done event."""
+    log_event("chat.stream_received", session_id=data.session_id, query_chars=len(data.user_query))
+
+    async def events():
+        try:
+            async with chat_slot():
+                parts = []
+                # Same overall budget as /chat; waiting on each chunk with what is left
+                # also catches a model that stops sending tokens altogether
+                deadline = time.monotonic() + CHAT_TIMEOUT
+                stream = astream_ticket_qa_chain(data.user_query, session_id=data.session_id)
+                while True:
+                    try:
+                        kind, payload = await asyncio.wait_for(stream.__anext__(), deadline - time.monotonic())
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        await stream.aclose()
+                        log_event("chat.stream_timeout", logging.WARNING, session_id=data.session_id,
+                                  tokens=len(parts))
+                        yield _sse("error", {"error": f"Chat timed out after {CHAT_TIMEOUT}s"})
+                        return
+                    if kind == "token":
+                        parts.append(payload)
+                        yield _sse("token", {"text": payload})
+                    elif kind == "error":
+                        yield _sse("error", {"error": payload})
+                        return
+                    else:
+                        # Only a complete exchange is written to chat_history
+                        await arecord_exchange(data.session_id, data.user_query, "".join(parts).strip())
+                        yield _sse("done", payload)
+        except ChatBusyError as e:
+            yield _sse("error", {"error": str(e)})
+        except Exception as e:
+            log_event("chat.failed", logging.ERROR, error=str(e))
+            yield _sse("error", {"error": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,288 @@
+import argparse
+import sys
+from dotenv import load_dotenv
+try:
+    from database import get_connection
+    from ticket_queries import DETAIL_QUERY, FACET_QUERIES, build_list_sql
+    from chat_history import (
+        NEXT_INDEX_QUERY, RECENT_QUERY, MESSAGE_COUNT_QUERY, SUMMARY_QUERY, CHAT_SUMMARIES_TABLE
+    )
+    from assign import ROUTING_QUERY, LOAD_QUERY, TICKETS_QUERY
+    from ticket_updates import build_update_sql
+    from lancesync import SYNC_QUERY
+    from reembed import TICKETS_BY_ID_QUERY
+    from ticket_stats import (
+        STATS_TABLES, STAT_ROWS_BY_ID_QUERY, TOTALS_QUERY, DAILY_QUERY, TICKET_COUNT_QUERY, COUNTED_QUERY,
+        TOTAL_DIMENSION, rebuild_stats
+    )
+except ImportError:
+    from ticketbackend.database import get_connection
+    from ticketbackend.ticket_queries import DETAIL_QUERY, FACET_QUERIES, build_list_sql
+    from ticketbackend.chat_history import (
+        NEXT_INDEX_QUERY, RECENT_QUERY, MESSAGE_COUNT_QUERY, SUMMARY_QUERY, CHAT_SUMMARIES_TABLE
+    )
+    from ticketbackend.assign import ROUTING_QUERY, LOAD_QUERY, TICKETS_QUERY
+    from ticketbackend.ticket_updates import build_update_sql
+    from ticketbackend.lancesync import SYNC_QUERY
+    from ticketbackend.reembed import TICKETS_BY_ID_QUERY
+    from ticketbackend.ticket_stats import (
+        STATS_TABLES, STAT_ROWS_BY_ID_QUERY, TOTALS_QUERY, DAILY_QUERY, TICKET_COUNT_QUERY, COUNTED_QUERY,
+        TOTAL_DIMENSION, rebuild_stats
+    )
+load_dotenv()
+
+# MySQL has no CREATE INDEX IF NOT EXISTS, so every step checks information_schema
+# first; that keeps each migration safe to re-run after a partial failure.
+MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def _index_columns(cursor, table):
+    """index name -> ordered column list for one table."""
+    cursor.execute("""
+        SELECT index_name, column_name
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s
+        ORDER BY index_name, seq_in_index
+    """, (table,))
+    indexes = {}
+    for name, column in cursor.fetchall():
+        indexes.setdefault(name, []).append(column.lower())
+    return indexes
+
+
+def has_index(cursor, table, columns):
+    """True if some index already starts with these columns (it can serve the same lookups)."""
+    wanted = [c.lower() for c in columns]
+    return any(cols[:len(wanted)] == wanted for cols in _index_columns(cursor, table).values())
+
+
+def has_column(cursor, table, column):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return cursor.fetchone() is not None
+
+
+def add_index(cursor, table, name, columns, unique=False):
+    if has_index(cursor, table, columns):
+        print(f"   ↪ {table}({', '.join(columns)}) already indexed")
+        return
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    cursor.execute(f"CREATE {kind} {name} ON {table} ({', '.join(columns)})")
+    print(f"   ✅ {kind.lower()} {name} on {table}({', '.join(columns)})")
+
+
+def _ticket_id_lookups(cursor):
+    # Every join in TICKET_FROM and every per-ticket lookup goes through these
+    add_index(cursor, "main_table", "idx_main_ticket_id", ["ticket_id"])
+    add_index(cursor, "processed", "idx_processed_ticket_id", ["ticket_id"])
+    add_index(cursor, "assign", "idx_assign_ticket_employee", ["ticket_id", "assigned_id"])
+    add_index(cursor, "reasons", "idx_reasons_ticket_id", ["ticket_id"])
+    add_index(cursor, "employee", "idx_employee_id", ["employee_id"])
+
+
+def _listing_filters(cursor):
+    # Keyset pagination on reported_date needs ticket_id as the tie-breaker column
+    add_index(cursor, "main_table", "idx_main_reported_ticket", ["reported_date", "ticket_id"])
+    add_index(cursor, "main_table", "idx_main_status", ["status"])
+    add_index(cursor, "main_table", "idx_main_source", ["source"])
+    add_index(cursor, "processed", "idx_processed_category", ["category"])
+    add_index(cursor, "processed", "idx_processed_triage", ["triage"])
+    # Open-ticket counts per employee for the assignment engine
+    add_index(cursor, "assign", "idx_assign_employee", ["assigned_id"])
+
+
+def _chat_history_order(cursor):
+    cursor.execute("""
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM chat_history
+            GROUP BY session_id, message_index
+            HAVING COUNT(*) > 1
+        ) AS dupes
+    """)
+    duplicates = cursor.fetchone()[0]
+    if duplicates:
+        # Older writers could race and reuse an index; keep the rows and skip the constraint
+        print(f"   ⚠️ {duplicates} duplicate (session_id, message_index) pairs; adding a non-unique index")
+    add_index(cursor, "chat_history", "idx_chat_session_message", ["session_id", "message_index"],
+              unique=not duplicates)
+
+
+def _employee_routing_columns(cursor):
+    # Normalised copies of category/triage so routing lookups can use an index instead of TRIM()
+    for column, source in (("category_norm", "category"), ("triage_norm", "triage")):
+        if not has_column(cursor, "employee", column):
+            cursor.execute(f"""
+                ALTER TABLE employee
+                ADD COLUMN {column} VARCHAR(255)
+                GENERATED ALWAYS AS (LOWER(TRIM({source}))) STORED
+            """)
+            print(f"   ✅ employee.{column}")
+    add_index(cursor, "employee", "idx_employee_routing", ["category_norm", "triage_norm", "role"])
+
+
+def _trim_processed_labels(cursor):
+    # Stray whitespace makes exact-match filters and facet lists disagree
+    cursor.execute("""
+        UPDATE processed
+        SET category = TRIM(category), triage = TRIM(triage)
+        WHERE category <> TRIM(category) OR triage <> TRIM(triage)
+    """)
+    print(f"   ✅ trimmed {cursor.rowcount} processed rows")
+
+
+def _ticket_stats_tables(cursor):
+    # Summary tables behind /stats; the one full count here is what later writes adjust
+    for ddl in STATS_TABLES:
+        cursor.execute(ddl)
+    print(f"   ✅ counted {rebuild_stats(cursor)} tickets into ticket_stat_totals/ticket_stat_daily")
+
+
+def _drop_stat_total_rows(cursor):
+    # The overall totals are now summed from one dimension; the shared row only serialized writes
+    cursor.execute("DELETE FROM ticket_stat_totals WHERE dimension = 'total'")
+    removed = cursor.rowcount
+    cursor.execute("DELETE FROM ticket_stat_daily WHERE dimension = 'total'")
+    print(f"   ✅ removed {removed + cursor.rowcount} 'total' summary rows")
+
+
+def _chat_summaries(cursor):
+    cursor.execute(CHAT_SUMMARIES_TABLE)
+    print("   ✅ chat_summaries")
+
+
+# Append only: a version, once applied anywhere, must never change meaning
+MIGRATIONS = [
+    (1, "ticket_id lookup indexes", _ticket_id_lookups),
+    (2, "listing filter and sort indexes", _listing_filters),
+    (3, "chat_history (session_id, message_index) index", _chat_history_order),
+    (4, "normalised employee routing columns", _employee_routing_columns),
+    (5, "trim processed category/triage", _trim_processed_labels),
+    (6, "dashboard summary tables", _ticket_stats_tables),
+    (7, "chat_summaries table", _chat_summaries),
+    (8, "drop summary 'total' rows", _drop_stat_total_rows),
+]
+
+
+def applied_versions(cursor):
+    cursor.execute(MIGRATIONS_TABLE)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(target=None):
+    """Applies pending migrations in order, up to `target`; returns the versions applied."""
+    applied = []
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        done = applied_versions(cursor)
+        for version, name, step in MIGRATIONS:
+            if version in done or (target is not None and version > target):
+                continue
+            print(f"➡️ {version}: {name}")
+            step(cursor)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+            applied.append(version)
+        cursor.close()
+    return applied
+
+
+def migration_status():
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        done = applied_versions(cursor)
+        cursor.close()
+    return [(version, name, version in done) for version, name, _ in MIGRATIONS]
+
+
+# === EXPLAIN check ===
+SAMPLE_TICKET = "DEF-0001"
+
+
+def hot_queries():
+    """(name, sql, params, full_scan_expected) for the queries the API and workers issue."""
+    page_sql, page_params, count_sql, count_params = build_list_sql({})
+    by_date_sql, by_date_params, filtered_count_sql, filtered_count_params = build_list_sql(
+        {"category": "Network", "status": "Open"}, sort="reported_date", order="desc"
+    )
+    queries = [
+        ("ticket detail", DETAIL_QUERY, (SAMPLE_TICKET,), False),
+        ("ticket list page", page_sql, page_params, False),
+        ("ticket list count", count_sql, count_params, True),
+        ("filtered list by date", by_date_sql, by_date_params, False),
+        ("filtered list count", filtered_count_sql, filtered_count_params, False),
+        ("chat next index", NEXT_INDEX_QUERY, ("sample-session",), False),
+        ("chat recent", RECENT_QUERY, ("sample-session", 0, 6), False),
+        ("chat message count", MESSAGE_COUNT_QUERY, ("sample-session",), False),
+        ("chat summary", SUMMARY_QUERY, ("sample-session",), False),
+        ("assign routing table", ROUTING_QUERY, (), True),
+        ("assign open load", LOAD_QUERY, (), False),
+        ("assign tickets", TICKETS_QUERY.format(placeholders="%s"), (SAMPLE_TICKET,), False),
+        ("update processed", *build_update_sql("processed", {"triage": {SAMPLE_TICKET: "L2"}}, [SAMPLE_TICKET]),
+         False),
+        ("update status", *build_update_sql("main_table", {"status": {SAMPLE_TICKET: "Open"}}, [SAMPLE_TICKET]),
+         False),
+        ("lance sync", SYNC_QUERY, (), True),
+        ("reembed tickets", TICKETS_BY_ID_QUERY.format(placeholders="%s"), (SAMPLE_TICKET,), False),
+        ("stats ticket rows", STAT_ROWS_BY_ID_QUERY.format(placeholders="%s"), (SAMPLE_TICKET,), False),
+        # A few hundred summary rows at most, whatever the ticket count
+        ("stats totals", TOTALS_QUERY, (), True),
+        ("stats trend", DAILY_QUERY, (TOTAL_DIMENSION, "0001-01-01", "9999-12-31"), False),
+        ("stats counted", COUNTED_QUERY, (TOTAL_DIMENSION,), False),
+        # Walks the smallest index; only ingestion and the ticket_stats CLI run it, never a request
+        ("stats ticket count", TICKET_COUNT_QUERY, (), True),
+    ]
+    # Facet lists read every distinct value by design
+    queries += [(f"facet {key}", sql, (), True) for key, sql in FACET_QUERIES.items()]
+    return queries
+
+
+def explain_check():
+    """EXPLAINs every hot query; returns (name, table, rows) for each full scan that should not happen."""
+    problems = []
+    with get_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        for name, sql, params, full_scan_expected in hot_queries():
+            cursor.execute("EXPLAIN " + sql.strip().rstrip(";"), params)
+            for row in cursor.fetchall():
+                # type ALL is a full table scan; "index" is an ordered index walk, fine under a LIMIT
+                if row.get("type") != "ALL":
+                    continue
+                if full_scan_expected:
+                    print(f"   ↪ {name}: full scan of {row['table']} (expected)")
+                    continue
+                print(f"   ❌ {name}: full scan of {row['table']} (~{row.get('rows')} rows)")
+                problems.append((name, row["table"], row.get("rows")))
+        cursor.close()
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Schema migrations and query plan checks for the ticket database.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    up = sub.add_parser("migrate", help="apply pending migrations")
+    up.add_argument("--to", type=int, default=None, help="stop after this version")
+    sub.add_parser("status", help="list migrations and whether they are applied")
+    sub.add_parser("check", help="EXPLAIN the hot queries and flag full scans")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        versions = migrate(args.to)
+        print(f"✅ Applied {versions}" if versions else "✅ Schema is up to date.")
+    elif args.command == "status":
+        for version, name, done in migration_status():
+            print(f"{'✅' if done else '⏳'} {version}: {name}")
+    else:
+        problems = explain_check()
+        if problems:
+            print(f"❌ {len(problems)} unexpected full scans; run 'migrate' or add an index.")
+            sys.exit(1)
+        print("✅ No unexpected full scans.")
@@ -1,8 +1,21 @@
+from typing import List, Literal, Optional
 from pydantic import BaseModel
 class TicketUpdate(BaseModel):
     triage: str
     status: str
     category: str
+
+class TicketChange(BaseModel):
+    # Fields left out keep their current value
+    ticket_id: str
+    triage: Optional[str] = None
+    status: Optional[str] = None
+    category: Optional[str] = None
+
+class BulkTicketUpdate(BaseModel):
+    updates: List[TicketChange]
+    # abort: any invalid or failing change rolls back the whole batch; skip: apply the rest
+    on_error: Literal["abort", "skip"] = "abort"
     
 class ChatQuery(BaseModel):
     session_id: str
@@ -0,0 +1,190 @@
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dotenv import load_dotenv
+load_dotenv()
+
+# === Observability config ===
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+METRICS_PREFIX = "ticketbackend"
+# Seconds; tuned for a mix of ~1 ms cache hits and multi-second LLM calls
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+# Per-request list of (stage, seconds), shared by reference with executor threads
+request_spans_var = contextvars.ContextVar("request_spans", default=None)
+
+
+# === Structured logging ===
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+            "request_id": request_id_var.get(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+logger = logging.getLogger("ticketbackend")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(JsonFormatter())
+    logger.addHandler(_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+
+def log_event(event, level=logging.INFO, exc_info=False, **fields):
+    """One JSON log line tagged with the current request ID."""
+    logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+
+def new_request_id(incoming=None):
+    request_id = incoming or uuid.uuid4().hex[:16]
+    request_id_var.set(request_id)
+    request_spans_var.set([])
+    return request_id
+
+
+# === Metrics ===
+_metrics_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_counters = {}  # (name, labels) -> value
+_help = {}
+
+
+def _labels_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def observe(name, seconds, help_text="", **labels):
+    key = (name, _labels_key(labels))
+    with _metrics_lock:
+        _help.setdefault(name, ("histogram", help_text))
+        counts = _histograms.get(key)
+        if counts is None:
+            counts = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[len(LATENCY_BUCKETS)] += 1
+        counts[-1] += seconds
+
+
+def increment(name, value=1, help_text="", **labels):
+    key = (name, _labels_key(labels))
+    with _metrics_lock:
+        _help.setdefault(name, ("counter", help_text))
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def record_stage(stage, seconds):
+    observe("stage_duration_seconds", seconds, "Time spent in each backend stage", stage=stage)
+    spans = request_spans_var.get()
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+@contextmanager
+def span(stage):
+    """Times one stage: feeds the stage histogram and the current request's span list.
+
+    A plain `with` works around awaits too, so async code uses the same helper.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def request_spans():
+    """{stage: total ms} for the current request."""
+    totals = {}
+    for stage, seconds in request_spans_var.get() or ():
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return {stage: round(seconds * 1000, 2) for stage, seconds in totals.items()}
+
+
+def record_llm_usage(message, model="gemini"):
+    """Counts calls and tokens from a LangChain message's usage_metadata, when the provider sends it."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage.get("input_tokens"):
+        increment("llm_tokens_total", usage["input_tokens"], "LLM tokens by direction", model=model, kind="input")
+    if usage.get("output_tokens"):
+        increment("llm_tokens_total", usage["output_tokens"], "LLM tokens by direction", model=model, kind="output")
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items) + "}"
+
+
+def _gauges(groups):
+    """Flattens {group: {stat: number}} into gauge samples; non-numeric stats are skipped."""
+    samples = []
+    for group, stats in groups.items():
+        for key, value in stats.items():
+            if isinstance(value, (int, float)):
+                samples.append((f"{group}_{key}", (), int(value) if isinstance(value, bool) else value))
+    return samples
+
+
+def render_metrics(gauge_groups=None):
+    """Prometheus text exposition (version 0.0.4) of this process's metrics.
+
+    Each API worker process keeps its own numbers; scrape every worker.
+    """
+    lines = []
+    with _metrics_lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+        help_text = dict(_help)
+
+    for name in sorted({n for n, _ in histograms}):
+        full = f"{METRICS_PREFIX}_{name}"
+        lines.append(f"# HELP {full} {help_text[name][1]}")
+        lines.append(f"# TYPE {full} histogram")
+        for (metric, labels), counts in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, counts):
+                cumulative += count
+                lines.append(f"{full}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            total = cumulative + counts[len(LATENCY_BUCKETS)]
+            lines.append(f"{full}_bucket{_format_labels(labels, [('le', '+Inf')])} {total}")
+            lines.append(f"{full}_sum{_format_labels(labels)} {round(counts[-1], 6)}")
+            lines.append(f"{full}_count{_format_labels(labels)} {total}")
+
+    for name in sorted({n for n, _ in counters}):
+        full = f"{METRICS_PREFIX}_{name}"
+        lines.append(f"# HELP {full} {help_text[name][1]}")
+        lines.append(f"# TYPE {full} counter")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{full}{_format_labels(labels)} {value}")
+
+    seen = set()
+    for name, labels, value in _gauges(gauge_groups or {}):
+        full = f"{METRICS_PREFIX}_{name}"
+        if full not in seen:
+            lines.append(f"# TYPE {full} gauge")
+            seen.add(full)
+        lines.append(f"{full}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,259 @@
+import logging
+import os
+import threading
+import time
+from dotenv import load_dotenv
+try:
+    from ticketbackend.database import get_connection
+    from ticketbackend.lancesync import (
+        SYNC_QUERY, LANCE_DB_PATH, TICKET_COLUMNS, open_tickets_table, row_to_ticket, embed_tickets,
+        upsert_tickets, delete_tickets,
+    )
+    from ticketbackend.answer_cache import invalidate_tickets
+    from ticketbackend.data_version import bump_vector_version
+    from ticketbackend.retrieval import note_filter_values
+    from ticketbackend.observability import span, log_event, observe, increment
+except ImportError:
+    from database import get_connection
+    from lancesync import (
+        SYNC_QUERY, LANCE_DB_PATH, TICKET_COLUMNS, open_tickets_table, row_to_ticket, embed_tickets,
+        upsert_tickets, delete_tickets,
+    )
+    from answer_cache import invalidate_tickets
+    from data_version import bump_vector_version
+    from retrieval import note_filter_values
+    from observability import span, log_event, observe, increment
+load_dotenv()
+
+# === Re-embedding worker config ===
+# Ticket edits are queued here and written through to LanceDB by one background
+# thread; lancefill.py stays the full reconciliation for anything this misses.
+REEMBED_ENABLED = os.getenv("REEMBED_ON_UPDATE", "1") == "1"
+# Waits this long after the first queued ID so a burst of edits shares one batch
+REEMBED_DEBOUNCE = float(os.getenv("REEMBED_DEBOUNCE", "0.5"))
+REEMBED_BATCH = int(os.getenv("REEMBED_BATCH", "32"))
+REEMBED_MAX_QUEUE = int(os.getenv("REEMBED_MAX_QUEUE", "50000"))
+# A failed batch is retried after REEMBED_RETRY_DELAY, doubling up to REEMBED_RETRY_MAX_DELAY;
+# tickets still failing after REEMBED_MAX_RETRIES attempts are left for lancefill.py
+REEMBED_RETRY_DELAY = float(os.getenv("REEMBED_RETRY_DELAY", "5"))
+REEMBED_RETRY_MAX_DELAY = float(os.getenv("REEMBED_RETRY_MAX_DELAY", "300"))
+REEMBED_MAX_RETRIES = int(os.getenv("REEMBED_MAX_RETRIES", "5"))
+# Every upsert adds a small fragment and unindexed rows, which slow searches down;
+# compact and fold them into the indexes after this many batches, or once idle for a while
+REEMBED_OPTIMIZE_EVERY = int(os.getenv("REEMBED_OPTIMIZE_EVERY", "8"))
+REEMBED_OPTIMIZE_IDLE = float(os.getenv("REEMBED_OPTIMIZE_IDLE", "30"))
+
+TICKETS_BY_ID_QUERY = SYNC_QUERY + "    WHERE m.ticket_id IN ({placeholders})\n"
+
+_IDLE = object()
+_pending = {}  # ticket_id -> monotonic time first queued; a re-queued ID keeps its place
+_attempts = {}  # ticket_id -> failed attempts so far
+_cond = threading.Condition()
+_worker = None
+_stopping = False
+_table_getter = None
+_unoptimized_batches = 0
+_stats = {
+    "enqueued": 0, "coalesced": 0, "dropped": 0, "upserted": 0, "deleted": 0,
+    "batches": 0, "failed_batches": 0, "failed_tickets": 0, "optimizations": 0, "last_lag_seconds": None, "last_batch_at": None,
+}
+
+
+def set_table_getter(fn):
+    """Writes go through the API's own table handle, so its next search sees them at once."""
+    global _table_getter
+    _table_getter = fn
+
+
+def _get_table():
+    if _table_getter is not None:
+        return _table_getter()
+    import lancedb
+    return open_tickets_table(lancedb.connect(LANCE_DB_PATH))
+
+
+def enqueue_reembed(ticket_ids):
+    """Queues tickets whose text changed in MySQL; never blocks the caller."""
+    if not REEMBED_ENABLED:
+        return
+    now = time.monotonic()
+    with _cond:
+        for ticket_id in ticket_ids:
+            if ticket_id in _pending:
+                _stats["coalesced"] += 1
+            elif len(_pending) >= REEMBED_MAX_QUEUE:
+                # The next lancefill.py run picks these up
+                _stats["dropped"] += 1
+            else:
+                _pending[ticket_id] = now
+                _stats["enqueued"] += 1
+        _cond.notify()
+    _ensure_worker()
+
+
+def fetch_tickets(ticket_ids):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(TICKETS_BY_ID_QUERY.format(placeholders=", ".join(["%s"] * len(ticket_ids))), ticket_ids)
+        tickets = {}
+        for row in cursor.fetchall():
+            ticket = row_to_ticket(row)
+            # assign may hold several rows per ticket; keep the first, as the full sync does
+            tickets.setdefault(ticket["ticket_id"], ticket)
+        return list(tickets.values())
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def reembed_tickets(ticket_ids):
+    """Re-reads, re-embeds and upserts these tickets; ones gone from MySQL are deleted."""
+    with span("reembed.fetch"):
+        tickets = fetch_tickets(ticket_ids)
+    table = _get_table()
+    if table is None or any(col not in table.schema.names for col in TICKET_COLUMNS):
+        raise RuntimeError("LanceDB tickets table is missing or a placeholder; run lancefill.py first")
+    with span("reembed.encode"):
+        embed_tickets(tickets, REEMBED_BATCH)
+    with span("reembed.upsert"):
+        if tickets:
+            upsert_tickets(table, tickets)
+        found = {t["ticket_id"] for t in tickets}
+        gone = [t for t in ticket_ids if t not in found]
+        if gone:
+            delete_tickets(table, gone)
+    invalidate_tickets(ticket_ids)
+    # MySQL did not change, so the data version stays put; only answer caches in other
+    # workers need to drop what they built from these rows
+    bump_vector_version(ticket_ids)
+    # A new category or status value may now be worth extracting as a filter
+    note_filter_values(tickets)
+    return len(tickets), len(gone)
+
+
+def _optimize():
+    global _unoptimized_batches
+    try:
+        with span("reembed.optimize"):
+            _get_table().optimize()
+        with _cond:
+            _stats["optimizations"] += 1
+    except Exception as e:
+        log_event("reembed.optimize_failed", logging.WARNING, error=str(e))
+    _unoptimized_batches = 0
+
+
+def _take_batch():
+    """Blocks until a batch is due; returns [(ticket_id, queued_at)], _IDLE, or None to stop."""
+    with _cond:
+        while not _pending and not _stopping:
+            if not _unoptimized_batches:
+                _cond.wait()
+            elif not _cond.wait(REEMBED_OPTIMIZE_IDLE) and not _pending:
+                return _IDLE
+        if not _pending:
+            return None
+        if not _stopping:
+            due = min(_pending.values()) + REEMBED_DEBOUNCE
+            while not _stopping and time.monotonic() < due and len(_pending) < REEMBED_BATCH:
+                _cond.wait(max(0.0, due - time.monotonic()))
+        oldest_first = sorted(_pending.items(), key=lambda item: item[1])[:REEMBED_BATCH]
+        for ticket_id, _ in oldest_first:
+            del _pending[ticket_id]
+        return oldest_first
+
+
+def _worker_loop():
+    global _unoptimized_batches
+    while True:
+        batch = _take_batch()
+        if batch is None:
+            return
+        if batch is _IDLE:
+            _optimize()
+            continue
+        ticket_ids = [ticket_id for ticket_id, _ in batch]
+        try:
+            upserted, deleted = reembed_tickets(ticket_ids)
+        except Exception as e:
+            given_up = []
+            with _cond:
+                _stats["failed_batches"] += 1
+                attempt = 0
+                for ticket_id, queued_at in batch:
+                    tries = _attempts.get(ticket_id, 0) + 1
+                    attempt = max(attempt, tries)
+                    if tries >= REEMBED_MAX_RETRIES:
+                        # An edit queued meanwhile still gets its own attempts
+                        _attempts.pop(ticket_id, None)
+                        given_up.append(ticket_id)
+                        continue
+                    _attempts[ticket_id] = tries
+                    # An edit queued meanwhile has the newer time; keep the older one so lag stays honest
+                    _pending[ticket_id] = min(queued_at, _pending.get(ticket_id, queued_at))
+                _stats["failed_tickets"] += len(given_up)
+                stopping = _stopping
+            log_event("reembed.failed", logging.WARNING, error=str(e), tickets=len(batch), attempt=attempt)
+            if given_up:
+                log_event("reembed.gave_up", logging.ERROR, tickets=len(given_up), ticket_ids=given_up[:20],
+                          attempts=REEMBED_MAX_RETRIES)
+                increment("reembed_failed_tickets_total", len(given_up),
+                          "Tickets left for lancefill.py after every re-embedding attempt failed")
+            if stopping:
+                return
+            time.sleep(min(REEMBED_RETRY_DELAY * 2 ** (attempt - 1), REEMBED_RETRY_MAX_DELAY))
+            continue
+        now = time.monotonic()
+        lag = now - min(queued_at for _, queued_at in batch)
+        observe("reembed_lag_seconds", lag, "Time from a ticket edit to its LanceDB upsert")
+        with _cond:
+            for ticket_id in ticket_ids:
+                _attempts.pop(ticket_id, None)
+            _stats["upserted"] += upserted
+            _stats["deleted"] += deleted
+            _stats["batches"] += 1
+            _stats["last_lag_seconds"] = round(lag, 3)
+            _stats["last_batch_at"] = time.time()
+            _unoptimized_batches += 1
+        if _unoptimized_batches >= REEMBED_OPTIMIZE_EVERY:
+            _optimize()
+
+
+def _ensure_worker():
+    global _worker, _stopping
+    if _worker is not None and _worker.is_alive():
+        return
+    with _cond:
+        if _worker is None or not _worker.is_alive():
+            _stopping = False
+            _worker = threading.Thread(target=_worker_loop, name="reembed-worker", daemon=True)
+            _worker.start()
+
+
+def flush_reembed(timeout=30):
+    """Re-embeds what is queued, without waiting out the debounce, and stops the worker."""
+    global _worker, _stopping
+    worker = _worker
+    if worker is None or not worker.is_alive():
+        return
+    with _cond:
+        _stopping = True
+        _cond.notify_all()
+    worker.join(timeout)
+    if worker.is_alive():
+        log_event("reembed.flush_timeout", logging.WARNING, timeout=timeout, queued=len(_pending))
+    else:
+        _worker = None
+
+
+def get_reembed_stats():
+    with _cond:
+        oldest = min(_pending.values()) if _pending else None
+        return {
+            **_stats,
+            "enabled": REEMBED_ENABLED,
+            "queue_depth": len(_pending),
+            "oldest_queued_seconds": round(time.monotonic() - oldest, 3) if oldest is not None else 0.0,
+            "worker_alive": _worker is not None and _worker.is_alive(),
+        }
@@ -0,0 +1,262 @@
+import argparse
+import os
+import random
+import re
+import threading
+import time
+from dotenv import load_dotenv
+try:
+    from ticketbackend.lancesync import LANCE_DB_PATH, TABLE_NAME, TEXT_COLUMNS, FILTER_COLUMNS, sql_in_list
+    from ticketbackend.lanceindex import vector_search, _percentile
+    from ticketbackend.embedding import encode_query
+    from ticketbackend.observability import span, log_event
+except ImportError:
+    from lancesync import LANCE_DB_PATH, TABLE_NAME, TEXT_COLUMNS, FILTER_COLUMNS, sql_in_list
+    from lanceindex import vector_search, _percentile
+    from embedding import encode_query
+    from observability import span, log_event
+load_dotenv()
+
+# === Retrieval config ===
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+QUERY_FILTERS = os.getenv("QUERY_FILTERS", "true").lower() in ("1", "true", "yes")
+# Hits taken from each of the vector and full-text searches before fusing
+CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# How long the known category/status/triage values are trusted before re-reading them
+VOCABULARY_TTL = float(os.getenv("RETRIEVAL_VOCABULARY_TTL", "300"))
+
+RESULT_COLUMNS = [
+    "ticket_id", "title", "status", "reported_date", "summary",
+    "description", "triage", "category", "solution",
+]
+FILTER_NOUNS = r"(?:tickets?|issues?|incidents?|requests?|problems?|cases?)"
+# Triage levels are codes like L2 or P1, safe to match anywhere in a query
+CODE_VALUE = re.compile(r"^[a-z]\d{1,2}$")
+
+
+# === Filter vocabulary ===
+_vocab_lock = threading.Lock()
+_vocab = {}  # id(table) -> (loaded_at, {"values": ..., "fts_columns": [...]})
+
+
+def _load_vocabulary(table):
+    """Distinct filter values (normalised -> stored spellings) and the text columns with an FTS index."""
+    values = {}
+    total = table.count_rows()
+    if total:
+        data = table.search().select(FILTER_COLUMNS).limit(total).to_arrow()
+        for column in FILTER_COLUMNS:
+            spellings = {}
+            for value in data[column].unique().to_pylist():
+                if value is None or not str(value).strip():
+                    continue
+                spellings.setdefault(" ".join(str(value).lower().split()), []).append(value)
+            values[column] = spellings
+    indexed = {idx.columns[0] for idx in table.list_indices() if idx.index_type == "FTS"}
+    return {"values": values, "fts_columns": [c for c in TEXT_COLUMNS if c in indexed]}
+
+
+def get_vocabulary(table):
+    key = id(table)
+    with _vocab_lock:
+        cached = _vocab.get(key)
+        if cached and time.monotonic() - cached[0] < VOCABULARY_TTL:
+            return cached[1]
+        vocabulary = _load_vocabulary(table)
+        _vocab[key] = (time.monotonic(), vocabulary)
+        return vocabulary
+
+
+def invalidate_vocabulary():
+    with _vocab_lock:
+        _vocab.clear()
+
+
+def note_filter_values(tickets):
+    """Invalidates the vocabulary if these tickets carry a category/status/triage spelling
+    it does not know yet; values that merely moved between tickets change nothing."""
+    with _vocab_lock:
+        for _, vocabulary in _vocab.values():
+            for column in FILTER_COLUMNS:
+                spellings = vocabulary["values"].get(column, {})
+                for ticket in tickets:
+                    value = ticket.get(column)
+                    if value is None or not str(value).strip():
+                        continue
+                    if value not in spellings.get(" ".join(str(value).lower().split()), ()):
+                        _vocab.clear()
+                        return True
+    return False
+
+
+def extract_filters(query, vocabulary):
+    """{column: [stored values]} for filters the query states outright.
+
+    "category network", "status: open", "open tickets" and "L2" all count; a
+    value merely appearing in prose ("I can't open outlook") does not.
+    """
+    text = " ".join(query.lower().split())
+    filters = {}
+    for column, spellings in vocabulary["values"].items():
+        matched = []
+        for value, stored in spellings.items():
+            escaped = re.escape(value).replace(r"\ ", r"\s+")
+            patterns = [
+                rf"\b{column}\s*(?:is|=|:)?\s*{escaped}\b",
+                # One word may sit in between: "open network tickets"
+                rf"\b{escaped}\s+(?:\w+\s+)?{FILTER_NOUNS}\b",
+            ]
+            if CODE_VALUE.match(value):
+                patterns.append(rf"\b{escaped}\b")
+            if any(re.search(p, text) for p in patterns):
+                matched.extend(stored)
+        if matched:
+            filters[column] = matched
+    return filters
+
+
+def filters_to_where(filters):
+    return " AND ".join(f"{column} IN ({sql_in_list(values)})" for column, values in sorted(filters.items()))
+
+
+# === Search ===
+def fuse(result_lists, k, rrf_k=None):
+    """Reciprocal rank fusion: each list adds 1 / (rrf_k + rank) to a ticket's score."""
+    rrf_k = RRF_K if rrf_k is None else rrf_k
+    scores = {}
+    best_rank = {}
+    docs = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            ticket_id = doc["ticket_id"]
+            scores[ticket_id] = scores.get(ticket_id, 0.0) + 1.0 / (rrf_k + rank)
+            best_rank[ticket_id] = min(rank, best_rank.get(ticket_id, rank))
+            docs.setdefault(ticket_id, doc)
+    # Ties go to the ticket one search ranked highest; sorted() is stable, so then to the vector order
+    ranked = sorted(scores, key=lambda t: (-scores[t], best_rank[t]))[:k]
+    return [{**{c: v for c, v in docs[t].items() if c != "_score"}, "_rrf_score": round(scores[t], 6)}
+            for t in ranked]
+
+
+def text_search(table, query_text, limit, fts_columns, where=None):
+    query = (
+        table.search(query_text, query_type="fts", fts_columns=fts_columns)
+        .select(RESULT_COLUMNS + ["_score"])
+        .limit(limit)
+    )
+    if where:
+        query = query.where(where, prefilter=True)
+    return query.to_list()
+
+
+def hybrid_search(table, query_text, query_vector, k, where=None, fts_columns=None):
+    """Top k by fusing a vector search and a BM25 search over the same (optionally prefiltered) rows."""
+    with span("retrieval.vector"):
+        query = vector_search(table, query_vector, max(k, CANDIDATES)).select(RESULT_COLUMNS + ["_distance"])
+        if where:
+            query = query.where(where, prefilter=True)
+        vector_hits = query.to_list()
+    text_hits = []
+    if fts_columns and query_text.strip():
+        with span("retrieval.text"):
+            try:
+                text_hits = text_search(table, query_text, max(k, CANDIDATES), fts_columns, where)
+            except Exception as e:
+                # A query the FTS parser rejects should not cost the user the vector results
+                log_event("retrieval.text_search_failed", error=str(e))
+    return fuse([vector_hits, text_hits], k)
+
+
+def search_tickets(table, query_text, query_vector, k):
+    """The chat retrieval step: prefilters from the query, then hybrid (or vector-only) search.
+
+    Returns (results, filters). Filters that leave nothing to find are dropped
+    and the search is repeated over the whole table.
+    """
+    if not HYBRID_SEARCH:
+        with span("retrieval.vector"):
+            return vector_search(table, query_vector, k).select(RESULT_COLUMNS + ["_distance"]).to_list(), {}
+    vocabulary = get_vocabulary(table)
+    filters = {}
+    if QUERY_FILTERS:
+        with span("retrieval.filters"):
+            filters = extract_filters(query_text, vocabulary)
+    if filters:
+        results = hybrid_search(table, query_text, query_vector, k, filters_to_where(filters),
+                                vocabulary["fts_columns"])
+        if results:
+            return results, filters
+    return hybrid_search(table, query_text, query_vector, k, None, vocabulary["fts_columns"]), {}
+
+
+# === Retrieval report ===
+def _labelled_queries(table, samples, seed=0):
+    """(query, expected ticket_id) pairs built from the corpus: a ticket's title, and the
+    title followed by its category, so both the fused and the filtered paths are exercised."""
+    total = table.count_rows()
+    data = table.search().select(["ticket_id", "title", "category"]).limit(total).to_list()
+    rng = random.Random(seed)
+    rng.shuffle(data)
+    queries = []
+    for row in data[:samples]:
+        if not row["title"]:
+            continue
+        queries.append(("title", row["title"], row["ticket_id"]))
+        if row["category"]:
+            queries.append(("title+category", f"{row['title']} in {row['category'].strip()} tickets",
+                            row["ticket_id"]))
+    return queries
+
+
+def retrieval_report(table, k=3, samples=100, seed=0):
+    """Hit rate, MRR and latency of vector-only vs hybrid vs hybrid with prefilters."""
+    global HYBRID_SEARCH, QUERY_FILTERS
+    queries = _labelled_queries(table, samples, seed)
+    vectors = [encode_query(q) for _, q, _ in queries]
+    modes = [("vector", False, False), ("hybrid", True, False), ("hybrid+filters", True, True)]
+    saved = HYBRID_SEARCH, QUERY_FILTERS
+    report = []
+    try:
+        for name, hybrid, filters in modes:
+            HYBRID_SEARCH, QUERY_FILTERS = hybrid, filters
+            get_vocabulary(table)  # loaded once, outside the timings
+            for kind in sorted({kind for kind, _, _ in queries}):
+                hits = 0
+                reciprocal = 0.0
+                times = []
+                for (query_kind, query, expected), vector in zip(queries, vectors):
+                    if query_kind != kind:
+                        continue
+                    started = time.perf_counter()
+                    results, _ = search_tickets(table, query, vector, k)
+                    times.append(time.perf_counter() - started)
+                    ids = [r["ticket_id"] for r in results]
+                    if expected in ids:
+                        hits += 1
+                        reciprocal += 1.0 / (ids.index(expected) + 1)
+                report.append({
+                    "mode": name,
+                    "queries": kind,
+                    "hit_rate": round(hits / max(1, len(times)), 4),
+                    "mrr": round(reciprocal / max(1, len(times)), 4),
+                    "p50_ms": round(_percentile(times, 50) * 1000, 2),
+                    "p95_ms": round(_percentile(times, 95) * 1000, 2),
+                })
+    finally:
+        HYBRID_SEARCH, QUERY_FILTERS = saved
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare vector-only and hybrid ticket retrieval.")
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import lancedb
+    table = lancedb.connect(LANCE_DB_PATH).open_table(TABLE_NAME)
+    for row in retrieval_report(table, k=args.k, samples=args.samples, seed=args.seed):
+        print(f"{row['mode']:<16} {row['queries']:<16} hit@{args.k}={row['hit_rate']:<7} "
+              f"mrr={row['mrr']:<7} p50={row['p50_ms']}ms p95={row['p95_ms']}ms")
@@ -0,0 +1,227 @@
+import base64
+import json
+
+# === Shared ticket joins ===
+TICKET_FROM = """
+    FROM main_table AS m
+    JOIN processed AS p ON m.ticket_id = p.ticket_id
+    JOIN assign AS a ON m.ticket_id = a.ticket_id
+    JOIN employee AS e ON a.assigned_id = e.employee_id
+"""
+
+LIST_COLUMNS = """
+    SELECT m.ticket_id, m.title, m.status, m.reported_date, p.summary,
+           m.description, p.triage, p.category, e.employee_name, p.solution,
+           m.source
+"""
+
+# Sort keys the listing accepts -> SQL expression; ticket_id is always the tie-breaker
+SORT_COLUMNS = {
+    "ticket_id": "m.ticket_id",
+    "title": "COALESCE(m.title, '')",
+    "reported_date": "m.reported_date",
+    "status": "COALESCE(m.status, '')",
+    "triage": "COALESCE(p.triage, '')",
+    "category": "COALESCE(p.category, '')",
+    "assignee": "COALESCE(e.employee_name, '')",
+    "source": "COALESCE(m.source, 'Other')",
+}
+
+# Sort keys left un-COALESCEd so their index still serves the ORDER BY; keyset pages handle NULLs
+NULLABLE_SORTS = {"reported_date"}
+
+# Exact-match filters -> SQL expression
+FILTER_COLUMNS = {
+    "category": "p.category",
+    "triage": "p.triage",
+    "status": "m.status",
+    "assignee": "e.employee_name",
+    "source": "COALESCE(m.source, 'Other')",
+}
+
+DETAIL_QUERY = """
+    SELECT m.ticket_id, m.title, m.status, m.reported_date, p.summary,
+           m.description, p.triage, p.category, e.employee_name, p.solution,
+           r.triage_reason, r.category_reason, m.source
+""" + TICKET_FROM + """
+    LEFT JOIN reasons AS r ON m.ticket_id = r.ticket_id
+    WHERE m.ticket_id = %s
+    LIMIT 1
+"""
+
+FACET_QUERIES = {
+    "distinct_categories": "select distinct category from processed;",
+    "distinct_status": "select distinct status from main_table;",
+    "distinct_assigned_to": """
+        select distinct e.employee_name
+        from assign a JOIN employee e ON a.assigned_id = e.employee_id;
+    """,
+    "distinct_sources": "select distinct source from main_table order by source;",
+}
+
+MAX_PAGE_SIZE = 200
+
+
+def list_row_to_dict(r):
+    return {
+        "ticket_id": r[0],
+        "ticket_title": r[1],
+        "ticket_status": r[2],
+        "ticket_reported_date": r[3],
+        "ticket_summary": r[4],
+        "ticket_description": r[5],
+        "ticket_triage": r[6],
+        "ticket_category": r[7],
+        "ticket_assigned_employee": r[8],
+        "ticket_solution": r[9],
+        "ticket_source": r[10] or "Other",
+    }
+
+
+def detail_row_to_dict(r):
+    return {
+        "ticket_id": r[0],
+        "ticket_title": r[1],
+        "ticket_status": r[2],
+        "ticket_reported_date": r[3],
+        "ticket_summary": r[4],
+        "ticket_description": r[5],
+        "ticket_triage": r[6],
+        "ticket_triage_reason": r[10],
+        "ticket_category": r[7],
+        "ticket_category_reason": r[11],
+        "ticket_assigned_employee": r[8],
+        "ticket_solution": r[9],
+        "ticket_source": r[12] or "Other"
+    }
+
+
+def fetch_ticket_detail(conn, ticket_id):
+    cur = conn.cursor()
+    try:
+        cur.execute(DETAIL_QUERY, (ticket_id,))
+        row = cur.fetchone()
+    finally:
+        cur.close()
+    return detail_row_to_dict(row) if row else None
+
+
+def fetch_facets(conn):
+    """Dropdown options shared by the dashboard filters and the ticket editor."""
+    facets = {"distinct_triages": [f"L{i}" for i in range(1, 6)]}
+    cur = conn.cursor()
+    try:
+        for key, sql in FACET_QUERIES.items():
+            cur.execute(sql)
+            facets[key] = [row[0] for row in cur.fetchall()]
+    finally:
+        cur.close()
+    facets["distinct_sources"] = [s or "Other" for s in facets["distinct_sources"]]
+    return facets
+
+
+def encode_cursor(sort_value, ticket_id):
+    if hasattr(sort_value, "isoformat"):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, ticket_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        sort_value, ticket_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return sort_value, ticket_id
+
+
+def build_filter_clause(filters, q=None):
+    """Returns (clauses, params) for the exact-match filters and the text search."""
+    clauses = []
+    params = []
+    for key, value in filters.items():
+        if value in (None, ""):
+            continue
+        clauses.append(f"{FILTER_COLUMNS[key]} = %s")
+        params.append(value)
+    if q:
+        clauses.append("(m.title LIKE %s OR m.ticket_id LIKE %s)")
+        like = f"%{q}%"
+        params.extend([like, like])
+    return clauses, params
+
+
+def build_list_sql(filters, q=None, sort="ticket_id", order="asc", limit=50, cursor=None):
+    """Returns (page_sql, page_params, count_sql, count_params) for one listing page."""
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Unsupported sort column: {sort}")
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Unsupported sort order: {order}")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    sort_expr = SORT_COLUMNS[sort]
+
+    clauses, params = build_filter_clause(filters, q)
+    page_clauses = list(clauses)
+    page_params = list(params)
+    if cursor:
+        last_value, last_id = decode_cursor(cursor)
+        cmp = ">" if order == "asc" else "<"
+        if sort == "ticket_id":
+            page_clauses.append(f"m.ticket_id {cmp} %s")
+            page_params.append(last_id)
+        elif last_value is None:
+            # NULLs sort first ascending and last descending (MySQL and SQLite agree),
+            # and "= NULL" never matches, so a page ending on one needs IS NULL tests
+            keyset = f"({sort_expr} IS NULL AND m.ticket_id {cmp} %s)"
+            if order == "asc":
+                keyset += f" OR {sort_expr} IS NOT NULL"
+            page_clauses.append(f"({keyset})")
+            page_params.append(last_id)
+        else:
+            keyset = f"{sort_expr} {cmp} %s OR ({sort_expr} = %s AND m.ticket_id {cmp} %s)"
+            if sort in NULLABLE_SORTS and order == "desc":
+                keyset += f" OR {sort_expr} IS NULL"
+            page_clauses.append(f"({keyset})")
+            page_params.extend([last_value, last_value, last_id])
+
+    where = f"WHERE {' AND '.join(page_clauses)}" if page_clauses else ""
+    direction = order.upper()
+    order_by = "m.ticket_id" if sort == "ticket_id" else f"{sort_expr} {direction}, m.ticket_id"
+    # Fetch one extra row to learn whether another page exists
+    page_sql = (
+        f"{LIST_COLUMNS}, {sort_expr} AS sort_value {TICKET_FROM} {where} "
+        f"ORDER BY {order_by} {direction} LIMIT %s"
+    )
+    count_where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    count_sql = f"SELECT COUNT(*) {TICKET_FROM} {count_where}"
+    return page_sql, tuple(page_params) + (limit + 1,), count_sql, tuple(params)
+
+
+def list_tickets(conn, filters, q=None, sort="ticket_id", order="asc",
+                 limit=50, cursor=None, include_total=True):
+    page_sql, page_params, count_sql, count_params = build_list_sql(filters, q, sort, order, limit, cursor)
+    limit = page_params[-1] - 1
+
+    cur = conn.cursor()
+    try:
+        cur.execute(page_sql, page_params)
+        rows = cur.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = encode_cursor(last[-1], last[0])
+
+        total = None
+        if include_total:
+            cur.execute(count_sql, count_params)
+            total = cur.fetchone()[0]
+    finally:
+        cur.close()
+
+    return {
+        "tickets": [list_row_to_dict(r) for r in rows],
+        "next_cursor": next_cursor,
+        "total": total,
+    }
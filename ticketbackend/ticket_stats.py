@@ -0,0 +1,348 @@
+import argparse
+import logging
+from collections import Counter
+from datetime import date, timedelta
+from dotenv import load_dotenv
+try:
+    from ticketbackend.database import get_connection
+    from ticketbackend.data_version import bump_data_version
+    from ticketbackend.observability import log_event, increment
+except ImportError:
+    from database import get_connection
+    from data_version import bump_data_version
+    from observability import log_event, increment
+load_dotenv()
+
+# Dashboard aggregates live in two small summary tables that every ticket write
+# adjusts in its own transaction, so /stats costs the same at 1k or 10M tickets.
+# rebuild_stats() is the full recount; reconcile_stats() runs it when the tables no
+# longer add up to main_table, which ingestion (lancefill.py) checks after each sync.
+DIMENSIONS = ["category", "triage", "status", "source", "assignee"]
+# Every ticket is counted once under each dimension, so the overall and per-day totals are
+# this dimension's sums; a shared "total" row would make every write queue on one lock
+TOTAL_DIMENSION = "status"
+TREND_BUCKETS = ("day", "week", "month")
+# Labels for missing values; source matches what the ticket list shows
+UNKNOWN = "Unknown"
+NO_SOURCE = "Other"
+UNASSIGNED = "Unassigned"
+
+STATS_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS ticket_stat_totals (
+        dimension VARCHAR(32) NOT NULL,
+        value VARCHAR(255) NOT NULL,
+        tickets INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (dimension, value)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ticket_stat_daily (
+        dimension VARCHAR(32) NOT NULL,
+        day DATE NOT NULL,
+        value VARCHAR(255) NOT NULL,
+        tickets INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (dimension, day, value)
+    )
+    """,
+]
+
+# The assignee is kept as an employee ID and named when read, so renames need no recount
+STAT_ROWS_QUERY = """
+    SELECT m.ticket_id, m.reported_date, p.category, p.triage, m.status, m.source, a.assigned_id
+    FROM main_table AS m
+    LEFT JOIN processed AS p ON p.ticket_id = m.ticket_id
+    LEFT JOIN assign AS a ON a.ticket_id = m.ticket_id
+"""
+
+STAT_ROWS_BY_ID_QUERY = STAT_ROWS_QUERY + "    WHERE m.ticket_id IN ({placeholders})\n"
+
+ADD_TOTAL = """
+    INSERT INTO ticket_stat_totals (dimension, value, tickets) VALUES (%s, %s, %s) AS new
+    ON DUPLICATE KEY UPDATE tickets = tickets + new.tickets
+"""
+
+ADD_DAILY = """
+    INSERT INTO ticket_stat_daily (dimension, day, value, tickets) VALUES (%s, %s, %s, %s) AS new
+    ON DUPLICATE KEY UPDATE tickets = tickets + new.tickets
+"""
+
+TOTALS_QUERY = """
+    SELECT dimension, value, tickets FROM ticket_stat_totals WHERE tickets > 0
+"""
+
+DAILY_QUERY = """
+    SELECT day, value, tickets FROM ticket_stat_daily
+    WHERE dimension = %s AND day >= %s AND day <= %s AND tickets > 0
+"""
+
+TICKET_COUNT_QUERY = "SELECT COUNT(*) FROM main_table"
+
+COUNTED_QUERY = "SELECT COALESCE(SUM(tickets), 0) FROM ticket_stat_totals WHERE dimension = %s"
+
+# Taken before a recount so no write can adjust the tables between its read and its commit
+LOCK_STATS_QUERIES = [
+    "SELECT dimension FROM ticket_stat_totals FOR UPDATE",
+    "SELECT dimension FROM ticket_stat_daily FOR UPDATE",
+]
+
+STATS_CHUNK = 1000
+
+
+def _label(value, missing=UNKNOWN):
+    value = (str(value).strip() if value is not None else "")
+    return value or missing
+
+
+def _day(value):
+    """reported_date as YYYY-MM-DD, or None when it is missing or not a date."""
+    if value is None:
+        return None
+    text = value.isoformat() if hasattr(value, "isoformat") else str(value)
+    try:
+        return date.fromisoformat(text[:10]).isoformat()
+    except ValueError:
+        return None
+
+
+def _stat_row(row):
+    _, reported, category, triage, status, source, assignee = row
+    return _day(reported), {
+        "category": _label(category),
+        "triage": _label(triage),
+        "status": _label(status),
+        "source": _label(source, NO_SOURCE),
+        "assignee": _label(assignee, UNASSIGNED),
+    }
+
+
+def read_stat_rows(cursor, ticket_ids, lock=True):
+    """ticket_id -> (day, {dimension: value}) as the summary tables count them.
+
+    lock=True reads FOR UPDATE, so nothing else can change the tickets between
+    this read and the caller's commit.
+    """
+    ticket_ids = list(dict.fromkeys(ticket_ids))
+    rows = {}
+    for i in range(0, len(ticket_ids), STATS_CHUNK):
+        chunk = ticket_ids[i:i + STATS_CHUNK]
+        sql = STAT_ROWS_BY_ID_QUERY.format(placeholders=", ".join(["%s"] * len(chunk)))
+        cursor.execute(sql + (" FOR UPDATE" if lock else ""), chunk)
+        for row in cursor.fetchall():
+            # processed/assign may hold several rows per ticket; count it once, as the first
+            rows.setdefault(row[0], _stat_row(row))
+    return rows
+
+
+def _count(totals, daily, stat_row, sign):
+    day, values = stat_row
+    for dimension, value in values.items():
+        totals[(dimension, value)] += sign
+        if day:
+            daily[(dimension, day, value)] += sign
+
+
+def apply_stat_delta(cursor, before, after):
+    """Moves each ticket from its `before` row to its `after` row in the summary tables.
+
+    A ticket only in `after` is new, one only in `before` is gone. Runs inside the
+    caller's transaction; returns the number of summary rows touched.
+    """
+    totals, daily = Counter(), Counter()
+    for ticket_id, stat_row in before.items():
+        if after.get(ticket_id) != stat_row:
+            _count(totals, daily, stat_row, -1)
+    for ticket_id, stat_row in after.items():
+        if before.get(ticket_id) != stat_row:
+            _count(totals, daily, stat_row, 1)
+    # Sorted so concurrent writers take the summary row locks in the same order
+    total_rows = sorted((d, v, n) for (d, v), n in totals.items() if n)
+    daily_rows = sorted((d, day, v, n) for (d, day, v), n in daily.items() if n)
+    if total_rows:
+        cursor.executemany(ADD_TOTAL, total_rows)
+    if daily_rows:
+        cursor.executemany(ADD_DAILY, daily_rows)
+    return len(total_rows) + len(daily_rows)
+
+
+def record_new_tickets(cursor, ticket_ids):
+    """For ingestion: counts freshly inserted tickets, in the transaction that inserted them."""
+    return apply_stat_delta(cursor, {}, read_stat_rows(cursor, ticket_ids, lock=False))
+
+
+# === Full recount ===
+def count_all(cursor):
+    """(totals, daily) Counters recomputed from the ticket tables; reads every ticket."""
+    totals, daily = Counter(), Counter()
+    seen = set()
+    cursor.execute(STAT_ROWS_QUERY)
+    while True:
+        rows = cursor.fetchmany(STATS_CHUNK)
+        if not rows:
+            break
+        for row in rows:
+            if row[0] not in seen:
+                seen.add(row[0])
+                _count(totals, daily, _stat_row(row), 1)
+    return totals, daily
+
+
+def rebuild_stats(cursor):
+    """Replaces the summary tables with a full recount; returns the number of tickets counted.
+
+    Locks both tables first, so ticket writes wait for the commit instead of being
+    lost from the counts; start it in a fresh transaction.
+    """
+    for sql in LOCK_STATS_QUERIES:
+        cursor.execute(sql)
+        cursor.fetchall()
+    totals, daily = count_all(cursor)
+    cursor.execute("DELETE FROM ticket_stat_totals")
+    cursor.execute("DELETE FROM ticket_stat_daily")
+    cursor.executemany(ADD_TOTAL, sorted((d, v, n) for (d, v), n in totals.items() if n))
+    cursor.executemany(ADD_DAILY, sorted((d, day, v, n) for (d, day, v), n in daily.items() if n))
+    return sum(n for (d, _), n in totals.items() if d == TOTAL_DIMENSION)
+
+
+def reconcile_stats(conn):
+    """Recounts when the summary tables do not add up to main_table, as after tickets were
+    inserted or deleted behind this module's back. Returns the tickets counted, or None."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(TICKET_COUNT_QUERY)
+        tickets = int(cursor.fetchone()[0])
+        cursor.execute(COUNTED_QUERY, (TOTAL_DIMENSION,))
+        counted = int(cursor.fetchone()[0])
+        if tickets == counted:
+            return None
+        log_event("stats.drift", logging.WARNING, tickets=tickets, counted=counted)
+        increment("stats_rebuilds_total", 1, "Summary table recounts after drift was found")
+        # End the read snapshot so the recount sees every committed write
+        conn.rollback()
+        try:
+            counted = rebuild_stats(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        cursor.close()
+    bump_data_version([])
+    return counted
+
+
+def check_stats(cursor):
+    """Summary rows that disagree with a full recount, as (table, key, stored, expected)."""
+    totals, daily = count_all(cursor)
+    cursor.execute("SELECT dimension, value, tickets FROM ticket_stat_totals")
+    stored_totals = {(d, v): n for d, v, n in cursor.fetchall()}
+    cursor.execute("SELECT dimension, day, value, tickets FROM ticket_stat_daily")
+    stored_daily = {(d, _day(day), v): n for d, day, v, n in cursor.fetchall()}
+    drift = []
+    for table, stored, expected in (("totals", stored_totals, totals), ("daily", stored_daily, daily)):
+        for key in sorted(set(stored) | set(expected)):
+            if stored.get(key, 0) != expected.get(key, 0):
+                drift.append((table, key, stored.get(key, 0), expected.get(key, 0)))
+    return drift
+
+
+# === Reading ===
+def _bucket_start(day, bucket):
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _employee_names(cursor, employee_ids):
+    """employee_id -> name, keyed by the ID as text to match the summary tables' values."""
+    if not employee_ids:
+        return {}
+    employee_ids = list(employee_ids)
+    cursor.execute(
+        f"SELECT employee_id, employee_name FROM employee WHERE employee_id IN ({', '.join(['%s'] * len(employee_ids))})",
+        employee_ids,
+    )
+    return {str(employee_id): name for employee_id, name in cursor.fetchall()}
+
+
+def fetch_stats(conn, bucket="week", trend_by=None, since=None, until=None):
+    """Dashboard aggregates: totals per dimension and tickets reported per bucket.
+
+    `trend_by` splits each bucket by one dimension; `since`/`until` are ISO dates
+    bounding the trend. Raises ValueError for an unknown bucket, dimension or date.
+    """
+    if bucket not in TREND_BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(TREND_BUCKETS)}")
+    if trend_by is not None and trend_by not in DIMENSIONS:
+        raise ValueError(f"trend_by must be one of {', '.join(DIMENSIONS)}")
+    first = date.fromisoformat(since).isoformat() if since else "0001-01-01"
+    last = date.fromisoformat(until).isoformat() if until else "9999-12-31"
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(TOTALS_QUERY)
+        totals = cursor.fetchall()
+        cursor.execute(DAILY_QUERY, (trend_by or TOTAL_DIMENSION, first, last))
+        daily = cursor.fetchall()
+        names = _employee_names(cursor, {v for d, v, _ in totals if d == "assignee" and v != UNASSIGNED})
+    finally:
+        cursor.close()
+
+    stats = {"total": 0, **{f"by_{d}": [] for d in DIMENSIONS}}
+    for dimension, value, tickets in totals:
+        if dimension == TOTAL_DIMENSION:
+            stats["total"] += int(tickets)
+        if dimension == "assignee":
+            stats["by_assignee"].append({"assignee": names.get(value, value), "employee_id": value,
+                                         "count": int(tickets)})
+        elif dimension in DIMENSIONS:
+            stats[f"by_{dimension}"].append({dimension: value, "count": int(tickets)})
+    for dimension in DIMENSIONS:
+        stats[f"by_{dimension}"].sort(key=lambda e: (-e["count"], str(e[dimension])))
+
+    periods = {}
+    for day, value, tickets in daily:
+        start = _bucket_start(date.fromisoformat(_day(day)), bucket).isoformat()
+        point = periods.setdefault(start, {"period": start, "count": 0})
+        point["count"] += int(tickets)
+        if trend_by:
+            label = names.get(value, value) if trend_by == "assignee" else value
+            point.setdefault("values", {})
+            point["values"][label] = point["values"].get(label, 0) + int(tickets)
+    stats["trend"] = {"bucket": bucket, "by": trend_by, "points": [periods[p] for p in sorted(periods)]}
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the dashboard summary tables.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="recount every ticket (ticket writes wait for it)")
+    sub.add_parser("check", help="compare the summary tables with a full recount")
+    sub.add_parser("reconcile", help="recount only if the tables no longer add up to main_table")
+    record = sub.add_parser("record", help="count newly ingested tickets")
+    record.add_argument("ticket_ids", nargs="+")
+    args = parser.parse_args()
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        if args.command == "rebuild":
+            counted = rebuild_stats(cursor)
+            conn.commit()
+            bump_data_version([])
+            print(f"✅ Recounted {counted} tickets.")
+        elif args.command == "reconcile":
+            counted = reconcile_stats(conn)
+            print(f"✅ Recounted {counted} tickets." if counted is not None else "✅ Summary tables add up.")
+        elif args.command == "record":
+            touched = record_new_tickets(cursor, args.ticket_ids)
+            conn.commit()
+            bump_data_version([])
+            print(f"✅ Counted {len(args.ticket_ids)} tickets ({touched} summary rows).")
+        else:
+            drift = check_stats(cursor)
+            for table, key, stored, expected in drift[:50]:
+                print(f"   ❌ {table} {key}: stored {stored}, expected {expected}")
+            print(f"❌ {len(drift)} summary rows drifted; run 'rebuild'." if drift else "✅ Summary tables match.")
+        cursor.close()
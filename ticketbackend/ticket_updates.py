@@ -0,0 +1,176 @@
+import os
+from mysql.connector import errors
+try:
+    from assign import assign_tickets
+    from facet_cache import invalidate_facets
+    from data_version import bump_data_version
+    from answer_cache import invalidate_tickets
+    from observability import span
+    from reembed import enqueue_reembed
+    from ticket_stats import read_stat_rows, apply_stat_delta
+except ImportError:
+    from ticketbackend.assign import assign_tickets
+    from ticketbackend.facet_cache import invalidate_facets
+    from ticketbackend.data_version import bump_data_version
+    from ticketbackend.answer_cache import invalidate_tickets
+    from ticketbackend.observability import span
+    from ticketbackend.reembed import enqueue_reembed
+    from ticketbackend.ticket_stats import read_stat_rows, apply_stat_delta
+
+MAX_BULK_UPDATES = int(os.getenv("MAX_BULK_UPDATES", "5000"))
+UPDATE_CHUNK = int(os.getenv("UPDATE_CHUNK", "1000"))
+
+# Which table holds each editable field
+UPDATE_TABLES = {"processed": ("triage", "category"), "main_table": ("status",)}
+
+
+def _existing_ticket_ids(cursor, ticket_ids):
+    found = set()
+    ticket_ids = list(ticket_ids)
+    for i in range(0, len(ticket_ids), 1000):
+        chunk = ticket_ids[i:i + 1000]
+        cursor.execute(
+            f"SELECT ticket_id FROM main_table WHERE ticket_id IN ({', '.join(['%s'] * len(chunk))})", chunk
+        )
+        found.update(row[0] for row in cursor.fetchall())
+    return found
+
+
+def _validate(cursor, changes):
+    """Splits changes into valid ones and {ticket_id: error}."""
+    problems = {}
+    counts = {}
+    for change in changes:
+        counts[change.ticket_id] = counts.get(change.ticket_id, 0) + 1
+    existing = _existing_ticket_ids(cursor, counts)
+    valid = []
+    for change in changes:
+        if counts[change.ticket_id] > 1:
+            problems[change.ticket_id] = "ticket listed more than once"
+        elif change.ticket_id not in existing:
+            problems[change.ticket_id] = "ticket not found"
+        elif change.triage is None and change.category is None and change.status is None:
+            problems[change.ticket_id] = "no fields to change"
+        else:
+            valid.append(change)
+    return valid, problems
+
+
+def build_update_sql(table, values_by_column, ticket_ids):
+    """(sql, params) for one UPDATE of `ticket_ids`; each column gets a CASE over the
+    tickets that change it and keeps its value (ELSE) for the rest."""
+    sets = []
+    params = []
+    for column, values in values_by_column.items():
+        whens = [(t, values[t]) for t in ticket_ids if t in values]
+        if not whens:
+            continue
+        sets.append(f"{column} = CASE ticket_id {' '.join('WHEN %s THEN %s' for _ in whens)} ELSE {column} END")
+        params.extend(value for pair in whens for value in pair)
+    sql = f"UPDATE {table} SET {', '.join(sets)} WHERE ticket_id IN ({', '.join(['%s'] * len(ticket_ids))})"
+    return sql, params + list(ticket_ids)
+
+
+def _write(cursor, changes):
+    """One UPDATE per table per UPDATE_CHUNK tickets.
+
+    mysql-connector only folds executemany into one statement for INSERT, so
+    UPDATEs are batched by hand, as assign._update_assignments does.
+    """
+    for table, columns in UPDATE_TABLES.items():
+        values_by_column = {
+            column: {c.ticket_id: getattr(c, column) for c in changes if getattr(c, column) is not None}
+            for column in columns
+        }
+        ticket_ids = list(dict.fromkeys(t for values in values_by_column.values() for t in values))
+        for i in range(0, len(ticket_ids), UPDATE_CHUNK):
+            chunk = ticket_ids[i:i + UPDATE_CHUNK]
+            cursor.execute(*build_update_sql(table, values_by_column, chunk))
+
+
+def _write_each(cursor, changes, problems):
+    """Row-by-row fallback for on_error=skip: a savepoint per ticket isolates failures."""
+    written = []
+    for change in changes:
+        cursor.execute("SAVEPOINT ticket_change")
+        try:
+            _write(cursor, [change])
+            written.append(change)
+        except errors.DatabaseError as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT ticket_change")
+            problems[change.ticket_id] = str(e)
+        cursor.execute("RELEASE SAVEPOINT ticket_change")
+    return written
+
+
+def apply_ticket_updates(conn, changes, on_error="abort"):
+    """Applies many ticket changes, their reassignment and the dashboard counts in one transaction.
+
+    Returns {"applied", "results"}, with one result per change in request order.
+    With on_error="abort" nothing is written if any change is invalid or fails;
+    with "skip" the bad ones are reported and the rest are committed.
+    """
+    if len(changes) > MAX_BULK_UPDATES:
+        raise ValueError(f"At most {MAX_BULK_UPDATES} updates per request")
+    cursor = conn.cursor()
+    try:
+        with span("update.validate"):
+            valid, problems = _validate(cursor, changes)
+        if problems and on_error == "abort":
+            return {"applied": False, "results": _results(changes, problems, {}, applied=False)}
+
+        touched = [c.ticket_id for c in valid]
+        with span("update.stats"):
+            before = read_stat_rows(cursor, touched)
+        with span("update.write"):
+            try:
+                _write(cursor, valid)
+                written = valid
+            except errors.DatabaseError:
+                conn.rollback()
+                if on_error == "abort":
+                    raise
+                # The rollback released the rows read above; read them again under lock
+                before = read_stat_rows(cursor, touched)
+                written = _write_each(cursor, valid, problems)
+
+        # Only a new triage or category can change who should own the ticket
+        rerouted = [c.ticket_id for c in written if c.triage is not None or c.category is not None]
+        with span("update.assign"):
+            assignment = assign_tickets(rerouted, conn, commit=False)
+        # Dashboard counts move in the same transaction, reassignments included
+        with span("update.stats"):
+            apply_stat_delta(cursor, before, read_stat_rows(cursor, touched))
+        with span("update.commit"):
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    if written:
+        with span("update.invalidate"):
+            invalidate_facets()
+            invalidate_tickets(c.ticket_id for c in written)
+            bump_data_version(c.ticket_id for c in written)
+            # Status, triage and category are part of the embedded text; refresh the LanceDB rows
+            enqueue_reembed(c.ticket_id for c in written)
+    return {"applied": True, "results": _results(changes, problems, assignment["assigned"], applied=True)}
+
+
+def _results(changes, problems, assigned, applied):
+    results = []
+    for change in changes:
+        result = {"ticket_id": change.ticket_id}
+        if change.ticket_id in problems:
+            result["status"] = "failed"
+            result["error"] = problems[change.ticket_id]
+        elif not applied:
+            result["status"] = "not_applied"
+        else:
+            result["status"] = "updated"
+            if change.ticket_id in assigned:
+                result["assigned_to"] = assigned[change.ticket_id]
+        results.append(result)
+    return results